@@ -0,0 +1,31 @@
+import gym
+import numpy as np
+
+from trajopt.bspilqr import MultiStartBSPiLQR
+
+# light dark task
+env = gym.make('LightDark-TO-v0')
+env._max_episode_steps = 25
+
+nb_steps, nb_starts = 25, 8
+
+# random initial open-loop controls
+kff = np.random.randn(nb_starts, env.action_space.shape[0], nb_steps)
+
+alg = MultiStartBSPiLQR(env, nb_steps=nb_steps,
+                        nb_starts=nb_starts, kff=kff,
+                        activation=range(25))
+
+# run belief-space ilqr from all starts in lockstep
+traces = alg.run()
+
+# plot forward pass of the best start
+alg.plot()
+
+# plot objectives
+import matplotlib.pyplot as plt
+
+plt.figure()
+for trace in traces:
+    plt.plot(trace)
+plt.show()
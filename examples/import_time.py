@@ -0,0 +1,65 @@
+import sys
+import json
+import subprocess
+
+import numpy as np
+
+
+# import cost of trajopt in fresh interpreters, as paid by every
+# spawned worker, exits with an error if importing the package
+# or making one env pulls in unrelated env modules again
+
+_probe = """
+import sys, time, json
+t = time.perf_counter()
+%s
+t = time.perf_counter() - t
+print(json.dumps({'time': t, 'modules': list(sys.modules)}))
+"""
+
+_cases = {
+    'import trajopt': ('import trajopt', []),
+    'import trajopt.envs': ('import trajopt.envs', []),
+    'import trajopt.envs.vector': ('import trajopt.envs.vector', []),
+    'make Pendulum-TO-v0': ("import gym, trajopt; gym.make('Pendulum-TO-v0')",
+                            ['trajopt.envs.pendulum']),
+    'make QCartpole-v0': ("import gym, trajopt; gym.make('QCartpole-v0')",
+                          ['trajopt.envs.quanser.cartpole', 'trajopt.envs.quanser.common',
+                           'scipy.signal', 'scipy.stats']),
+    'make QQube-v0': ("import gym, trajopt; gym.make('QQube-v0')",
+                      ['trajopt.envs.quanser.qube', 'trajopt.envs.quanser.common']),
+}
+
+# dependencies only some envs need
+_heavy = ('scipy.stats', 'scipy.signal')
+
+
+def unexpected(modules, allowed):
+    # env modules and heavy dependencies the case should not load
+    return [m for m in modules
+            if (m.startswith('trajopt.envs.') and m.count('.') > 2 or m in _heavy)
+            and not m.startswith(tuple(allowed))]
+
+
+def probe(stmt):
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', _probe % stmt],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    nb_runs = 5
+
+    failed = False
+    for name, (stmt, allowed) in _cases.items():
+        runs = [probe(stmt) for _ in range(nb_runs)]
+        times = 1e3 * np.array([r['time'] for r in runs])
+
+        extra = unexpected(runs[0]['modules'], allowed)
+
+        print("{0:<28s} {1:7.1f}ms median, {2:7.1f}ms max {3}".format(
+            name, np.median(times), np.max(times),
+            'unexpected: ' + ', '.join(extra) if extra else ''))
+        failed = failed or bool(extra)
+
+    sys.exit(1 if failed else 0)
@@ -1,51 +1,36 @@
 import autograd.numpy as np
 
 import gym
-from trajopt.rgps import MFRGPS
+from trajopt.rgps.sweep import RobustSweep
 
 import warnings
 warnings.filterwarnings("ignore")
 
-from joblib import Parallel, delayed
-
-
-def create_job(kwargs):
-    import warnings
-    warnings.filterwarnings("ignore")
-
-    np.random.seed(kwargs['seed'])
 
+def make_env():
     # pendulum task
     env = gym.make('Pendulum-TO-v0')
     env._max_episode_steps = 100
     env.unwrapped.dt = 0.05
-
-    env.seed(kwargs['seed'])
-
-    prior = {'K': 1e-3}
-
-    alg = MFRGPS(env, nb_steps=100,
-                 policy_kl_bound=5.,
-                 param_kl_bound=kwargs['param_kl_bound'],
-                 init_state=env.init(),
-                 init_action_sigma=5.,
-                 action_penalty=np.array([1e-5]),
-                 slew_rate=False,
-                 prior=prior)
-
-    trace = alg.run(nb_episodes=10, nb_iter=5, verbose=False)
-    return trace
+    return env
 
 
-def parallel_rgos(params):
-    kwargs_list = [{'param_kl_bound': param, 'seed': 1337} for param in params]
-    traces = Parallel(n_jobs=len(params), verbose=10, backend='loky')\
-                        (map(delayed(create_job), kwargs_list))
-    return traces
+solver_kwargs = {'nb_steps': 100,
+                 'policy_kl_bound': 5.,
+                 'init_action_sigma': 5.,
+                 'action_penalty': np.array([1e-5]),
+                 'slew_rate': False,
+                 'prior': {'K': 1e-3}}
 
+sweep = RobustSweep(make_env, solver_kwargs,
+                    nb_learning_episodes=10,
+                    nb_evaluation_episodes=10,
+                    run_kwargs={'nb_iter': 5},
+                    seed=1337, cache_dir='.rgps_sweep')
 
 kls = [1e3, 5e2, 1e1, 1e-1]
-traces = parallel_rgos(params=kls)
+traces = sweep.run([{'param_kl_bound': kl} for kl in kls],
+                   n_jobs=len(kls), verbose=10)
 
 import matplotlib.pyplot as plt
 
@@ -49,10 +49,7 @@ setup(
     description='A toolbox for trajectory optimization',
     install_requires=['numpy', 'scipy', 'matplotlib', 'scikit-learn',
                       'autograd', 'gym', 'pathos'],
-    ext_modules=[CMakeExtension('gps', './trajopt/gps/'),
-                 CMakeExtension('rgps', './trajopt/rgps/'),
-                 CMakeExtension('ilqr', './trajopt/ilqr/'),
-                 CMakeExtension('bspilqr', './trajopt/bspilqr/')],
+    ext_modules=[CMakeExtension('native', './trajopt/native/')],
     cmdclass=dict(build_ext=CMakeBuild),
     zip_safe=False,
 )
@@ -0,0 +1,49 @@
+import numpy as np
+
+from trajopt.envs import codegen
+from trajopt.envs.pendulum.pendulum import Pendulum
+from trajopt.envs.cartpole.cartpole import Cartpole
+
+
+class MassPendulum(Pendulum):
+
+    def _ode(self, x, u, k=0.025):
+        return Pendulum._ode(self, x, u, self.mass, k)
+
+
+class DelegatingCartpole(Cartpole):
+
+    def _ode(self, x, u):
+        # delegates outside of its own base classes
+        return Pendulum._ode(self, x, u)
+
+
+def test_key_follows_closed_over_parameters():
+    light, heavy = MassPendulum(), MassPendulum()
+    light.mass, heavy.mass = 1., 2.
+    assert codegen._key(light) != codegen._key(heavy)
+
+    heavy.mass = 1.
+    assert codegen._key(light) == codegen._key(heavy)
+
+
+def test_key_follows_array_parameters():
+    light, heavy = MassPendulum(), MassPendulum()
+    light.mass, heavy.mass = np.ones(1), np.ones(1)
+    assert codegen._key(light) == codegen._key(heavy)
+
+    heavy.mass[0] = 2.
+    assert codegen._key(light) != codegen._key(heavy)
+
+
+def _ode(self, x, u, m=1., k=0.025):
+    # stand-in for an edited base ode
+    return np.stack((x[1], u[0] / m - k * x[1]))
+
+
+def test_key_follows_delegated_ode(monkeypatch):
+    keys = codegen._key(MassPendulum()), codegen._key(DelegatingCartpole())
+
+    monkeypatch.setattr(Pendulum, '_ode', _ode)
+    assert codegen._key(MassPendulum()) != keys[0]
+    assert codegen._key(DelegatingCartpole()) != keys[1]
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import gym
+
+import trajopt
+from trajopt.envs.perturbation import Perturbation
+
+
+def test_entries_past_the_block_size():
+    # single episodes and batches of two see the same entries,
+    # and nothing repeats once the first block is exhausted
+    params = {'m': (1., 2., 5.)}
+    single = Perturbation(params, nb_steps=7, nb_episodes=3, seed=1)
+    batch = Perturbation(params, nb_steps=7, nb_episodes=3, seed=1)
+
+    entries = np.zeros((20, 8))
+    for n in range(8):
+        single.reset()
+        for t in range(20):
+            entries[t, n] = single('m')
+            single.step()
+
+    for n in range(0, 8, 2):
+        batch.reset(2)
+        for t in range(20):
+            assert np.all(batch('m', 2) == entries[t, n:n + 2])
+            batch.step()
+
+    assert len(np.unique(entries)) == entries.size
+
+
+@pytest.mark.parametrize('name', ['Pendulum-TO-v0', 'Cartpole-TO-v0'])
+def test_perturbation_leaves_env_noise_alone(name):
+    def rollout(perturb):
+        env = gym.make(name).unwrapped
+        env.perturb = perturb
+        env.seed(3)
+        env.reset()
+        return env.np_random.random()
+
+    assert rollout(False) == rollout(True)
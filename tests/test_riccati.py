@@ -0,0 +1,235 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('trajopt.native.core')
+
+import gym
+
+from trajopt import trajectory
+from trajopt.riccati import Riccati
+from trajopt.riccati import objects
+from trajopt.riccati.objects import LinearDynamics, QuadraticCost
+from trajopt.native.core import ilqr
+
+
+def linearization(dm_state, dm_act, nb_steps, seed=0, invariant=False):
+    # random dynamics and convex costs, either time-varying or the
+    # same at every step, with affine dynamics terms c
+    rng = np.random.default_rng(seed)
+    size = 1 if invariant else nb_steps + 1
+
+    def spd(dm):
+        M = rng.standard_normal((size, dm, dm))
+        return M @ np.swapaxes(M, -1, -2) + dm * np.eye(dm)
+
+    # contracting when time-invariant, so that values converge
+    A = (0.5 if invariant else 1.) * np.eye(dm_state)\
+        + 0.1 * rng.standard_normal((size, dm_state, dm_state))
+    B = rng.standard_normal((size, dm_state, dm_act))
+    c = rng.standard_normal((size, dm_state))
+
+    Cxx = spd(dm_state)
+    Cuu = spd(dm_act)
+    Cxu = 0.1 * rng.standard_normal((size, dm_state, dm_act))
+    cx = rng.standard_normal((size, dm_state))
+    cu = rng.standard_normal((size, dm_act))
+
+    # to time-last trajectories
+    def _tl(a, nb):
+        a = np.repeat(a, nb, axis=0) if invariant else a[:nb]
+        return trajectory.asarray(np.moveaxis(a, 0, -1))
+
+    return dict(A=_tl(A, nb_steps), B=_tl(B, nb_steps), c=_tl(c, nb_steps),
+                Cxx=_tl(Cxx, nb_steps + 1), Cuu=_tl(Cuu, nb_steps + 1),
+                Cxu=_tl(Cxu, nb_steps + 1), cx=_tl(cx, nb_steps + 1),
+                cu=_tl(cu, nb_steps + 1))
+
+
+def solver(lin, stationary=False):
+    # riccati solver on a given linearization, without an env
+    dm_state, dm_act, nb_steps = lin['B'].shape
+
+    riccati = Riccati.__new__(Riccati)
+    riccati.dm_state, riccati.dm_act, riccati.nb_steps = dm_state, dm_act, nb_steps
+    riccati.stationary, riccati.tol = stationary, 1e-10
+
+    riccati.dyn = LinearDynamics(dm_state, dm_act, nb_steps)
+    riccati.dyn.params = lin['A'], lin['B'], lin['c']
+
+    riccati.cost = QuadraticCost(dm_state, dm_act, nb_steps + 1)
+    riccati.cost.params = lin['Cxx'], lin['cx'], lin['Cuu'], lin['cu'], lin['Cxu']
+    return riccati
+
+
+def reference(lin):
+    # plain recursion over all steps, costs x' Cxx x + u' Cuu u
+    # + 2 x' Cxu u + cx' x + cu' u and values x' V x + v' x
+    A, B, c = lin['A'], lin['B'], lin['c']
+    Cxx, Cuu, Cxu, cx, cu = lin['Cxx'], lin['Cuu'], lin['Cxu'], lin['cx'], lin['cu']
+    dm_state, dm_act, nb_steps = B.shape
+
+    K = np.zeros((dm_act, dm_state, nb_steps))
+    kff = np.zeros((dm_act, nb_steps))
+    V = np.zeros((dm_state, dm_state, nb_steps + 1))
+    v = np.zeros((dm_state, nb_steps + 1))
+
+    V[..., -1], v[..., -1] = Cxx[..., -1], cx[..., -1]
+    for t in reversed(range(nb_steps)):
+        _A, _B, _V = A[..., t], B[..., t], V[..., t + 1]
+        _vn = 2. * _V @ c[..., t] + v[..., t + 1]
+
+        Qxx = Cxx[..., t] + _A.T @ _V @ _A
+        Quu = Cuu[..., t] + _B.T @ _V @ _B
+        Qux = Cxu[..., t].T + _B.T @ _V @ _A
+        qx = cx[..., t] + _A.T @ _vn
+        qu = cu[..., t] + _B.T @ _vn
+
+        K[..., t] = - np.linalg.solve(Quu, Qux)
+        kff[..., t] = - 0.5 * np.linalg.solve(Quu, qu)
+
+        V[..., t] = Qxx + Qux.T @ K[..., t]
+        V[..., t] = 0.5 * (V[..., t] + V[..., t].T)
+        v[..., t] = qx + K[..., t].T @ qu
+
+    return K, kff, V, v
+
+
+def close(a, b, tol):
+    return np.allclose(a, b, rtol=0., atol=tol * np.max(np.abs(b)))
+
+
+@pytest.mark.parametrize('task', ['LQR-TO-v0', 'LQR-TO-v1'])
+def test_riccati_matches_ilqr(task):
+    env = gym.make(task)
+    nb_steps = 50
+
+    riccati = Riccati(env, nb_steps=nb_steps, init_state=env.init())
+    dm_state, dm_act = riccati.dm_state, riccati.dm_act
+
+    lin = linearization(dm_state, dm_act, nb_steps)
+    lin['c'][...] = 0.
+
+    # riccati costs are x' Cxx x + u' Cuu u + 2 x' Cxu u + cx' x + cu' u
+    riccati.dyn.A[...], riccati.dyn.B[...] = lin['A'], lin['B']
+    riccati.dyn.c[...] = 0.
+    riccati.cost.Cxx[...], riccati.cost.Cuu[...] = lin['Cxx'], lin['Cuu']
+    riccati.cost.Cxu[...] = lin['Cxu']
+    riccati.cost.cx[...], riccati.cost.cu[...] = lin['cx'], lin['cu']
+
+    ctl, xvalue = riccati.backward_pass()
+
+    # ilqr takes the full hessians, its values are x' V x / 2
+    _, _, _, _, _, V, v, _, K, kff, diverge =\
+        ilqr.backward_pass(2. * lin['Cxx'], lin['cx'], 2. * lin['Cuu'],
+                           lin['cu'], 2. * lin['Cxu'],
+                           lin['A'], lin['B'], 0., 1,
+                           dm_state, dm_act, nb_steps)
+
+    assert diverge == 0
+    assert np.allclose(ctl.K, K, rtol=0., atol=1e-10)
+    assert np.allclose(ctl.kff, kff, rtol=0., atol=1e-10)
+    assert np.allclose(2. * xvalue.V, V, rtol=1e-10, atol=1e-10)
+    assert np.allclose(xvalue.v, v, rtol=1e-10, atol=1e-10)
+
+
+def test_riccati_affine_multi_action():
+    lin = linearization(4, 2, 50, seed=1)
+    riccati = solver(lin)
+    assert not riccati.time_invariant()
+
+    ctl, xvalue = riccati.backward_pass()
+    K, kff, V, v = reference(lin)
+
+    assert close(ctl.K, K, 1e-10)
+    assert close(ctl.kff, kff, 1e-10)
+    assert close(xvalue.V, V, 1e-10)
+    assert close(xvalue.v, v, 1e-10)
+
+
+def test_riccati_early_convergence():
+    lin = linearization(4, 2, 300, seed=2, invariant=True)
+    riccati = solver(lin)
+    assert riccati.time_invariant()
+
+    ctl, xvalue = riccati.backward_pass()
+    K, kff, V, v = reference(lin)
+
+    # the recursion stopped early and copied its converged gains
+    assert np.array_equal(ctl.K[..., 0], ctl.K[..., 1])
+    assert np.array_equal(xvalue.v[..., 0], xvalue.v[..., 1])
+
+    assert close(ctl.K, K, 1e-8)
+    assert close(ctl.kff, kff, 1e-8)
+    assert close(xvalue.V, V, 1e-8)
+    assert close(xvalue.v, v, 1e-8)
+
+
+def test_riccati_stationary():
+    lin = linearization(4, 2, 300, seed=3, invariant=True)
+    ctl, xvalue = solver(lin, stationary=True).backward_pass()
+    K, kff, V, v = reference(lin)
+
+    # the stationary gains are those the long recursion converged to
+    for t in (0, 100, 299):
+        assert close(ctl.K[..., t], K[..., 0], 1e-8)
+        assert close(ctl.kff[..., t], kff[..., 0], 1e-8)
+        assert close(xvalue.V[..., t], V[..., 0], 1e-8)
+        assert close(xvalue.v[..., t], v[..., 0], 1e-8)
+
+
+def test_stationary_matches_finite_horizon():
+    lin = linearization(4, 2, 300, seed=4, invariant=True)
+    ctl, xvalue = solver(lin, stationary=True).backward_pass()
+    _ctl, _xvalue = solver(lin).backward_pass()
+
+    assert close(ctl.K[..., 0], _ctl.K[..., 0], 1e-8)
+    assert close(ctl.kff[..., 0], _ctl.kff[..., 0], 1e-8)
+    assert close(xvalue.V[..., 0], _xvalue.V[..., 0], 1e-8)
+    assert close(xvalue.v[..., 0], _xvalue.v[..., 0], 1e-8)
+
+
+def test_stationary_linear_value_is_fixed_point():
+    lin = linearization(4, 2, 10, seed=5, invariant=True)
+    ctl, xvalue = solver(lin, stationary=True).backward_pass()
+
+    A, B, c = lin['A'][..., 0], lin['B'][..., 0], lin['c'][..., 0]
+    cx, cu = lin['cx'][..., 0], lin['cu'][..., 0]
+    K, V, v = ctl.K[..., 0], xvalue.V[..., 0], xvalue.v[..., 0]
+    assert np.any(c != 0.)
+
+    Acl = A + B @ K
+    assert close(cx + K.T @ cu + 2. * Acl.T @ V @ c + Acl.T @ v, v, 1e-10)
+
+
+def test_stationary_needs_time_invariance():
+    lin = linearization(4, 2, 10, seed=6)
+    with pytest.raises(ValueError):
+        solver(lin, stationary=True).backward_pass()
+
+
+def test_dare_cache_is_bounded(monkeypatch):
+    calls = []
+    _solve = objects.linalg.solve_discrete_are
+
+    def solve_discrete_are(*args, **kwargs):
+        calls.append(None)
+        return _solve(*args, **kwargs)
+
+    monkeypatch.setattr(objects.linalg, 'solve_discrete_are', solve_discrete_are)
+    objects._dare_cache.clear()
+
+    lins = [linearization(3, 1, 1, seed=seed, invariant=True)
+            for seed in range(2 * objects._dare_cache_size)]
+    for lin in lins:
+        solver(lin, stationary=True).backward_pass()
+
+    assert len(calls) == len(lins)
+    assert len(objects._dare_cache) == objects._dare_cache_size
+
+    # the latest problem is cached, the first one was dropped
+    solver(lins[-1], stationary=True).backward_pass()
+    assert len(calls) == len(lins)
+
+    solver(lins[0], stationary=True).backward_pass()
+    assert len(calls) == len(lins) + 1
+    assert len(objects._dare_cache) == objects._dare_cache_size
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('trajopt.native.core')
+
+import gym
+from trajopt.rgps import sweep
+from trajopt.rgps.sweep import RobustSweep
+
+
+def make_env():
+    env = gym.make('Pendulum-TO-v0')
+    env._max_episode_steps = 10
+    return env
+
+
+def test_sweep_caches_configs(tmp_path, monkeypatch):
+    solver_kwargs = {'nb_steps': 10,
+                     'policy_kl_bound': 5.,
+                     'init_action_sigma': 5.,
+                     'action_penalty': np.array([1e-5]),
+                     'prior': {'K': 1e-3}}
+
+    def _sweep():
+        return RobustSweep(make_env, solver_kwargs,
+                           nb_learning_episodes=5,
+                           nb_evaluation_episodes=5,
+                           run_kwargs={'nb_iter': 1},
+                           seed=1337, cache_dir=str(tmp_path))
+
+    configs = [{'param_kl_bound': 1e3}, {'param_kl_bound': 1e1}]
+
+    traces = _sweep().run(configs, n_jobs=1)
+    assert len(traces) == 2
+    assert all(len(trace) >= 1 for trace in traces)
+
+    paths = [_sweep().cache_path(config) for config in configs]
+    assert len(set(paths)) == 2
+    assert all(os.path.exists(path) for path in paths)
+
+    # a rerun loads both configurations from the cache
+    def _launch(*args, **kwargs):
+        raise AssertionError("job launched for a cached configuration")
+
+    monkeypatch.setattr(sweep, 'Parallel', _launch)
+    monkeypatch.setattr(RobustSweep, 'initialize', _launch)
+
+    cached = _sweep().run(configs, n_jobs=1)
+    for trace, _trace in zip(traces, cached):
+        assert np.allclose(trace, _trace)
@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip('trajopt.native.core')
+
+from trajopt.native import core, threads
+
+
+def test_threads_restores_openmp_setting():
+    blas, omp = core.get_num_threads()
+    try:
+        # left to openmp before, left to it again after
+        core.set_num_threads(-1, 0)
+        with threads(1):
+            assert core.get_num_threads()[1] == 1
+        assert core.get_num_threads()[1] == 0
+
+        core.set_num_threads(-1, 3)
+        with threads(1):
+            pass
+        assert core.get_num_threads()[1] == 3
+    finally:
+        core.set_num_threads(blas, omp)
@@ -1,132 +1,135 @@
 from gym.envs.registration import register
 
+# entry points name the env modules, which gym
+# only imports on gym.make
+
 register(
     id='LQR-TO-v0',
-    entry_point='trajopt.envs:LQRv0',
+    entry_point='trajopt.envs.lqr.lqr_v0:LQRv0',
     max_episode_steps=1000,
 )
 
 register(
     id='LQR-TO-v1',
-    entry_point='trajopt.envs:LQRv1',
+    entry_point='trajopt.envs.lqr.lqr_v1:LQRv1',
     max_episode_steps=1000,
 )
 
 register(
     id='Pendulum-TO-v0',
-    entry_point='trajopt.envs:Pendulum',
+    entry_point='trajopt.envs.pendulum.pendulum:Pendulum',
     max_episode_steps=1000,
 )
 
 register(
     id='Pendulum-TO-v1',
-    entry_point='trajopt.envs:PendulumWithCartesianCost',
+    entry_point='trajopt.envs.pendulum.pendulum:PendulumWithCartesianCost',
     max_episode_steps=1000,
 )
 
 register(
     id='DoublePendulum-TO-v0',
-    entry_point='trajopt.envs:DoublePendulum',
+    entry_point='trajopt.envs.double_pendulum.double_pendulum:DoublePendulum',
     max_episode_steps=1000,
 )
 
 register(
     id='DoublePendulum-TO-v1',
-    entry_point='trajopt.envs:DoublePendulumWithCartesianCost',
+    entry_point='trajopt.envs.double_pendulum.double_pendulum:DoublePendulumWithCartesianCost',
     max_episode_steps=1000,
 )
 
 register(
     id='QuadPendulum-TO-v0',
-    entry_point='trajopt.envs:QuadPendulum',
+    entry_point='trajopt.envs.quad_pendulum.quad_pendulum:QuadPendulum',
     max_episode_steps=1000,
 )
 
 register(
     id='QuadPendulum-TO-v1',
-    entry_point='trajopt.envs:QuadPendulumWithCartesianCost',
+    entry_point='trajopt.envs.quad_pendulum.quad_pendulum:QuadPendulumWithCartesianCost',
     max_episode_steps=1000,
 )
 
 register(
     id='Cartpole-TO-v0',
-    entry_point='trajopt.envs:Cartpole',
+    entry_point='trajopt.envs.cartpole.cartpole:Cartpole',
     max_episode_steps=1000,
 )
 
 register(
     id='Cartpole-TO-v1',
-    entry_point='trajopt.envs:CartpoleWithCartesianCost',
+    entry_point='trajopt.envs.cartpole.cartpole:CartpoleWithCartesianCost',
     max_episode_steps=1000,
 )
 
 register(
     id='DoubleCartpole-TO-v0',
-    entry_point='trajopt.envs:DoubleCartpole',
+    entry_point='trajopt.envs.double_cartpole.double_cartpole:DoubleCartpole',
     max_episode_steps=1000,
 )
 
 register(
     id='DoubleCartpole-TO-v1',
-    entry_point='trajopt.envs:DoubleCartpoleWithCartesianCost',
+    entry_point='trajopt.envs.double_cartpole.double_cartpole:DoubleCartpoleWithCartesianCost',
     max_episode_steps=1000,
 )
 
 register(
     id='LightDark-TO-v0',
-    entry_point='trajopt.envs:LightDark',
+    entry_point='trajopt.envs.lightdark.lightdark:LightDark',
     max_episode_steps=1000,
 )
 
 register(
     id='Car-TO-v0',
-    entry_point='trajopt.envs:Car',
+    entry_point='trajopt.envs.car.car:Car',
     max_episode_steps=1000,
 )
 
 register(
     id='QQube-v0',
-    entry_point='trajopt.envs:Qube',
+    entry_point='trajopt.envs.quanser.qube.qube:Qube',
     max_episode_steps=10000,
     kwargs={'fs': 500.0, 'fs_ctrl': 100.0}
 )
 
 register(
     id='QQube-RR-v0',
-    entry_point='trajopt.envs:QubeRR',
+    entry_point='trajopt.envs.quanser.qube.qube_rr:QubeRR',
     max_episode_steps=10000,
     kwargs={'ip': '192.172.162.1', 'fs_ctrl': 100.0}
 )
 
 register(
     id='QCartpole-v0',
-    entry_point='trajopt.envs:QCartpole',
+    entry_point='trajopt.envs.quanser.cartpole.cartpole:QCartpole',
     max_episode_steps=10000,
     kwargs={'fs': 500.0, 'fs_ctrl': 100.0, 'long_pole': False}
 )
 
 register(
      id='QCartpole-RR-v0',
-     entry_point='trajopt.envs:QCartpoleRR',
+     entry_point='trajopt.envs.quanser.cartpole.cartpole_rr:QCartpoleRR',
      max_episode_steps=10000,
      kwargs={'ip': '192.172.162.1', 'fs_ctrl': 100.0}
 )
 
 register(
     id='QQube-TO-v0',
-    entry_point='trajopt.envs:QubeTO',
+    entry_point='trajopt.envs.quanser.qube.qube:QubeTO',
     max_episode_steps=10000,
 )
 
 register(
     id='QQube-TO-v1',
-    entry_point='trajopt.envs:QubeTOWithCartesianCost',
+    entry_point='trajopt.envs.quanser.qube.qube:QubeTOWithCartesianCost',
     max_episode_steps=10000,
 )
 
 register(
     id='QCartpole-TO-v0',
-    entry_point='trajopt.envs:QCartpoleTO',
+    entry_point='trajopt.envs.quanser.cartpole.cartpole:QCartpoleTO',
     max_episode_steps=10000,
     kwargs={'fs': 500.0, 'fs_ctrl': 100.0}
 )
@@ -1 +1,2 @@
 from .bspilqr import BSPiLQR
+from .multistart import MultiStartBSPiLQR
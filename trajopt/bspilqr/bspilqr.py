@@ -1,11 +1,14 @@
 import autograd.numpy as np
 
+from trajopt import trajectory
+from trajopt import profiling
+
 from trajopt.bspilqr.objects import Gaussian
 from trajopt.bspilqr.objects import AnalyticalLinearBeliefDynamics, AnalyticalQuadraticCost
 from trajopt.bspilqr.objects import QuadraticBeliefValue
 from trajopt.bspilqr.objects import LinearControl
 
-from trajopt.bspilqr.core import backward_pass
+from trajopt.native.core.bspilqr import backward_pass
 
 
 class BSPiLQR:
@@ -15,7 +18,8 @@ class BSPiLQR:
                  lmbda=1., dlmbda=1.,
                  min_lmbda=1e-6, max_lmbda=1e6, mult_lmbda=1.6,
                  tolfun=1e-8, tolgrad=1e-6, min_imp=0., reg=1,
-                 activation=range(-1, 0)):
+                 activation=range(-1, 0), vech=False, sqrt=False,
+                 prior=None):
 
         self.env = env
 
@@ -28,6 +32,14 @@ class BSPiLQR:
         self.env_cost = self.env.unwrapped.cost
         self.env_init = self.env.unwrapped.init
 
+        # models over a batch in columns, if the env provides them
+        self.env_batch = None
+        if hasattr(self.env.unwrapped, 'dynamics_batch'):
+            self.env_batch = (self.env.unwrapped.dynamics_batch,
+                              self.env.unwrapped.observe_batch,
+                              self.env.unwrapped.dyn_noise_batch,
+                              self.env.unwrapped.obs_noise_batch)
+
         self.ulim = self.env.action_space.high
 
         self.dm_belief = self.env.unwrapped.state_space.shape[0]
@@ -35,6 +47,10 @@ class BSPiLQR:
         self.dm_act = self.env.action_space.shape[0]
         self.nb_steps = nb_steps
 
+        # half-vectorized covariance, square-root propagation
+        self.sqrt = sqrt
+        self.vech = vech or sqrt
+
         # backtracking
         self.alphas = alphas
         self.lmbda = lmbda
@@ -53,17 +69,22 @@ class BSPiLQR:
         self.tolfun = tolfun
         self.tolgrad = tolgrad
 
+        # initial belief, defaults to the env prior
+        self.prior = self.env_init() if prior is None else prior
+
         # reference belief trajectory
         self.bref = Gaussian(self.dm_belief, self.nb_steps + 1)
-        self.bref.mu[..., 0], self.bref.sigma[..., 0] = self.env_init()
+        self.bref.mu[..., 0], self.bref.sigma[..., 0] = self.prior
 
-        self.uref = np.zeros((self.dm_act, self.nb_steps))
+        self.uref = trajectory.zeros((self.dm_act, self.nb_steps))
 
-        self.vfunc = QuadraticBeliefValue(self.dm_belief, self.nb_steps + 1)
+        self.vfunc = QuadraticBeliefValue(self.dm_belief, self.nb_steps + 1, self.vech)
 
         self.dyn = AnalyticalLinearBeliefDynamics(self.env_init, self.env_dyn, self.env_obs,
                                                   self.env_dyn_noise, self.env_obs_noise,
-                                                  self.dm_belief, self.dm_obs, self.dm_act, self.nb_steps)
+                                                  self.dm_belief, self.dm_obs, self.dm_act,
+                                                  self.nb_steps, self.vech, self.sqrt,
+                                                  self.env_batch)
 
         self.ctl = LinearControl(self.dm_belief, self.dm_act, self.nb_steps)
         self.ctl.kff = 1e-2 * np.random.randn(self.dm_act, self.nb_steps)
@@ -73,20 +94,28 @@ class BSPiLQR:
         self.activation[-1] = 1.  # last step always in
         self.activation[activation] = 1.
 
-        self.cost = AnalyticalQuadraticCost(self.env_cost, self.dm_belief, self.dm_act, self.nb_steps + 1)
+        self.cost = AnalyticalQuadraticCost(self.env_cost, self.dm_belief, self.dm_act,
+                                            self.nb_steps + 1, self.vech, self.sqrt)
 
         self.last_return = - np.inf
 
     def forward_pass(self, ctl, alpha):
         belief = Gaussian(self.dm_belief, self.nb_steps + 1)
-        action = np.zeros((self.dm_act, self.nb_steps))
+        action = trajectory.zeros((self.dm_act, self.nb_steps))
         cost = np.zeros((self.nb_steps + 1, ))
 
-        belief.mu[..., 0], belief.sigma[..., 0] = self.dyn.evali()
+        belief.mu[..., 0], belief.sigma[..., 0] = self.prior
+        if self.sqrt:
+            belief.chol[..., 0] = np.linalg.cholesky(belief.sigma[..., 0])
+
         for t in range(self.nb_steps):
             action[..., t] = ctl.action(belief, alpha, self.bref.mu, self.uref, t)
             cost[..., t] = self.cost.evalf(belief.mu[..., t], belief.sigma[..., t], action[..., t], self.activation[t])
-            belief.mu[..., t + 1], belief.sigma[..., t + 1] = self.dyn.forward(belief, action, t)
+            if self.sqrt:
+                belief.mu[..., t + 1], belief.chol[..., t + 1] = self.dyn.forward_sqrt(belief, action, t)
+                belief.sigma[..., t + 1] = belief.chol[..., t + 1] @ belief.chol[..., t + 1].T
+            else:
+                belief.mu[..., t + 1], belief.sigma[..., t + 1] = self.dyn.forward(belief, action, t)
 
         cost[..., -1] = self.cost.evalf(belief.mu[..., -1], belief.sigma[..., -1],
                                         np.zeros((self.dm_act, )), self.activation[-1])
@@ -94,7 +123,7 @@ class BSPiLQR:
 
     def backward_pass(self):
         lc = LinearControl(self.dm_belief, self.dm_act, self.nb_steps)
-        bvalue = QuadraticBeliefValue(self.dm_belief, self.nb_steps + 1)
+        bvalue = QuadraticBeliefValue(self.dm_belief, self.nb_steps + 1, self.vech)
 
         bvalue.S, bvalue.s, bvalue.tau,\
         dS, lc.K, lc.kff, diverge = backward_pass(self.cost.Q, self.cost.q,
@@ -104,7 +133,7 @@ class BSPiLQR:
                                                   self.dyn.T, self.dyn.U,
                                                   self.dyn.V, self.dyn.X,
                                                   self.dyn.Y, self.dyn.Z,
-                                                  self.lmbda, self.reg,
+                                                  self.lmbda, self.reg, self.vech,
                                                   self.dm_belief, self.dm_act, self.nb_steps)
         return lc, bvalue, dS, diverge
 
@@ -128,9 +157,7 @@ class BSPiLQR:
 
         plt.show()
 
-    def run(self, nb_iter=250):
-        _trace = []
-        # init trajectory
+    def init_trajectory(self):
         for alpha in self.alphas:
             _belief, _action, _cost = self.forward_pass(self.ctl, alpha)
             if np.all(_belief.mu < 1e8):
@@ -141,72 +168,122 @@ class BSPiLQR:
             else:
                 print("Initial trajectory diverges")
 
-        _trace.append(self.last_return)
+        return self.last_return
 
-        for _ in range(nb_iter):
-            # get linear system dynamics around ref traj.
-            self.dyn.taylor_expansion(self.bref, self.uref)
+    def linearize(self):
+        # get linear system dynamics around ref traj.
+        self.dyn.taylor_expansion(self.bref, self.uref)
 
-            # get quadratic cost around ref traj.
-            self.cost.taylor_expansion(self.bref, self.uref, self.activation)
+        # get quadratic cost around ref traj.
+        self.cost.taylor_expansion(self.bref, self.uref, self.activation)
 
-            bvalue = None
-            lc, dvalue = None, None
-            # execute a backward pass
-            backpass_done = False
-            while not backpass_done:
-                lc, bvalue, dvalue, diverge = self.backward_pass()
-                if np.any(diverge):
-                    # increase lmbda
-                    self.dlmbda = np.maximum(self.dlmbda * self.mult_lmbda, self.mult_lmbda)
-                    self.lmbda = np.maximum(self.lmbda * self.dlmbda, self.min_lmbda)
-                    if self.lmbda > self.max_lmbda:
-                        break
-                    else:
-                        continue
+    def regularized_backward_pass(self):
+        lc, bvalue, dvalue = None, None, None
+
+        backpass_done = False
+        while not backpass_done:
+            lc, bvalue, dvalue, diverge = self.backward_pass()
+            if np.any(diverge):
+                profiling.count('backward_pass_retries')
+                profiling.count('lmbda_increases')
+                # increase lmbda
+                self.dlmbda = np.maximum(self.dlmbda * self.mult_lmbda, self.mult_lmbda)
+                self.lmbda = np.maximum(self.lmbda * self.dlmbda, self.min_lmbda)
+                if self.lmbda > self.max_lmbda:
+                    break
                 else:
-                    backpass_done = True
+                    continue
+            else:
+                backpass_done = True
+
+        return lc, bvalue, dvalue, backpass_done
+
+    def gradient_converged(self, lc):
+        # terminate if gradient too small
+        _g_norm = np.mean(np.max(np.abs(lc.kff) / (np.abs(self.uref) + 1.), axis=1))
+        if _g_norm < self.tolgrad and self.lmbda < 1e-5:
+            self.dlmbda = np.minimum(self.dlmbda / self.mult_lmbda, 1. / self.mult_lmbda)
+            self.lmbda = self.lmbda * self.dlmbda * (self.lmbda > self.min_lmbda)
+            return True
+        return False
+
+    def improvement(self, _return, dvalue, alpha):
+        # realized over expected improvement
+        _dreturn = self.last_return - _return
+        _expected = - 1. * alpha * (dvalue[0] + alpha * dvalue[1])
+        return _dreturn, _dreturn / _expected
+
+    def line_search(self, lc, dvalue):
+        _belief, _action = None, None
+        _return, _dreturn = None, None
+
+        for alpha in self.alphas:
+            profiling.count('line_search_trials')
+            # apply on actual system
+            _belief, _action, _cost = self.forward_pass(ctl=lc, alpha=alpha)
+
+            # summed mean return
+            _return = np.sum(_cost)
+
+            # check return improvement
+            _dreturn, _imp = self.improvement(_return, dvalue, alpha)
+            if _imp > self.min_imp:
+                return True, _belief, _action, _return, _dreturn
+
+        return False, _belief, _action, _return, _dreturn
+
+    def accept(self, lc, bvalue, belief, action, _return):
+        # decrease lmbda
+        self.dlmbda = np.minimum(self.dlmbda / self.mult_lmbda, 1. / self.mult_lmbda)
+        self.lmbda = self.lmbda * self.dlmbda * (self.lmbda > self.min_lmbda)
+
+        self.bref = belief
+        self.uref = action
+        self.last_return = _return
+
+        self.vfunc = bvalue
+
+        self.ctl = lc
+
+    def reject(self):
+        # increase lmbda, true if regularization exhausted
+        profiling.count('lmbda_increases')
+        self.dlmbda = np.maximum(self.dlmbda * self.mult_lmbda, self.mult_lmbda)
+        self.lmbda = np.maximum(self.lmbda * self.dlmbda, self.min_lmbda)
+        return self.lmbda > self.max_lmbda
+
+    @profiling.profiled
+    def run(self, nb_iter=250):
+        _trace = []
+        # init trajectory
+        profiling.phase('rollout')
+        _trace.append(self.init_trajectory())
+
+        for iter in range(nb_iter):
+            profiling.iteration(iter)
+
+            # linearize around ref traj.
+            profiling.phase('taylor_expansion')
+            self.linearize()
+
+            # execute a backward pass
+            profiling.phase('backward_pass')
+            lc, bvalue, dvalue, backpass_done = self.regularized_backward_pass()
 
             # terminate if gradient too small
-            _g_norm = np.mean(np.max(np.abs(lc.kff) / (np.abs(self.uref) + 1.), axis=1))
-            if _g_norm < self.tolgrad and self.lmbda < 1e-5:
-                self.dlmbda = np.minimum(self.dlmbda / self.mult_lmbda, 1. / self.mult_lmbda)
-                self.lmbda = self.lmbda * self.dlmbda * (self.lmbda > self.min_lmbda)
+            if self.gradient_converged(lc):
                 break
 
-            _belief, _action = None, None
-            _return, _dreturn = None, None
             # execute a forward pass
+            profiling.phase('line_search')
             fwdpass_done = False
             if backpass_done:
-                for alpha in self.alphas:
-                    # apply on actual system
-                    _belief, _action, _cost = self.forward_pass(ctl=lc, alpha=alpha)
-
-                    # summed mean return
-                    _return = np.sum(_cost)
-
-                    # check return improvement
-                    _dreturn = self.last_return - _return
-                    _expected = - 1. * alpha * (dvalue[0] + alpha * dvalue[1])
-                    _imp = _dreturn / _expected
-                    if _imp > self.min_imp:
-                        fwdpass_done = True
-                        break
+                fwdpass_done, _belief, _action,\
+                _return, _dreturn = self.line_search(lc, dvalue)
 
             # accept or reject
             if fwdpass_done:
-                # decrease lmbda
-                self.dlmbda = np.minimum(self.dlmbda / self.mult_lmbda, 1. / self.mult_lmbda)
-                self.lmbda = self.lmbda * self.dlmbda * (self.lmbda > self.min_lmbda)
-
-                self.bref = _belief
-                self.uref = _action
-                self.last_return = _return
-
-                self.vfunc = bvalue
-
-                self.ctl = lc
+                self.accept(lc, bvalue, _belief, _action, _return)
 
                 _trace.append(self.last_return)
 
@@ -214,12 +291,7 @@ class BSPiLQR:
                 if _dreturn < self.tolfun:
                     break
             else:
-                # increase lmbda
-                self.dlmbda = np.maximum(self.dlmbda * self.mult_lmbda, self.mult_lmbda)
-                self.lmbda = np.maximum(self.lmbda * self.dlmbda, self.min_lmbda)
-                if self.lmbda > self.max_lmbda:
+                if self.reject():
                     break
-                else:
-                    continue
 
         return _trace
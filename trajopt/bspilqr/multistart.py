@@ -0,0 +1,254 @@
+import autograd.numpy as np
+
+from trajopt import trajectory
+
+from trajopt.bspilqr.objects import Gaussian
+from trajopt.bspilqr.objects import AnalyticalLinearBeliefDynamics
+
+from trajopt.bspilqr.bspilqr import BSPiLQR
+
+
+class MultiStartBSPiLQR:
+
+    def __init__(self, env, nb_steps, nb_starts,
+                 priors=None, kff=None, **kwargs):
+
+        self.env = env
+
+        self.nb_steps = nb_steps
+        self.nb_starts = nb_starts
+
+        # one solver state per start, optionally from
+        # different priors and initial open-loop controls
+        self.starts = []
+        for k in range(self.nb_starts):
+            _prior = None if priors is None else priors[k]
+            _start = BSPiLQR(env, nb_steps, prior=_prior, **kwargs)
+            if kff is not None:
+                _start.ctl.kff = np.copy(kff[k])
+            self.starts.append(_start)
+
+        _ref = self.starts[0]
+
+        self.dm_belief = _ref.dm_belief
+        self.dm_obs = _ref.dm_obs
+        self.dm_act = _ref.dm_act
+
+        self.sqrt = _ref.sqrt
+        self.vech = _ref.vech
+
+        self.alphas = _ref.alphas
+        self.activation = _ref.activation
+
+        self.cost = _ref.cost
+
+        # shared model, linearized over all starts and
+        # time steps stacked along the time dimension
+        self.dyn = AnalyticalLinearBeliefDynamics(_ref.env_init, _ref.env_dyn, _ref.env_obs,
+                                                  _ref.env_dyn_noise, _ref.env_obs_noise,
+                                                  self.dm_belief, self.dm_obs, self.dm_act,
+                                                  self.nb_steps * self.nb_starts,
+                                                  self.vech, self.sqrt,
+                                                  _ref.env_batch)
+
+    @property
+    def best(self):
+        return self.starts[int(np.argmin([_start.last_return for _start in self.starts]))]
+
+    @property
+    def bref(self):
+        return self.best.bref
+
+    @property
+    def uref(self):
+        return self.best.uref
+
+    @property
+    def ctl(self):
+        return self.best.ctl
+
+    def forward_pass(self, idx, ctls, alpha):
+        nb = len(idx)
+
+        # time-major with the starts innermost, each
+        # batched step is one contiguous block
+        mu = trajectory.zeros((nb, self.dm_belief, self.nb_steps + 1))
+        sigma = trajectory.zeros((nb, self.dm_belief, self.dm_belief, self.nb_steps + 1))
+        chol = trajectory.zeros((nb, self.dm_belief, self.dm_belief, self.nb_steps + 1))
+
+        action = trajectory.zeros((nb, self.dm_act, self.nb_steps))
+        cost = np.zeros((nb, self.nb_steps + 1))
+
+        for n, k in enumerate(idx):
+            mu[n, :, 0], sigma[n, ..., 0] = self.starts[k].prior
+            if self.sqrt:
+                chol[n, ..., 0] = np.linalg.cholesky(sigma[n, ..., 0])
+
+        K = trajectory.asarray(np.stack([_ctl.K for _ctl in ctls]))
+        kff = trajectory.asarray(np.stack([_ctl.kff for _ctl in ctls]))
+
+        bref = trajectory.asarray(np.stack([self.starts[k].bref.mu for k in idx]))
+        uref = trajectory.asarray(np.stack([self.starts[k].uref for k in idx]))
+
+        for t in range(self.nb_steps):
+            dx = mu[..., t] - bref[..., t]
+            action[..., t] = uref[..., t] + alpha * kff[..., t] + np.einsum('nij,nj->ni', K[..., t], dx)
+
+            for n in range(nb):
+                cost[n, t] = self.cost.evalf(mu[n, :, t], sigma[n, ..., t],
+                                             action[n, :, t], self.activation[t])
+
+            if self.sqrt:
+                mu[..., t + 1], _, chol[..., t + 1] = self.dyn.ekf_sqrt_batch(mu[..., t], chol[..., t],
+                                                                              action[..., t])
+                sigma[..., t + 1] = chol[..., t + 1] @ np.swapaxes(chol[..., t + 1], -1, -2)
+            else:
+                mu[..., t + 1], _, sigma[..., t + 1] = self.dyn.ekf_batch(mu[..., t], sigma[..., t],
+                                                                          action[..., t])
+
+        for n in range(nb):
+            cost[n, -1] = self.cost.evalf(mu[n, :, -1], sigma[n, ..., -1],
+                                          np.zeros((self.dm_act, )), self.activation[-1])
+
+        beliefs = []
+        for n in range(nb):
+            _belief = Gaussian(self.dm_belief, self.nb_steps + 1)
+            _belief.mu, _belief.sigma = trajectory.asarray(mu[n]), trajectory.asarray(sigma[n])
+            if self.sqrt:
+                _belief.chol = trajectory.asarray(chol[n])
+            beliefs.append(_belief)
+
+        actions = [trajectory.asarray(action[n]) for n in range(nb)]
+
+        return beliefs, actions, cost
+
+    def init_trajectory(self):
+        pending = list(range(self.nb_starts))
+        for alpha in self.alphas:
+            if not pending:
+                break
+
+            _ctls = [self.starts[k].ctl for k in pending]
+            _beliefs, _actions, _costs = self.forward_pass(pending, _ctls, alpha)
+
+            _diverged = []
+            for n, k in enumerate(pending):
+                if np.all(_beliefs[n].mu < 1e8):
+                    self.starts[k].bref = _beliefs[n]
+                    self.starts[k].uref = _actions[n]
+                    self.starts[k].last_return = np.sum(_costs[n])
+                else:
+                    print("Initial trajectory diverges")
+                    _diverged.append(k)
+
+            pending = _diverged
+
+    def linearize(self, idx):
+        nb = len(idx)
+
+        # stack reference trajectories along time
+        belief = Gaussian(self.dm_belief, nb * self.nb_steps + 1)
+        action = trajectory.zeros((self.dm_act, nb * self.nb_steps))
+        for n, k in enumerate(idx):
+            _slice = slice(n * self.nb_steps, (n + 1) * self.nb_steps)
+            _start = self.starts[k]
+
+            belief.mu[:, _slice] = _start.bref.mu[:, :-1]
+            belief.sigma[..., _slice] = _start.bref.sigma[..., :-1]
+            belief.chol[..., _slice] = _start.bref.chol[..., :-1]
+            action[:, _slice] = _start.uref
+
+        # one batched linearization for all active starts
+        self.dyn.nb_steps = nb * self.nb_steps
+        self.dyn.taylor_expansion(belief, action)
+
+        for n, k in enumerate(idx):
+            _slice = slice(n * self.nb_steps, (n + 1) * self.nb_steps)
+            _start = self.starts[k]
+
+            for _name in ('F', 'G', 'T', 'U', 'V', 'X', 'Y', 'Z'):
+                setattr(_start.dyn, _name, getattr(self.dyn, _name)[..., _slice])
+
+            _start.cost.taylor_expansion(_start.bref, _start.uref, _start.activation)
+
+    def line_search(self, candidates):
+        # lockstep backtracking, starts leave once improved
+        accepted = {}
+
+        pending = list(candidates.keys())
+        for alpha in self.alphas:
+            if not pending:
+                break
+
+            _ctls = [candidates[k][0] for k in pending]
+            _beliefs, _actions, _costs = self.forward_pass(pending, _ctls, alpha)
+
+            _rejected = []
+            for n, k in enumerate(pending):
+                _return = np.sum(_costs[n])
+                _dreturn, _imp = self.starts[k].improvement(_return, candidates[k][2], alpha)
+                if _imp > self.starts[k].min_imp:
+                    accepted[k] = (_beliefs[n], _actions[n], _return, _dreturn)
+                else:
+                    _rejected.append(k)
+
+            pending = _rejected
+
+        return accepted
+
+    def run(self, nb_iter=250):
+        _traces = [[] for _ in range(self.nb_starts)]
+
+        # init trajectories
+        self.init_trajectory()
+        for k, _start in enumerate(self.starts):
+            _traces[k].append(_start.last_return)
+
+        active = list(range(self.nb_starts))
+        for _ in range(nb_iter):
+            if not active:
+                break
+
+            # linearize around all active ref trajs.
+            self.linearize(active)
+
+            # execute backward passes
+            candidates, stopped = {}, []
+            for k in active:
+                _start = self.starts[k]
+
+                lc, bvalue, dvalue, backpass_done = _start.regularized_backward_pass()
+
+                # terminate if gradient too small
+                if _start.gradient_converged(lc):
+                    stopped.append(k)
+                elif backpass_done:
+                    candidates[k] = (lc, bvalue, dvalue)
+                elif _start.reject():
+                    stopped.append(k)
+
+            # execute batched forward passes
+            accepted = self.line_search(candidates)
+
+            # accept or reject
+            for k, (lc, bvalue, _) in candidates.items():
+                _start = self.starts[k]
+                if k in accepted:
+                    _belief, _action, _return, _dreturn = accepted[k]
+                    _start.accept(lc, bvalue, _belief, _action, _return)
+
+                    _traces[k].append(_start.last_return)
+
+                    # terminate if reached objective tolerance
+                    if _dreturn < _start.tolfun:
+                        stopped.append(k)
+                else:
+                    if _start.reject():
+                        stopped.append(k)
+
+            active = [k for k in active if k not in stopped]
+
+        return _traces
+
+    def plot(self):
+        self.best.plot()
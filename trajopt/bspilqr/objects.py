@@ -1,6 +1,11 @@
 import autograd.numpy as np
 from autograd import jacobian, hessian
-from autograd.misc import flatten
+
+import warnings
+
+from scipy import linalg
+
+from trajopt import trajectory
 
 
 class Gaussian:
@@ -8,11 +13,14 @@ class Gaussian:
         self.nb_dim = nb_dim
         self.nb_steps = nb_steps
 
-        self.mu = np.zeros((self.nb_dim, self.nb_steps))
-        self.sigma = np.zeros((self.nb_dim, self.nb_dim, self.nb_steps))
+        self.mu = trajectory.zeros((self.nb_dim, self.nb_steps))
+        self.sigma = trajectory.zeros((self.nb_dim, self.nb_dim, self.nb_steps))
         for t in range(self.nb_steps):
             self.sigma[..., t] = np.eye(self.nb_dim)
 
+        # lower cholesky factor of sigma, kept in square-root mode
+        self.chol = np.copy(self.sigma)
+
     @property
     def params(self):
         return self.mu, self.sigma
@@ -22,31 +30,112 @@ class Gaussian:
         self.mu, self.sigma = values
 
 
+def vech_indices(dim):
+    # lower triangle in column-major order
+    j, i = np.triu_indices(dim)
+    return i, j
+
+
+def cov_dim(dim, vech=False):
+    return dim * (dim + 1) // 2 if vech else dim * dim
+
+
+def sqrt_ekf_factors(chol, A, chol_dyn, H, chol_obs):
+    # square-root ekf by orthogonal triangularization, supports
+    # stacked leading dimensions, returns the factors of the predicted
+    # covariance and of the innovation, the factor of the stochastic
+    # mean dynamics and the posterior cholesky factor
+    dm_obs = H.shape[-2]
+
+    def _t(M):
+        return np.swapaxes(M, -1, -2)
+
+    # prediction
+    _pre = np.concatenate((_t(A @ chol), _t(chol_dyn)), axis=-2)
+    _chol_pred = _t(np.linalg.qr(_pre, mode='r'))
+
+    # update
+    _zeros = np.zeros(_chol_pred.shape[:-2] + (_chol_pred.shape[-2], dm_obs))
+    _pre = np.concatenate((np.concatenate((chol_obs, H @ _chol_pred), axis=-1),
+                           np.concatenate((_zeros, _chol_pred), axis=-1)), axis=-2)
+    _post = _t(np.linalg.qr(_t(_pre), mode='r'))
+
+    _chol_inn = _post[..., :dm_obs, :dm_obs]
+    _gain = _post[..., dm_obs:, :dm_obs]
+    _chol = _post[..., dm_obs:, dm_obs:]
+
+    # unique factor with positive diagonal
+    _sign = np.sign(np.diagonal(_chol, axis1=-2, axis2=-1))
+    _chol = _chol * np.where(_sign == 0., 1., _sign)[..., None, :]
+
+    return _chol_pred, _chol_inn, _gain, _chol
+
+
+def sqrt_ekf_update(chol, A, chol_dyn, H, chol_obs):
+    # factor of the stochastic mean dynamics and posterior cholesky factor
+    _, _, _gain, _chol = sqrt_ekf_factors(chol, A, chol_dyn, H, chol_obs)
+    return _gain, _chol
+
+
+def solve_tril(L, B):
+    # solves L[t] X[t, ...] = B[t, ...] for lower triangular L stacked
+    # over time, all right-hand sides of a step in one triangular solve
+    X = np.empty(B.shape)
+    for t in range(L.shape[0]):
+        _B = np.moveaxis(B[t], -2, 0)
+        _X = linalg.solve_triangular(L[t], np.reshape(_B, (_B.shape[0], -1)),
+                                     lower=True, check_finite=False)
+        X[t] = np.moveaxis(np.reshape(_X, _B.shape), 0, -2)
+    return X
+
+
+def stacked(fun):
+    # a single-step function over steps in the last axis of its
+    # arguments, for models without a batched implementation
+    def _stacked(*args):
+        return np.stack([fun(*_args) for _args in zip(*[np.moveaxis(_a, -1, 0) for _a in args])], axis=-1)
+    return _stacked
+
+
+def batch_jacobian(fun, argnum=0):
+    # jacobians of a function that maps each step in the last axis
+    # independently, traced once for all steps. a step's outputs only
+    # depend on its own inputs, so the jacobian of the sum over steps
+    # holds all of them, with the steps in the last axis
+    return jacobian(lambda *args: np.sum(fun(*args), axis=-1), argnum)
+
+
 class QuadraticBeliefValue:
-    def __init__(self, dm_belief, nb_steps):
+    def __init__(self, dm_belief, nb_steps, vech=False):
         self.dm_belief = dm_belief
+        self.dm_cov = cov_dim(dm_belief, vech)
         self.nb_steps = nb_steps
 
-        self.S = np.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
-        self.s = np.zeros((self.dm_belief, self.nb_steps, ))
-        self.tau = np.zeros((self.dm_belief, self.nb_steps, ))
+        self.S = trajectory.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
+        self.s = trajectory.zeros((self.dm_belief, self.nb_steps, ))
+        self.tau = trajectory.zeros((self.dm_cov, self.nb_steps, ))
 
 
 class QuadraticCost:
-    def __init__(self, dm_belief, dm_act, nb_steps):
+    def __init__(self, dm_belief, dm_act, nb_steps, vech=False, sqrt=False):
         self.dm_belief = dm_belief
         self.dm_act = dm_act
 
+        # full or half-vectorized covariance, or its cholesky factor
+        self.sqrt = sqrt
+        self.vech = vech or sqrt
+        self.dm_cov = cov_dim(dm_belief, self.vech)
+
         self.nb_steps = nb_steps
 
-        self.Q = np.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
-        self.q = np.zeros((self.dm_belief, self.nb_steps))
+        self.Q = trajectory.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
+        self.q = trajectory.zeros((self.dm_belief, self.nb_steps))
 
-        self.R = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
-        self.r = np.zeros((self.dm_act, self.nb_steps))
+        self.R = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.r = trajectory.zeros((self.dm_act, self.nb_steps))
 
-        self.P = np.zeros((self.dm_belief, self.dm_act, self.nb_steps))
-        self.p = np.zeros((self.dm_belief * self.dm_belief, self.nb_steps))
+        self.P = trajectory.zeros((self.dm_belief, self.dm_act, self.nb_steps))
+        self.p = trajectory.zeros((self.dm_cov, self.nb_steps))
 
     @property
     def params(self):
@@ -58,8 +147,8 @@ class QuadraticCost:
 
 
 class AnalyticalQuadraticCost(QuadraticCost):
-    def __init__(self, f_cost, dm_belief, dm_act, nb_steps):
-        super(AnalyticalQuadraticCost, self).__init__(dm_belief, dm_act, nb_steps)
+    def __init__(self, f_cost, dm_belief, dm_act, nb_steps, vech=False, sqrt=False):
+        super(AnalyticalQuadraticCost, self).__init__(dm_belief, dm_act, nb_steps, vech, sqrt)
 
         self.f = f_cost
 
@@ -89,40 +178,56 @@ class AnalyticalQuadraticCost(QuadraticCost):
             self.r[..., t] = self.fr(*_in)
 
             self.P[..., t] = self.fP(*_in)
-            self.p[..., t] = np.reshape(self.fp(*_in),
-                                        (self.dm_belief * self.dm_belief), order='F')
+            if self.sqrt:
+                # gradient wrt. the lower cholesky factor
+                _p = self.fp(*_in)
+                _p = (_p + _p.T) @ b.chol[..., t]
+                self.p[..., t] = _p[vech_indices(self.dm_belief)]
+            elif self.vech:
+                # gradient wrt. the unique entries of a symmetric matrix
+                _p = self.fp(*_in)
+                _p = _p + _p.T - np.diag(np.diag(_p))
+                self.p[..., t] = _p[vech_indices(self.dm_belief)]
+            else:
+                self.p[..., t] = np.reshape(self.fp(*_in),
+                                            (self.dm_belief * self.dm_belief), order='F')
 
 
 class LinearBeliefDynamics:
-    def __init__(self, dm_belief, dm_obs, dm_act, nb_steps):
+    def __init__(self, dm_belief, dm_obs, dm_act, nb_steps, vech=False, sqrt=False):
         self.dm_belief = dm_belief
         self.dm_obs = dm_obs
         self.dm_act = dm_act
 
+        # full or half-vectorized covariance, or its cholesky factor
+        self.sqrt = sqrt
+        self.vech = vech or sqrt
+        self.dm_cov = cov_dim(dm_belief, self.vech)
+
         self.nb_steps = nb_steps
 
         # Linearization of dynamics
-        self.A = np.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
-        self.H = np.zeros((self.dm_obs, self.dm_obs, self.nb_steps))
+        self.A = trajectory.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
+        self.H = trajectory.zeros((self.dm_obs, self.dm_obs, self.nb_steps))
 
         # EKF matrices
-        self.K = np.zeros((self.dm_belief, self.dm_obs, self.nb_steps))
-        self.D = np.zeros((self.dm_belief, self.dm_obs, self.nb_steps))
+        self.K = trajectory.zeros((self.dm_belief, self.dm_obs, self.nb_steps))
+        self.D = trajectory.zeros((self.dm_belief, self.dm_obs, self.nb_steps))
 
         # Linearization of belief dynamics
-        self.F = np.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
-        self.G = np.zeros((self.dm_belief, self.dm_act, self.nb_steps))
+        self.F = trajectory.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
+        self.G = trajectory.zeros((self.dm_belief, self.dm_act, self.nb_steps))
 
-        self.T = np.zeros((self.dm_belief * self.dm_belief, self.dm_belief, self.nb_steps))
-        self.U = np.zeros((self.dm_belief * self.dm_belief, self.dm_belief * self.dm_belief, self.nb_steps))
-        self.V = np.zeros((self.dm_belief * self.dm_belief, self.dm_act, self.nb_steps))
+        self.T = trajectory.zeros((self.dm_cov, self.dm_belief, self.nb_steps))
+        self.U = trajectory.zeros((self.dm_cov, self.dm_cov, self.nb_steps))
+        self.V = trajectory.zeros((self.dm_cov, self.dm_act, self.nb_steps))
 
-        self.X = np.zeros((self.dm_belief * self.dm_belief, self.dm_belief, self.nb_steps))
-        self.Y = np.zeros((self.dm_belief * self.dm_belief, self.dm_belief * self.dm_belief, self.nb_steps))
-        self.Z = np.zeros((self.dm_belief * self.dm_belief, self.dm_act, self.nb_steps))
+        self.X = trajectory.zeros((self.dm_cov, self.dm_belief, self.nb_steps))
+        self.Y = trajectory.zeros((self.dm_cov, self.dm_cov, self.nb_steps))
+        self.Z = trajectory.zeros((self.dm_cov, self.dm_act, self.nb_steps))
 
-        self.sigma_x = np.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
-        self.sigma_z = np.zeros((self.dm_obs, self.dm_obs, self.nb_steps))
+        self.sigma_x = trajectory.zeros((self.dm_belief, self.dm_belief, self.nb_steps))
+        self.sigma_z = trajectory.zeros((self.dm_obs, self.dm_obs, self.nb_steps))
 
     @property
     def params(self):
@@ -140,8 +245,10 @@ class LinearBeliefDynamics:
 class AnalyticalLinearBeliefDynamics(LinearBeliefDynamics):
     def __init__(self, f_init, f_dyn, f_obs,
                  noise_dyn, noise_obs,
-                 dm_belief, dm_obs, dm_act, nb_steps):
-        super(AnalyticalLinearBeliefDynamics, self).__init__(dm_belief, dm_obs, dm_act, nb_steps)
+                 dm_belief, dm_obs, dm_act, nb_steps,
+                 vech=False, sqrt=False, batch=None):
+        super(AnalyticalLinearBeliefDynamics, self).__init__(dm_belief, dm_obs, dm_act,
+                                                             nb_steps, vech, sqrt)
 
         self.i = f_init
         self.f = f_dyn
@@ -153,6 +260,26 @@ class AnalyticalLinearBeliefDynamics(LinearBeliefDynamics):
         self.dfdx = jacobian(self.f, 0)
         self.dhdx = jacobian(self.h, 0)
 
+        # dynamics, observation and noise models over steps in the
+        # last axis, the env's batched ones or stacked single steps
+        if batch is None:
+            batch = map(stacked, (self.f, self.h, self.noise_dyn, self.noise_obs))
+        self.f_batch, self.h_batch, self.noise_dyn_batch, self.noise_obs_batch = batch
+
+        # first and second order terms for the belief linearization,
+        # each traced once per call for all time steps
+        self.dfdx_batch = batch_jacobian(self.f_batch, 0)
+        self.dfdu_batch = batch_jacobian(self.f_batch, 1)
+        self.dhdx_batch = batch_jacobian(self.h_batch, 0)
+
+        self.d2fdxx_batch = batch_jacobian(self.dfdx_batch, 0)
+        self.d2fdxu_batch = batch_jacobian(self.dfdx_batch, 1)
+        self.d2hdxx_batch = batch_jacobian(self.dhdx_batch, 0)
+
+        self.dQdx_batch = batch_jacobian(self.noise_dyn_batch, 0)
+        self.dQdu_batch = batch_jacobian(self.noise_dyn_batch, 1)
+        self.dRdy_batch = batch_jacobian(self.noise_obs_batch, 0)
+
         # # legacy
         # self.fm = lambda mu_b, sigma_b, u: self.ekf(mu_b, sigma_b, u)[0]
         # self.W = lambda mu_b, sigma_b, u: self.ekf(mu_b, sigma_b, u)[1]
@@ -201,40 +328,181 @@ class AnalyticalLinearBeliefDynamics(LinearBeliefDynamics):
 
         return _f, _W, _phi
 
-    def taylor_expansion(self, b, u):
-        for t in range(self.nb_steps):
-            _in = tuple([b.mu[..., t], b.sigma[..., t], u[..., t]])
+    def ekf_sqrt(self, mu_b, chol_b, u):
+        # square-root extended kalman filtering
+        _f = self.evalf(mu_b, u)
 
-            _in_flat, _unflatten = flatten(_in)
+        _A = self.dfdx(mu_b, u)
+        _H = self.dhdx(_f)
+
+        _chol_dyn = np.linalg.cholesky(self.noise_dyn(mu_b, u))
+        _chol_obs = np.linalg.cholesky(self.noise_obs(_f))
+
+        _gain, _chol = sqrt_ekf_update(chol_b, _A, _chol_dyn, _H, _chol_obs)
+
+        return _f, _gain @ _gain.T, _chol
 
-            def _ekf_flat(_in_flat):
-                return flatten(self.ekf(*_unflatten(_in_flat)))[0]
+    def model_terms(self, mu_b, u):
+        # model evaluations for stacked beliefs and actions
+        _f = np.stack([self.evalf(_mu, _u) for _mu, _u in zip(mu_b, u)])
+        _A = np.stack([self.dfdx(_mu, _u) for _mu, _u in zip(mu_b, u)])
+        _H = np.stack([self.dhdx(_fn) for _fn in _f])
 
-            _ekf_jac = jacobian(_ekf_flat)
+        _Q = np.stack([self.noise_dyn(_mu, _u) for _mu, _u in zip(mu_b, u)])
+        _R = np.stack([self.noise_obs(_fn) for _fn in _f])
 
-            _grads = _ekf_jac(_in_flat)
-            self.F[..., t] = _grads[:self.dm_belief, :self.dm_belief]
-            self.G[..., t] = _grads[:self.dm_belief, -self.dm_act:]
+        return _f, _A, _H, _Q, _R
 
-            self.X[..., t] = _grads[self.dm_belief:self.dm_belief + self.dm_belief * self.dm_belief, :self.dm_belief]
-            self.Y[..., t] = _grads[self.dm_belief:self.dm_belief + self.dm_belief * self.dm_belief, self.dm_belief:self.dm_belief + self.dm_belief * self.dm_belief]
-            self.Z[..., t] = _grads[self.dm_belief:self.dm_belief + self.dm_belief * self.dm_belief, -self.dm_act:]
+    def ekf_batch(self, mu_b, sigma_b, u):
+        # extended kalman filtering over a leading stack dimension
+        _f, _A, _H, _Q, _R = self.model_terms(mu_b, u)
 
-            self.T[..., t] = _grads[self.dm_belief + self.dm_belief * self.dm_belief:, :self.dm_belief]
-            self.U[..., t] = _grads[self.dm_belief + self.dm_belief * self.dm_belief:, self.dm_belief:self.dm_belief + self.dm_belief * self.dm_belief]
-            self.V[..., t] = _grads[self.dm_belief + self.dm_belief * self.dm_belief:, -self.dm_act:]
+        def _t(M):
+            return np.swapaxes(M, -1, -2)
 
-            # # legacy
-            # self.F[..., t] = self.fF(_mu_b, _sigma_b, _u)
-            # self.G[..., t] = self.fG(_mu_b, _sigma_b, _u)
+        _D = _A @ sigma_b @ _t(_A) + _Q
+        _D = 0.5 * (_D + _t(_D))
 
-            # self.X[..., t] = np.reshape(self.fX(_mu_b, _sigma_b, _u), (self.dm_belief * self.dm_belief, self.dm_belief), order='F')
-            # self.Y[..., t] = np.reshape(self.fY(_mu_b, _sigma_b, _u), (self.dm_belief * self.dm_belief, self.dm_belief * self.dm_belief), order='F')
-            # self.Z[..., t] = np.reshape(self.fZ(_mu_b, _sigma_b, _u), (self.dm_belief * self.dm_belief, self.dm_act), order='F')
+        _HD = _H @ _D
+        _K = _t(np.linalg.solve(_HD @ _t(_H) + _R, _HD))
 
-            # self.T[..., t] = np.reshape(self.fT(_mu_b, _sigma_b, _u), (self.dm_belief * self.dm_belief, self.dm_belief), order='F')
-            # self.U[..., t] = np.reshape(self.fU(_mu_b, _sigma_b, _u), (self.dm_belief * self.dm_belief, self.dm_belief * self.dm_belief), order='F')
-            # self.V[..., t] = np.reshape(self.fV(_mu_b, _sigma_b, _u), (self.dm_belief * self.dm_belief, self.dm_act), order='F')
+        _W = _K @ _HD
+
+        _phi = _D - _W
+        _phi = 0.5 * (_phi + _t(_phi))
+
+        return _f, _W, _phi
+
+    def ekf_sqrt_batch(self, mu_b, chol_b, u):
+        # square-root extended kalman filtering over a leading stack dimension
+        _f, _A, _H, _Q, _R = self.model_terms(mu_b, u)
+
+        _gain, _chol = sqrt_ekf_update(chol_b, _A, np.linalg.cholesky(_Q),
+                                       _H, np.linalg.cholesky(_R))
+
+        return _f, _gain @ np.swapaxes(_gain, -1, -2), _chol
+
+    def local_derivatives(self, b, u):
+        # first and second order terms of the model functions,
+        # stacked over time in leading dimension
+        _mu_b, _u = b.mu[..., :self.nb_steps], u
+        _y = self.f_batch(_mu_b, _u)
+
+        # constant noise models have vanishing derivatives
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message="Output seems independent of input.")
+
+            _terms = (self.dfdx_batch(_mu_b, _u), self.dfdu_batch(_mu_b, _u),
+                      self.d2fdxx_batch(_mu_b, _u), self.d2fdxu_batch(_mu_b, _u),
+                      self.dhdx_batch(_y), self.d2hdxx_batch(_y),
+                      self.noise_dyn_batch(_mu_b, _u),
+                      self.dQdx_batch(_mu_b, _u), self.dQdu_batch(_mu_b, _u),
+                      self.noise_obs_batch(_y), self.dRdy_batch(_y))
+
+        return [np.moveaxis(_v, -1, 0) for _v in _terms]
+
+    def taylor_expansion(self, b, u):
+        # forward-mode derivatives of the ekf, propagated
+        # along all input directions and time steps at once
+        A, B, dAdx, dAdu, H, dHdy, Q, dQdx, dQdu, R, dRdy = self.local_derivatives(b, u)
+
+        def _t(M):
+            return np.swapaxes(M, -1, -2)
+
+        # unit tangents of the inputs (mu_b, sigma_b, u),
+        # symmetric pairs move together in half-vectorized form
+        dm_in = self.dm_belief + self.dm_cov + self.dm_act
+        _E = np.eye(dm_in)
+        dmu = _E[:, :self.dm_belief]
+        du = _E[:, -self.dm_act:]
+        if self.sqrt:
+            # factor entries as input tangents
+            _i, _j = vech_indices(self.dm_belief)
+            _k = self.dm_belief + np.arange(self.dm_cov)
+            dchol = np.zeros((dm_in, self.dm_belief, self.dm_belief))
+            dchol[_k, _i, _j] = 1.
+        elif self.vech:
+            _i, _j = vech_indices(self.dm_belief)
+            _k = self.dm_belief + np.arange(self.dm_cov)
+            dsigma = np.zeros((dm_in, self.dm_belief, self.dm_belief))
+            dsigma[_k, _i, _j] = 1.
+            dsigma[_k, _j, _i] = 1.
+        else:
+            dsigma = np.reshape(_E[:, self.dm_belief:-self.dm_act], (dm_in, self.dm_belief, self.dm_belief))
+
+        # tangents of model terms, (nb_steps, dm_in, ...)
+        df = np.einsum('tij,pj->tpi', A, dmu) + np.einsum('tij,pj->tpi', B, du)
+        dA = np.einsum('tijk,pk->tpij', dAdx, dmu) + np.einsum('tijk,pk->tpij', dAdu, du)
+        dH = np.einsum('tijk,tpk->tpij', dHdy, df)
+        dQ = np.einsum('tijk,pk->tpij', dQdx, dmu) + np.einsum('tijk,pk->tpij', dQdu, du)
+        dR = np.einsum('tijk,tpk->tpij', dRdy, df)
+
+        if self.sqrt:
+            # tangents carried through the factors of the filter,
+            # inverses are triangular solves with the innovation
+            # and posterior factors, no symmetrization is needed
+            chol = trajectory.steps(b.chol[..., :self.nb_steps])
+            chol_pred, chol_inn, gain, chol_n = sqrt_ekf_factors(chol, A, np.linalg.cholesky(Q),
+                                                                 H, np.linalg.cholesky(R))
+
+            A, H, chol = A[:, None], H[:, None], chol[:, None]
+            D = (chol_pred @ _t(chol_pred))[:, None]
+
+            # symmetric by construction, D = A chol chol' A' + Q
+            _M = (dA @ chol + A @ dchol) @ _t(A @ chol)
+            dD = _M + _t(_M) + dQ
+
+            _N = dH @ D @ _t(H)
+            dS = _N + _t(_N) + H @ dD @ _t(H) + dR
+            dDH = dD @ _t(H) + D @ _t(dH)
+
+            # W = gain gain' with gain = D H' chol_inn^-T
+            _Y = _t(gain)[:, None]
+            _Z = solve_tril(chol_inn, _t(dDH))
+            _C = _t(_Z) @ _Y
+            _S = solve_tril(chol_inn, _t(solve_tril(chol_inn, dS)))
+
+            dW = _C + _t(_C) - _t(_Y) @ _S @ _Y
+            dphi = dD - dW
+
+            # tangent of the posterior cholesky factor
+            _M = solve_tril(chol_n, _t(solve_tril(chol_n, dphi)))
+            _M = np.tril(_M) - 0.5 * _M * np.eye(self.dm_belief)
+            dphi = chol_n[:, None] @ _M
+        else:
+            sigma = trajectory.steps(b.sigma[..., :self.nb_steps])[:, None]
+
+            A, H = A[:, None], H[:, None]
+
+            D = A @ sigma @ _t(A) + Q[:, None]
+            D = 0.5 * (D + _t(D))
+            dD = dA @ sigma @ _t(A) + A @ dsigma @ _t(A) + A @ sigma @ _t(dA) + dQ
+            dD = 0.5 * (dD + _t(dD))
+
+            S_inv = np.linalg.inv(H @ D @ _t(H) + R[:, None])
+            dS = dH @ D @ _t(H) + H @ dD @ _t(H) + H @ D @ _t(dH) + dR
+
+            K = D @ _t(H) @ S_inv
+            dK = dD @ _t(H) @ S_inv + D @ _t(dH) @ S_inv - K @ dS @ S_inv
+
+            # stochastic mean and covariance dynamics
+            dW = dK @ H @ D + K @ dH @ D + K @ H @ dD
+            dphi = dD - dW
+            dphi = 0.5 * (dphi + _t(dphi))
+
+        # (dm_out, dm_in, nb_steps) jacobians
+        _f = np.transpose(df, (2, 1, 0))
+        if self.vech:
+            dW, dphi = dW[..., _i, _j], dphi[..., _i, _j]
+        _W = np.transpose(np.reshape(dW, (self.nb_steps, dm_in, -1)), (2, 1, 0))
+        _phi = np.transpose(np.reshape(dphi, (self.nb_steps, dm_in, -1)), (2, 1, 0))
+
+        _mu, _sigma = slice(0, self.dm_belief), slice(self.dm_belief, -self.dm_act)
+        _u = slice(-self.dm_act, None)
+
+        self.F, self.G = map(trajectory.asarray, (_f[:, _mu], _f[:, _u]))
+        self.X, self.Y, self.Z = map(trajectory.asarray, (_W[:, _mu], _W[:, _sigma], _W[:, _u]))
+        self.T, self.U, self.V = map(trajectory.asarray, (_phi[:, _mu], _phi[:, _sigma], _phi[:, _u]))
 
     def forward(self, b, u, t):
         _u = u[..., t]
@@ -244,6 +512,14 @@ class AnalyticalLinearBeliefDynamics(LinearBeliefDynamics):
 
         return _mu_bn, _sigma_bn
 
+    def forward_sqrt(self, b, u, t):
+        _u = u[..., t]
+
+        _mu_b, _chol_b = b.mu[..., t], b.chol[..., t]
+        _mu_bn, _, _chol_bn = self.ekf_sqrt(_mu_b, _chol_b, _u)
+
+        return _mu_bn, _chol_bn
+
 
 class LinearControl:
     def __init__(self, dm_belief, dm_act, nb_steps):
@@ -251,8 +527,8 @@ class LinearControl:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.K = np.zeros((self.dm_act, self.dm_belief, self.nb_steps))
-        self.kff = np.zeros((self.dm_act, self.nb_steps))
+        self.K = trajectory.zeros((self.dm_act, self.dm_belief, self.nb_steps))
+        self.kff = trajectory.zeros((self.dm_act, self.nb_steps))
 
     @property
     def params(self):
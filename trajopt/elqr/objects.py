@@ -1,14 +1,16 @@
 import autograd.numpy as np
 from autograd import jacobian, hessian
 
+from trajopt import trajectory
+
 
 class QuadraticStateValue:
     def __init__(self, dm_state, nb_steps):
         self.dm_state = dm_state
         self.nb_steps = nb_steps
 
-        self.V = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.v = np.zeros((self.dm_state, self.nb_steps, ))
+        self.V = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.v = trajectory.zeros((self.dm_state, self.nb_steps, ))
         self.v0 = np.zeros((self.nb_steps, ))
 
 
@@ -19,13 +21,13 @@ class QuadraticCost:
 
         self.nb_steps = nb_steps
 
-        self.Cxx = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.cx = np.zeros((self.dm_state, self.nb_steps))
+        self.Cxx = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.cx = trajectory.zeros((self.dm_state, self.nb_steps))
 
-        self.Cuu = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
-        self.cu = np.zeros((self.dm_act, self.nb_steps))
+        self.Cuu = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.cu = trajectory.zeros((self.dm_act, self.nb_steps))
 
-        self.Cxu = np.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.Cxu = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
         self.c0 = np.zeros((self.nb_steps, ))
 
     @property
@@ -55,12 +57,18 @@ class AnalyticalQuadraticCost(QuadraticCost):
 
     def taylor_expansion(self, x, u):
         _in = tuple([x, u, 0., 1.])
-        _Cxx = 0.5 * self.dcdxx(*_in)
-        _Cuu = 0.5 * self.dcduu(*_in)
-        _Cxu = self.dcdxu(*_in)
 
-        _cx = self.dcdx(*_in) - self.dcdxx(*_in) @ x - self.dcdxu(*_in) @ u
-        _cu = self.dcdu(*_in) - self.dcduu(*_in) @ u - x.T @ self.dcdxu(*_in)
+        # evaluate each derivative once
+        _dcdxx = self.dcdxx(*_in)
+        _dcduu = self.dcduu(*_in)
+        _dcdxu = self.dcdxu(*_in)
+
+        _Cxx = 0.5 * _dcdxx
+        _Cuu = 0.5 * _dcduu
+        _Cxu = _dcdxu
+
+        _cx = self.dcdx(*_in) - _dcdxx @ x - _dcdxu @ u
+        _cu = self.dcdu(*_in) - _dcduu @ u - x.T @ _dcdxu
 
         # residual of taylor expansion
         _c0 = self.f(*_in)\
@@ -79,9 +87,9 @@ class LinearDynamics:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.A = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.B = np.zeros((self.dm_state, self.dm_act, self.nb_steps))
-        self.c = np.zeros((self.dm_state, self.nb_steps))
+        self.A = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.B = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.c = trajectory.zeros((self.dm_state, self.nb_steps))
 
     @property
     def params(self):
@@ -96,7 +104,7 @@ class LinearDynamics:
 
 
 class AnalyticalLinearDynamics(LinearDynamics):
-    def __init__(self, f_dyn, dm_state, dm_act, nb_steps):
+    def __init__(self, f_dyn, dm_state, dm_act, nb_steps, tol=0., f_jac=None):
         super(AnalyticalLinearDynamics, self).__init__(dm_state, dm_act, nb_steps)
 
         self.f = f_dyn
@@ -104,10 +112,23 @@ class AnalyticalLinearDynamics(LinearDynamics):
         self.dfdx = jacobian(self.f, 0)
         self.dfdu = jacobian(self.f, 1)
 
+        # code-generated value and jacobians
+        self.f_jac = f_jac
+
+        # expansion points of the stored linearizations,
+        # reused while queries stay within the tolerance
+        self.tol = tol
+        self.x = np.full((self.dm_state, self.nb_steps), np.nan)
+        self.u = np.full((self.dm_act, self.nb_steps), np.nan)
+
     def evalf(self, x, u):
         return self.f(x, u)
 
     def taylor_expansion(self, x, u):
+        if self.f_jac is not None:
+            _xn, _A, _B = self.f_jac(x, u)
+            return _A, _B, _xn - _A @ x - _B @ u
+
         _A = self.dfdx(x, u)
         _B = self.dfdu(x, u)
         # residual of taylor expansion
@@ -115,6 +136,17 @@ class AnalyticalLinearDynamics(LinearDynamics):
 
         return _A, _B, _c
 
+    def moved(self, x, u, t):
+        return not (np.all(np.abs(x - self.x[:, t]) <= self.tol)
+                    and np.all(np.abs(u - self.u[:, t]) <= self.tol))
+
+    def expansion(self, x, u, t):
+        # linearize only if the point moved away from the stored one
+        if self.moved(x, u, t):
+            self.A[..., t], self.B[..., t], self.c[..., t] = self.taylor_expansion(x, u)
+            self.x[:, t], self.u[:, t] = x, u
+        return self.A[..., t], self.B[..., t], self.c[..., t]
+
 
 class LinearControl:
     def __init__(self, dm_state, dm_act, nb_steps):
@@ -122,8 +154,8 @@ class LinearControl:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.K = np.zeros((self.dm_act, self.dm_state, self.nb_steps))
-        self.kff = np.zeros((self.dm_act, self.nb_steps))
+        self.K = trajectory.zeros((self.dm_act, self.dm_state, self.nb_steps))
+        self.kff = trajectory.zeros((self.dm_act, self.nb_steps))
 
     @property
     def params(self):
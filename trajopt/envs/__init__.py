@@ -1,31 +1,54 @@
-from .lqr.lqr_v0 import LQRv0
-from .lqr.lqr_v1 import LQRv1
+import importlib
 
-from .pendulum.pendulum import Pendulum
-from .pendulum.pendulum import PendulumWithCartesianCost
+# envs are imported on first access, so that importing
+# trajopt.envs or one of its modules stays cheap
+_modules = {
+    'LQRv0': '.lqr.lqr_v0',
+    'LQRv1': '.lqr.lqr_v1',
 
-from .double_pendulum.double_pendulum import DoublePendulum
-from .double_pendulum.double_pendulum import DoublePendulumWithCartesianCost
+    'Pendulum': '.pendulum.pendulum',
+    'PendulumWithCartesianCost': '.pendulum.pendulum',
 
-from .quad_pendulum.quad_pendulum import QuadPendulum
-from .quad_pendulum.quad_pendulum import QuadPendulumWithCartesianCost
+    'DoublePendulum': '.double_pendulum.double_pendulum',
+    'DoublePendulumWithCartesianCost': '.double_pendulum.double_pendulum',
 
-from .cartpole.cartpole import Cartpole
-from .cartpole.cartpole import CartpoleWithCartesianCost
+    'QuadPendulum': '.quad_pendulum.quad_pendulum',
+    'QuadPendulumWithCartesianCost': '.quad_pendulum.quad_pendulum',
 
-from .double_cartpole.double_cartpole import DoubleCartpole
-from .double_cartpole.double_cartpole import DoubleCartpoleWithCartesianCost
+    'Cartpole': '.cartpole.cartpole',
+    'CartpoleWithCartesianCost': '.cartpole.cartpole',
 
-from .lightdark.lightdark import LightDark
-from .car.car import Car
+    'DoubleCartpole': '.double_cartpole.double_cartpole',
+    'DoubleCartpoleWithCartesianCost': '.double_cartpole.double_cartpole',
 
-from .quanser.qube.qube import Qube
-from .quanser.qube.qube_rr import QubeRR
+    'LightDark': '.lightdark.lightdark',
+    'Car': '.car.car',
 
-from .quanser.cartpole.cartpole import QCartpole
-from .quanser.cartpole.cartpole_rr import QCartpoleRR
+    'Qube': '.quanser.qube.qube',
+    'QubeRR': '.quanser.qube.qube_rr',
 
-from .quanser.qube.qube import QubeTO
-from .quanser.qube.qube import QubeTOWithCartesianCost
+    'QCartpole': '.quanser.cartpole.cartpole',
+    'QCartpoleRR': '.quanser.cartpole.cartpole_rr',
 
-from .quanser.cartpole.cartpole import QCartpoleTO
+    'QubeTO': '.quanser.qube.qube',
+    'QubeTOWithCartesianCost': '.quanser.qube.qube',
+
+    'QCartpoleTO': '.quanser.cartpole.cartpole',
+
+    'VectorEnv': '.vector',
+}
+
+__all__ = list(_modules)
+
+
+def __getattr__(name):
+    if name not in _modules:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+    value = getattr(importlib.import_module(_modules[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -4,6 +4,8 @@ from gym.utils import seeding
 
 import autograd.numpy as np
 
+from trajopt.envs.noise import GaussianNoise
+
 
 class Car(gym.Env):
 
@@ -41,6 +43,7 @@ class Car(gym.Env):
 
         self.state = None
         self.np_random = None
+        self.gaussian = GaussianNoise(self)
 
         self.seed()
         self.reset()
@@ -81,18 +84,42 @@ class Car(gym.Env):
         xn = np.clip(xn, -self._xmax, self._xmax)
         return xn
 
+    def dynamics_batch(self, x, u):
+        # states and actions of a batch in columns
+        _u = np.clip(u, -self.ulim[:, None], self.ulim[:, None])
+        # x, y, th, v
+        xn = x + self._dt * np.stack([x[3] * np.cos(x[2]),
+                                      x[3] * np.sin(x[2]),
+                                      x[3] * np.tan(_u[1]) / self._l,
+                                      _u[0]])
+        xn = np.clip(xn, -self._xmax[:, None], self._xmax[:, None])
+        return xn
+
     def dyn_noise(self, x=None, u=None):
         _u = np.clip(u, -self.ulim, self.ulim)
         _x = np.clip(x, -self.xlim, self.xlim)
         return 1e-4 * np.eye(self.dm_state)
 
+    def dyn_noise_batch(self, x, u):
+        # covariances of a batch along the last axis
+        return 1e-4 * np.eye(self.dm_state)[..., None] * np.ones(x.shape[-1])
+
     def observe(self, x):
         return np.array([x[0], x[1]])
 
+    def observe_batch(self, x):
+        return np.stack([x[0], x[1]])
+
     def obs_noise(self, x=None):
         _sigma = 1e-4 * np.eye(self.dm_obs)
-        _sigma += np.array([[0.5 * (5. - x[0])**2, 0.],
-                            [0., 0.]])
+        _sigma = _sigma + np.array([[0.5 * (5. - x[0])**2, 0.],
+                                    [0., 0.]])
+        return _sigma
+
+    def obs_noise_batch(self, x):
+        # covariances of a batch along the last axis
+        _sigma = 1e-4 * np.eye(self.dm_obs)[..., None] * np.ones(x.shape[-1])
+        _sigma = _sigma + np.array([[1., 0.], [0., 0.]])[..., None] * 0.5 * (5. - x[0])**2
         return _sigma
 
     # cost defined over belief
@@ -113,14 +140,14 @@ class Car(gym.Env):
         # evolve deterministic dynamics
         self.state = self.dynamics(self.state, u)
         # add dynamics noise
-        self.state = self.np_random.multivariate_normal(mean=self.state, cov=_sigma_dyn)
+        self.state = self.gaussian(mean=self.state, cov=_sigma_dyn)
 
         # state-action dependent dynamics noise
         _sigma_obs = self.obs_noise(self.state)
         # observe state
         _z = self.observe(self.state)
         # add observation noise
-        _z = self.np_random.multivariate_normal(mean=_z, cov=_sigma_obs)
+        _z = self.gaussian(mean=_z, cov=_sigma_obs, cached=False)
         return _z, [], False, {}
 
     def reset(self):
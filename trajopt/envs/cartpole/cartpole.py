@@ -6,6 +6,10 @@ import autograd.numpy as np
 from autograd import jacobian
 from autograd.tracer import getval
 
+from trajopt.envs import codegen
+from trajopt.envs.perturbation import Perturbation, spawn_seed
+from trajopt.envs.noise import GaussianNoise
+
 
 def wrap_angle(x):
     # wraps angle between [-pi, pi]
@@ -45,9 +49,11 @@ class Cartpole(gym.Env):
         self.sigma0 = 1e-4 * np.eye(self.dm_state)
 
         self.periodic = False
+        self.perturb = False
 
         self.state = None
         self.np_random = None
+        self.gaussian = GaussianNoise(self)
 
         self.seed()
 
@@ -59,43 +65,85 @@ class Cartpole(gym.Env):
     def ulim(self):
         return self.umax
 
-    def dynamics(self, x, u):
-        _u = np.clip(u, -self.ulim, self.ulim)
+    @property
+    def dynamics_and_jacobians(self):
+        # code-generated dynamics with jacobians, if available
+        return None if self.perturb else codegen.build(self)
+
+    @property
+    def perturb(self):
+        return self.perturbation is not None
+
+    @perturb.setter
+    def perturb(self, value):
+        # perturbations from their own stream of the env seed
+        self.perturbation = Perturbation({'Mp': (0.05, 2., 5.), 'fr': (1e-2, 2., 4.)},
+                                         seed=self.perturbation_seed) if value else None
+
+    def parameters(self, size=None):
+        # pole mass and cart friction, perturbed per time step and episode
+        Mp, fr = 0.127, 0.005
+        if self.perturb:
+            Mp = Mp + self.perturbation('Mp', size)
+            fr = fr + self.perturbation('fr', size)
+        return Mp, fr
+
+    def _ode(self, x, u, Mp=0.127, fr=0.005):
+        # continuous-time dynamics, states and actions
+        # either as vectors or as batches in columns
 
         # Equations: http://coneural.org/florian/papers/05_cart_pole.pdf
         # x = [x, th, dx, dth]
         g = 9.81
         Mc = 0.37
-        Mp = 0.127
         Mt = Mc + Mp
         l = 0.3365
-        fr = 0.005
 
-        def f(x, u):
-            q, th, dq, dth = x
+        q, th, dq, dth = x
 
-            sth = np.sin(th)
-            cth = np.cos(th)
+        sth = np.sin(th)
+        cth = np.cos(th)
 
-            # This friction model is not exactly right
-            # It neglects the influence of the pole
-            num = g * sth + cth * (- (u - fr * dq) - Mp * l * dth**2 * sth) / Mt
-            denom = l * ((4. / 3.) - Mp * cth**2 / Mt)
-            ddth = num / denom
+        # This friction model is not exactly right
+        # It neglects the influence of the pole
+        num = g * sth + cth * (- (u[0] - fr * dq) - Mp * l * dth**2 * sth) / Mt
+        denom = l * ((4. / 3.) - Mp * cth**2 / Mt)
+        ddth = num / denom
 
-            ddx = (u + Mp * l * (dth**2 * sth - ddth * cth)) / Mt
-            return np.hstack((dq, dth, ddx, ddth))
+        ddx = (u[0] + Mp * l * (dth**2 * sth - ddth * cth)) / Mt
+        return np.stack((dq, dth, ddx, ddth))
 
-        c1 = f(x, _u)
-        c2 = f(x + 0.5 * self.dt * c1, _u)
-        c3 = f(x + 0.5 * self.dt * c2, _u)
-        c4 = f(x + self.dt * c3, _u)
+    def dynamics(self, x, u):
+        _u = np.clip(u, -self.ulim, self.ulim)
+
+        Mp, fr = self.parameters()
+
+        c1 = self._ode(x, _u, Mp, fr)
+        c2 = self._ode(x + 0.5 * self.dt * c1, _u, Mp, fr)
+        c3 = self._ode(x + 0.5 * self.dt * c2, _u, Mp, fr)
+        c4 = self._ode(x + self.dt * c3, _u, Mp, fr)
 
         xn = x + self.dt / 6. * (c1 + 2. * c2 + 2. * c3 + c4)
         xn = np.clip(xn, -self.xlim, self.xlim)
 
         return xn
 
+    def dynamics_batch(self, x, u):
+        # states and actions of a batch in columns
+        _u = np.clip(u, -self.ulim[:, None], self.ulim[:, None])
+
+        Mp, fr = self.parameters(x.shape[-1])
+
+        c1 = self._ode(x, _u, Mp, fr)
+        c2 = self._ode(x + 0.5 * self.dt * c1, _u, Mp, fr)
+        c3 = self._ode(x + 0.5 * self.dt * c2, _u, Mp, fr)
+        c4 = self._ode(x + self.dt * c3, _u, Mp, fr)
+
+        xn = x + self.dt / 6. * (c1 + 2. * c2 + 2. * c3 + c4)
+        xn = np.clip(xn, -self.xlim[:, None], self.xlim[:, None])
+
+        return xn
+
     def features(self, x):
         return x
 
@@ -126,8 +174,26 @@ class Cartpole(gym.Env):
 
         return c
 
+    def cost_batch(self, x, u, u_last, a):
+        # cost of a batch of states and actions in columns
+        if self.slew_rate:
+            c = np.sum(self.uw[:, None] * (u - u_last)**2, axis=0)
+        else:
+            c = np.sum(self.uw[:, None] * u**2, axis=0)
+
+        if a:
+            y = np.vstack((x[0], wrap_angle(x[1]),
+                           x[2], x[3])) if self.periodic else x
+            z = self.features(y)
+            c += a * np.sum(self.gw[:, None] * (z - self.g[:, None])**2, axis=0)
+
+        return c
+
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
+        # restart perturbations from a child of the new seed
+        self.perturbation_seed = spawn_seed(seed)
+        self.perturb = self.perturb
         return [seed]
 
     def step(self, u):
@@ -135,15 +201,19 @@ class Cartpole(gym.Env):
         _sigma = self.noise(self.state, u)
         # evolve deterministic dynamics
         self.state = self.dynamics(self.state, u)
+        if self.perturb:
+            self.perturbation.step()
         # add noise
-        self.state = self.np_random.multivariate_normal(mean=self.state, cov=_sigma)
+        self.state = self.gaussian(mean=self.state, cov=_sigma)
         return self.state, [], False, {}
 
     def init(self):
         return self.x0, self.sigma0
 
     def reset(self):
-        self.state = self.np_random.multivariate_normal(mean=self.x0, cov=self.sigma0)
+        if self.perturb:
+            self.perturbation.reset()
+        self.state = self.gaussian(mean=self.x0, cov=self.sigma0)
         return self.state
 
 
@@ -0,0 +1,305 @@
+import os
+import inspect
+import hashlib
+import importlib.util
+
+from functools import partial
+
+import numpy as np
+
+from trajopt import trajectory
+
+
+# bump to invalidate all cached modules
+VERSION = 1
+
+CACHE_DIR = os.environ.get('TRAJOPT_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'trajopt'))
+
+_modules = {}
+
+
+class _SymbolicNumpy:
+    # numpy namespace for tracing an env's continuous-time
+    # dynamics on object arrays of sympy expressions
+
+    def __init__(self, sympy):
+        self._sympy = sympy
+
+        self.pi = sympy.pi
+        self.linalg = self
+
+    def _apply(self, f, x):
+        if isinstance(x, np.ndarray):
+            return np.vectorize(f, otypes=[object])(x)
+        return f(x)
+
+    def sin(self, x):
+        return self._apply(self._sympy.sin, x)
+
+    def cos(self, x):
+        return self._apply(self._sympy.cos, x)
+
+    def tan(self, x):
+        return self._apply(self._sympy.tan, x)
+
+    def exp(self, x):
+        return self._apply(self._sympy.exp, x)
+
+    def sqrt(self, x):
+        return self._apply(self._sympy.sqrt, x)
+
+    def solve(self, a, b):
+        sol = self._sympy.Matrix(a).LUsolve(self._sympy.Matrix(b))
+        return np.array(sol.tolist(), dtype=object).reshape(np.shape(b))
+
+    def inv(self, a):
+        return np.array(self._sympy.Matrix(a).inv().tolist(), dtype=object)
+
+    def __getattr__(self, name):
+        return getattr(np, name)
+
+
+def _names(code):
+    # names the code and its nested functions refer to
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if inspect.iscode(c):
+            names |= _names(c)
+    return names
+
+
+def _digest(value):
+    if isinstance(value, np.ndarray):
+        return '%s%s%s' % (value.dtype, value.shape, value.tobytes().hex())
+    return repr(value)
+
+
+def _source(fun):
+    try:
+        return inspect.getsource(fun)
+    except (OSError, TypeError):
+        return ''
+
+
+def _params(env):
+    # source of the ode and of every function it reaches, the
+    # ode of each base class and the methods it calls on the env
+    # or on classes, with their defaults and closure cells and
+    # the env attributes and module globals they read
+    funs = [vars(cls)['_ode'] for cls in type(env).__mro__ if '_ode' in vars(cls)]
+
+    params, seen = [], set()
+    while funs:
+        # plain functions of methods, static and class methods
+        fun = funs.pop(0)
+        fun = getattr(fun, '__func__', fun)
+        if not inspect.isfunction(fun) or fun.__code__ in seen:
+            continue
+        seen.add(fun.__code__)
+
+        params += [_source(fun), _digest(fun.__defaults__)]
+        params += [_digest(c.cell_contents) for c in fun.__closure__ or ()]
+
+        names = _names(fun.__code__)
+        for name in sorted(names):
+            if name in vars(env) or hasattr(type(env), name):
+                value = getattr(env, name)
+            elif name in fun.__globals__:
+                value = fun.__globals__[name]
+            else:
+                continue
+
+            if inspect.isclass(value):
+                # e.g. Base._ode, called through the class
+                for attr in sorted(names):
+                    funs.append(inspect.getattr_static(value, attr, None))
+            elif inspect.ismethod(value) or inspect.isfunction(value):
+                funs.append(value)
+            elif not (inspect.ismodule(value) or callable(value)):
+                params.append('%s=%s' % (name, _digest(value)))
+
+    return '\n'.join(params)
+
+
+def _key(env):
+    # everything the ode depends on, so changing the source
+    # or a parameter of the env regenerates the module
+    src = _params(env)
+    src += '%d-%d-%d' % (VERSION, env.dm_state, env.dm_act)
+    return hashlib.sha1(src.encode()).hexdigest()[:16]
+
+
+def _path(env, key):
+    cls = type(env)
+    return os.path.join(CACHE_DIR, '%s_%s_%s.py' % (cls.__module__.replace('.', '_'),
+                                                     cls.__name__, key))
+
+
+def _expr(e):
+    while isinstance(e, np.ndarray):
+        e = e.item()
+    return e
+
+
+def _trace(env):
+    import sympy
+
+    x = sympy.symbols('x_0:%d' % env.dm_state)
+    u = sympy.symbols('u_0:%d' % env.dm_act)
+
+    # evaluate the env's ode with a symbolic numpy
+    ode = env._ode.__func__
+    _globals = dict(ode.__globals__, np=_SymbolicNumpy(sympy))
+    ode = type(ode)(ode.__code__, _globals, ode.__name__,
+                    ode.__defaults__, ode.__closure__)
+
+    f = ode(env, np.array(x, dtype=object), np.array(u, dtype=object))
+    f = [sympy.sympify(_expr(e)) for e in f]
+
+    dfdx = [[sympy.diff(_f, _x) for _x in x] for _f in f]
+    dfdu = [[sympy.diff(_f, _u) for _u in u] for _f in f]
+
+    return x, u, f, dfdx, dfdu
+
+
+def _emit(env, key):
+    import sympy
+    from sympy.printing.numpy import NumPyPrinter
+
+    x, u, f, dfdx, dfdu = _trace(env)
+
+    # common subexpressions over value and jacobians
+    flat = f + [e for row in dfdx for e in row] + [e for row in dfdu for e in row]
+    subs, flat = sympy.cse(flat, symbols=sympy.numbered_symbols('_t'))
+
+    printer = NumPyPrinter()
+
+    cls = type(env)
+    lines = ['# generated by trajopt.envs.codegen, do not edit',
+             '# source: %s.%s, key: %s' % (cls.__module__, cls.__name__, key),
+             'import numpy', '', '',
+             'def ode(x, u):',
+             '    %s, = x' % ', '.join(map(str, x)),
+             '    %s, = u' % ', '.join(map(str, u)),
+             '    _shape = numpy.shape(x_0)']
+
+    if subs:
+        lines.append('')
+    for s, e in subs:
+        lines.append('    %s = %s' % (s, printer.doprint(e)))
+
+    dm_state, dm_act = env.dm_state, env.dm_act
+
+    lines += ['', '    f = numpy.zeros((%d, ) + _shape)' % dm_state,
+              '    dfdx = numpy.zeros((%d, %d) + _shape)' % (dm_state, dm_state),
+              '    dfdu = numpy.zeros((%d, %d) + _shape)' % (dm_state, dm_act)]
+
+    n = 0
+    for i in range(dm_state):
+        if flat[n] != 0:
+            lines.append('    f[%d] = %s' % (i, printer.doprint(flat[n])))
+        n += 1
+    for i in range(dm_state):
+        for j in range(dm_state):
+            if flat[n] != 0:
+                lines.append('    dfdx[%d, %d] = %s' % (i, j, printer.doprint(flat[n])))
+            n += 1
+    for i in range(dm_state):
+        for j in range(dm_act):
+            if flat[n] != 0:
+                lines.append('    dfdu[%d, %d] = %s' % (i, j, printer.doprint(flat[n])))
+            n += 1
+
+    lines += ['', '    return f, dfdx, dfdu', '']
+    return '\n'.join(lines)
+
+
+def _load(path):
+    spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate(env):
+    # generated ode module of an env, regenerated
+    # whenever the source of its dynamics changes
+    key = _key(env)
+    if key in _modules:
+        return _modules[key]
+
+    path = _path(env, key)
+    if not os.path.exists(path):
+        try:
+            src = _emit(env, key)
+        except ImportError:
+            return None
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(src)
+        os.replace(tmp, path)
+
+    _modules[key] = _load(path)
+    return _modules[key]
+
+
+def rk4(ode, dt, x, u):
+    # rk4 step and its exact jacobians by the chain rule,
+    # states and actions with time along the last axis
+    dm_state = x.shape[0]
+    eye = np.eye(dm_state)[..., None]
+
+    def dot(a, b):
+        return np.einsum('ikt,kjt->ijt', a, b)
+
+    k1, dk1dx, dk1du = ode(x, u)
+
+    f, dfdx, dfdu = ode(x + 0.5 * dt * k1, u)
+    k2, dk2dx, dk2du = f, dot(dfdx, eye + 0.5 * dt * dk1dx), dot(dfdx, 0.5 * dt * dk1du) + dfdu
+
+    f, dfdx, dfdu = ode(x + 0.5 * dt * k2, u)
+    k3, dk3dx, dk3du = f, dot(dfdx, eye + 0.5 * dt * dk2dx), dot(dfdx, 0.5 * dt * dk2du) + dfdu
+
+    f, dfdx, dfdu = ode(x + dt * k3, u)
+    k4, dk4dx, dk4du = f, dot(dfdx, eye + dt * dk3dx), dot(dfdx, dt * dk3du) + dfdu
+
+    xn = x + dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
+    A = eye + dt / 6. * (dk1dx + 2. * dk2dx + 2. * dk3dx + dk4dx)
+    B = dt / 6. * (dk1du + 2. * dk2du + 2. * dk3du + dk4du)
+
+    return xn, A, B
+
+
+def step(env, module, x, u):
+    # discrete dynamics of the env with jacobians, either
+    # for a single point or for time along the last axis
+    single = x.ndim == 1
+    if single:
+        x, u = x[:, None], u[:, None]
+
+    ulim, xlim = env.ulim[:, None], env.xlim[:, None]
+
+    _u = np.clip(u, -ulim, ulim)
+    xn, A, B = rk4(module.ode, env.dt, x, _u)
+
+    # no gradient through clipped actions and states
+    B = B * np.logical_and(_u != -ulim, _u != ulim)[None, ...]
+
+    xn = np.clip(xn, -xlim, xlim)
+    _free = np.logical_and(xn != -xlim, xn != xlim)[:, None, :]
+    A, B = A * _free, B * _free
+
+    if single:
+        return xn[:, 0], A[..., 0], B[..., 0]
+    # time-major like the solvers' trajectories
+    return trajectory.asarray(xn), trajectory.asarray(A), trajectory.asarray(B)
+
+
+def build(env):
+    # code-generated dynamics and jacobians, none
+    # if sympy is missing and nothing is cached
+    module = generate(env)
+    return None if module is None else partial(step, env, module)
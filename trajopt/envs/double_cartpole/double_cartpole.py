@@ -6,6 +6,10 @@ import autograd.numpy as np
 from autograd import jacobian
 from autograd.tracer import getval
 
+from trajopt.envs import codegen
+from trajopt.envs.perturbation import Perturbation, spawn_seed
+from trajopt.envs.noise import GaussianNoise
+
 
 def wrap_angle(x):
     # wraps angle between [-pi, pi]
@@ -44,9 +48,11 @@ class DoubleCartpole(gym.Env):
         self.sigma0 = 1e-4 * np.eye(self.dm_state)
 
         self.periodic = False
+        self.perturb = False
 
         self.state = None
         self.np_random = None
+        self.gaussian = GaussianNoise(self)
 
         self.seed()
 
@@ -58,8 +64,31 @@ class DoubleCartpole(gym.Env):
     def ulim(self):
         return self.umax
 
-    def dynamics(self, x, u):
-        _u = np.clip(u, -self.ulim, self.ulim)
+    @property
+    def dynamics_and_jacobians(self):
+        # code-generated dynamics with jacobians, if available
+        return None if self.perturb else codegen.build(self)
+
+    @property
+    def perturb(self):
+        return self.perturbation is not None
+
+    @perturb.setter
+    def perturb(self, value):
+        # perturbations from their own stream of the env seed
+        self.perturbation = Perturbation({'Mp': (0.05, 2., 5.)},
+                                         seed=self.perturbation_seed) if value else None
+
+    def parameters(self, size=None):
+        # pole masses, perturbed per time step and episode
+        Mp = 0.127
+        if self.perturb:
+            Mp = Mp + self.perturbation('Mp', size)
+        return Mp
+
+    def _ode(self, x, u, Mp=0.127):
+        # continuous-time dynamics, states and actions
+        # either as vectors or as batches in columns
 
         # import from: https://github.com/JoeMWatson/input-inference-for-control/
         """
@@ -70,8 +99,8 @@ class DoubleCartpole(gym.Env):
 
         g = 9.81
         Mc = 0.37
-        Mp1 = 0.127
-        Mp2 = 0.127
+        Mp1 = Mp
+        Mp2 = Mp
         Mt = Mc + Mp1 + Mp2
         L1 = 0.3365
         L2 = 0.3365
@@ -80,80 +109,91 @@ class DoubleCartpole(gym.Env):
         J1 = Mp1 * L1 / 12.
         J2 = Mp2 * L2 / 12.
 
-        def f(x, u):
-
-            q = x[0]
-            th1 = x[1]
-            th2 = x[2]
-            dq = x[3]
-            dth1 = x[4]
-            dth2 = x[5]
-
-            s1 = np.sin(th1)
-            c1 = np.cos(th1)
-            s2 = np.sin(th2)
-            c2 = np.cos(th2)
-            sdth = np.sin(th1 - th2)
-            cdth = np.cos(th1 - th2)
-
-            # helpers
-            l1_mp1_mp2 = Mp1 * l1 + Mp2 * L2
-            l1_mp1_mp2_c1 = l1_mp1_mp2 * c1
-            Mp2_l2 = Mp2 * l2
-            Mp2_l2_c2 = Mp2_l2 * c2
-            l1_l2_Mp2 = L1 * l2 * Mp2
-            l1_l2_Mp2_cdth = l1_l2_Mp2 * cdth
-
-            # inertia
-            M11 = Mt
-            M12 = l1_mp1_mp2_c1
-            M13 = Mp2_l2_c2
-            M21 = l1_mp1_mp2_c1
-            M22 = (l1 ** 2) * Mp1 + (L1 ** 2) * Mp2 + J1
-            M23 = l1_l2_Mp2_cdth
-            M31 = Mp2_l2_c2
-            M32 = l1_l2_Mp2_cdth
-            M33 = (l2 ** 2) * Mp2 + J2
-
-            # coreolis
-            C11 = 0.
-            C12 = - l1_mp1_mp2 * dth1 * s1
-            C13 = - Mp2_l2 * dth2 * s2
-            C21 = 0.
-            C22 = 0.
-            C23 = l1_l2_Mp2 * dth2 * sdth
-            C31 = 0.
-            C32 = - l1_l2_Mp2 * dth1 * sdth
-            C33 = 0.
-
-            # gravity
-            G11 = 0.
-            G21 = - (Mp1 * l1 + Mp2 * L1) * g * s1
-            G31 = - Mp2 * l2 * g * s2
-
-            # make matrices
-            M = np.vstack((np.hstack((M11, M12, M13)), np.hstack((M21, M22, M23)), np.hstack((M31, M32, M33))))
-            C = np.vstack((np.hstack((C11, C12, C13)), np.hstack((C21, C22, C23)), np.hstack((C31, C32, C33))))
-            G = np.vstack((G11, G21, G31))
-
-            action = np.vstack((u, 0.0, 0.0))
-
-            M_inv = np.linalg.inv(M)
-            C_dx = np.dot(C, x[3:].reshape((-1, 1)))
-            ddx = np.dot(M_inv, action - C_dx - G).squeeze()
-
-            return np.hstack((dq, dth1, dth2, ddx))
-
-        k1 = f(x, _u)
-        k2 = f(x + 0.5 * self.dt * k1, _u)
-        k3 = f(x + 0.5 * self.dt * k2, _u)
-        k4 = f(x + self.dt * k3, _u)
+        q, th1, th2, dq, dth1, dth2 = x
+
+        s1 = np.sin(th1)
+        c1 = np.cos(th1)
+        s2 = np.sin(th2)
+        c2 = np.cos(th2)
+        sdth = np.sin(th1 - th2)
+        cdth = np.cos(th1 - th2)
+
+        # helpers
+        l1_mp1_mp2 = Mp1 * l1 + Mp2 * L2
+        l1_mp1_mp2_c1 = l1_mp1_mp2 * c1
+        Mp2_l2 = Mp2 * l2
+        Mp2_l2_c2 = Mp2_l2 * c2
+        l1_l2_Mp2 = L1 * l2 * Mp2
+        l1_l2_Mp2_cdth = l1_l2_Mp2 * cdth
+
+        ones = np.ones_like(q)
+
+        # inertia
+        M11 = Mt * ones
+        M12 = l1_mp1_mp2_c1
+        M13 = Mp2_l2_c2
+        M21 = l1_mp1_mp2_c1
+        M22 = ((l1 ** 2) * Mp1 + (L1 ** 2) * Mp2 + J1) * ones
+        M23 = l1_l2_Mp2_cdth
+        M31 = Mp2_l2_c2
+        M32 = l1_l2_Mp2_cdth
+        M33 = ((l2 ** 2) * Mp2 + J2) * ones
+
+        # coreolis
+        C12 = - l1_mp1_mp2 * dth1 * s1
+        C13 = - Mp2_l2 * dth2 * s2
+        C23 = l1_l2_Mp2 * dth2 * sdth
+        C32 = - l1_l2_Mp2 * dth1 * sdth
+
+        # gravity
+        G21 = - (Mp1 * l1 + Mp2 * L1) * g * s1
+        G31 = - Mp2 * l2 * g * s2
+
+        # one matrix per column, trailing axes
+        M = np.stack((np.stack((M11, M12, M13), axis=-1),
+                      np.stack((M21, M22, M23), axis=-1),
+                      np.stack((M31, M32, M33), axis=-1)), axis=-2)
+
+        C_dx = np.stack((C12 * dth1 + C13 * dth2, C23 * dth2, C32 * dth1))
+        G = np.stack((0. * ones, G21, G31))
+
+        action = np.stack((u[0], 0. * ones, 0. * ones))
+
+        ddx = np.linalg.solve(M, (action - C_dx - G).T[..., None])[..., 0].T
+
+        return np.concatenate((np.stack((dq, dth1, dth2)), ddx))
+
+    def dynamics(self, x, u):
+        _u = np.clip(u, -self.ulim, self.ulim)
+
+        Mp = self.parameters()
+
+        k1 = self._ode(x, _u, Mp)
+        k2 = self._ode(x + 0.5 * self.dt * k1, _u, Mp)
+        k3 = self._ode(x + 0.5 * self.dt * k2, _u, Mp)
+        k4 = self._ode(x + self.dt * k3, _u, Mp)
 
         xn = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
         xn = np.clip(xn, -self.xlim, self.xlim)
 
         return xn
 
+    def dynamics_batch(self, x, u):
+        # states and actions of a batch in columns
+        _u = np.clip(u, -self.ulim[:, None], self.ulim[:, None])
+
+        Mp = self.parameters(x.shape[-1])
+
+        k1 = self._ode(x, _u, Mp)
+        k2 = self._ode(x + 0.5 * self.dt * k1, _u, Mp)
+        k3 = self._ode(x + 0.5 * self.dt * k2, _u, Mp)
+        k4 = self._ode(x + self.dt * k3, _u, Mp)
+
+        xn = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
+        xn = np.clip(xn, -self.xlim[:, None], self.xlim[:, None])
+
+        return xn
+
     def features(self, x):
         return x
 
@@ -186,8 +226,28 @@ class DoubleCartpole(gym.Env):
 
         return c
 
+    def cost_batch(self, x, u, u_last, a):
+        # cost of a batch of states and actions in columns
+        if self.slew_rate:
+            c = np.sum(self.uw[:, None] * (u - u_last)**2, axis=0)
+        else:
+            c = np.sum(self.uw[:, None] * u**2, axis=0)
+
+        if a:
+            y = np.vstack((x[0],
+                           wrap_angle(x[1]),
+                           wrap_angle(x[2]),
+                           x[3], x[4], x[5])) if self.periodic else x
+            z = self.features(y)
+            c += a * np.sum(self.gw[:, None] * (z - self.g[:, None])**2, axis=0)
+
+        return c
+
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
+        # restart perturbations from a child of the new seed
+        self.perturbation_seed = spawn_seed(seed)
+        self.perturb = self.perturb
         return [seed]
 
     def step(self, u):
@@ -195,15 +255,19 @@ class DoubleCartpole(gym.Env):
         _sigma = self.noise(self.state, u)
         # evolve deterministic dynamics
         self.state = self.dynamics(self.state, u)
+        if self.perturb:
+            self.perturbation.step()
         # add noise
-        self.state = self.np_random.multivariate_normal(mean=self.state, cov=_sigma)
+        self.state = self.gaussian(mean=self.state, cov=_sigma)
         return self.state, [], False, {}
 
     def init(self):
         return self.x0, self.sigma0
 
     def reset(self):
-        self.state = self.np_random.multivariate_normal(mean=self.x0, cov=self.sigma0)
+        if self.perturb:
+            self.perturbation.reset()
+        self.state = self.gaussian(mean=self.x0, cov=self.sigma0)
         return self.state
 
 
@@ -6,6 +6,10 @@ import autograd.numpy as np
 from autograd import jacobian
 from autograd.tracer import getval
 
+from trajopt.envs import codegen
+from trajopt.envs.perturbation import Perturbation, spawn_seed
+from trajopt.envs.noise import GaussianNoise
+
 
 def wrap_angle(x):
     # wraps angle between [-pi, pi]
@@ -45,9 +49,11 @@ class DoublePendulum(gym.Env):
         self.sigma0 = 1e-4 * np.eye(self.dm_state)
 
         self.periodic = False
+        self.perturb = False
 
         self.state = None
         self.np_random = None
+        self.gaussian = GaussianNoise(self)
 
         self.seed()
 
@@ -59,72 +65,116 @@ class DoublePendulum(gym.Env):
     def ulim(self):
         return self.umax
 
-    def dynamics(self, x, u):
-        _u = np.clip(u, -self.ulim, self.ulim)
+    @property
+    def dynamics_and_jacobians(self):
+        # code-generated dynamics with jacobians, if available
+        return None if self.perturb else codegen.build(self)
+
+    @property
+    def perturb(self):
+        return self.perturbation is not None
+
+    @perturb.setter
+    def perturb(self, value):
+        # perturbations from their own stream of the env seed
+        self.perturbation = Perturbation({'m': (0.5, 2., 5.), 'k': (1e-1, 2., 4.)},
+                                         seed=self.perturbation_seed) if value else None
+
+    def parameters(self, size=None):
+        # link masses and joint damping, perturbed per time step and episode
+        m, k = 1., 0.025
+        if self.perturb:
+            m = m + self.perturbation('m', size)
+            k = k + self.perturbation('k', size)
+        return m, k
+
+    def _ode(self, x, u, m=1., k=0.025):
+        # continuous-time dynamics, states and actions
+        # either as vectors or as batches in columns
 
         # Code from PolicySearchToolbox
 
-        masses = np.array([1., 1.])
+        masses = [m, m]
         lengths = np.array([1., 1.])
-        friction = 0.025 * np.array([1., 1.])
+        friction = [k, k]
         g = 9.81
 
-        inertias = masses * (lengths ** 2 + 1e-4) / 3.0
+        inertias = [_m * (_l ** 2 + 1e-4) / 3.0 for _m, _l in zip(masses, lengths)]
 
-        def f(x, u):
-            th1, th2, dth1, dth2 = x
-            th1 = th1 + np.pi  # downward position = PI
+        th1, th2, dth1, dth2 = x
+        th1 = th1 + np.pi  # downward position = PI
 
-            u1, u2 = u
+        u1, u2 = u
 
-            I1, I2 = inertias
-            l1, l2 = lengths
-            m1, m2 = masses
-            k1, k2 = friction
+        I1, I2 = inertias
+        l1, l2 = lengths
+        m1, m2 = masses
+        k1, k2 = friction
 
-            l1CM = l1 / 2.
-            l2CM = l2 / 2.
+        l1CM = l1 / 2.
+        l2CM = l2 / 2.
 
-            s1, c1 = np.sin(th1), np.cos(th1)
-            s2, c2 = np.sin(th2), np.cos(th2)
+        s1, c1 = np.sin(th1), np.cos(th1)
+        s2, c2 = np.sin(th2), np.cos(th2)
 
-            h11 = I1 + I2 + l1CM * l1CM * m1 + l1 * l1 * m2\
-                  + l2CM * l2CM * m2 + 2. * l1 * l2CM * m2 * c2
-            h12 = I2 + l2CM * l2CM * m2 + l1 * l2CM * m2 * c2
+        h11 = I1 + I2 + l1CM * l1CM * m1 + l1 * l1 * m2\
+              + l2CM * l2CM * m2 + 2. * l1 * l2CM * m2 * c2
+        h12 = I2 + l2CM * l2CM * m2 + l1 * l2CM * m2 * c2
 
-            b1 = g * l1CM * m1 * s1 + g * l1 * m2 * s1\
-                 + g * l2CM * m2 * c2 * s1\
-                 - 2. * dth1 * dth2 * l1 * l2CM * m2 * s2\
-                 - dth2 * dth2 * l1 * l2CM * m2 * s2\
-                 + g * l2CM * m2 * c1 * s2
+        b1 = g * l1CM * m1 * s1 + g * l1 * m2 * s1\
+             + g * l2CM * m2 * c2 * s1\
+             - 2. * dth1 * dth2 * l1 * l2CM * m2 * s2\
+             - dth2 * dth2 * l1 * l2CM * m2 * s2\
+             + g * l2CM * m2 * c1 * s2
 
-            h21 = I2 + l2CM * l2CM * m2 + l1 * l2CM * m2 * c2
-            h22 = I2 + l2CM * l2CM * m2
+        h21 = I2 + l2CM * l2CM * m2 + l1 * l2CM * m2 * c2
+        h22 = I2 + l2CM * l2CM * m2
 
-            b2 = g * l2CM * m2 * c2 * s1\
-                 + dth1 * dth1 * l1 * l2CM * m2 * s2\
-                 + g * l2CM * m2 * c1 * s2
+        b2 = g * l2CM * m2 * c2 * s1\
+             + dth1 * dth1 * l1 * l2CM * m2 * s2\
+             + g * l2CM * m2 * c1 * s2
 
-            u1 = u1 - k1 * dth1
-            u2 = u2 - k2 * dth2
+        u1 = u1 - k1 * dth1
+        u2 = u2 - k2 * dth2
 
-            det = h11 * h22 - h12 * h21
+        det = h11 * h22 - h12 * h21
 
-            ddth1 = (h22 * (u1 - b1) - h12 * (u2 - b2)) / det
-            ddth2 = (h11 * (u2 - b2) - h21 * (u1 - b1)) / det
+        ddth1 = (h22 * (u1 - b1) - h12 * (u2 - b2)) / det
+        ddth2 = (h11 * (u2 - b2) - h21 * (u1 - b1)) / det
 
-            return np.array([dth1, dth2, ddth1, ddth2])
+        return np.array([dth1, dth2, ddth1, ddth2])
 
-        k1 = f(x, _u)
-        k2 = f(x + 0.5 * self.dt * k1, _u)
-        k3 = f(x + 0.5 * self.dt * k2, _u)
-        k4 = f(x + self.dt * k3, _u)
+    def dynamics(self, x, u):
+        _u = np.clip(u, -self.ulim, self.ulim)
+
+        m, k = self.parameters()
+
+        k1 = self._ode(x, _u, m, k)
+        k2 = self._ode(x + 0.5 * self.dt * k1, _u, m, k)
+        k3 = self._ode(x + 0.5 * self.dt * k2, _u, m, k)
+        k4 = self._ode(x + self.dt * k3, _u, m, k)
 
         xn = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
         xn = np.clip(xn, -self.xlim, self.xlim)
 
         return xn
 
+    def dynamics_batch(self, x, u):
+        # states and actions of a batch in columns
+        _u = np.clip(u, -self.ulim[:, None], self.ulim[:, None])
+
+        m, k = self.parameters(x.shape[-1])
+
+        k1 = self._ode(x, _u, m, k)
+        k2 = self._ode(x + 0.5 * self.dt * k1, _u, m, k)
+        k3 = self._ode(x + 0.5 * self.dt * k2, _u, m, k)
+        k4 = self._ode(x + self.dt * k3, _u, m, k)
+
+        xn = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
+        xn = np.clip(xn, -self.xlim[:, None], self.xlim[:, None])
+
+        return xn
+
     def features(self, x):
         return x
 
@@ -154,8 +204,26 @@ class DoublePendulum(gym.Env):
 
         return c
 
+    def cost_batch(self, x, u, u_last, a):
+        # cost of a batch of states and actions in columns
+        if self.slew_rate:
+            c = np.sum(self.uw[:, None] * (u - u_last)**2, axis=0)
+        else:
+            c = np.sum(self.uw[:, None] * u**2, axis=0)
+
+        if a:
+            y = np.vstack((wrap_angle(x[0]), wrap_angle(x[1]),
+                           x[2], x[3])) if self.periodic else x
+            z = self.features(y)
+            c += a * np.sum(self.gw[:, None] * (z - self.g[:, None])**2, axis=0)
+
+        return c
+
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
+        # restart perturbations from a child of the new seed
+        self.perturbation_seed = spawn_seed(seed)
+        self.perturb = self.perturb
         return [seed]
 
     def step(self, u):
@@ -163,15 +231,19 @@ class DoublePendulum(gym.Env):
         _sigma = self.noise(self.state, u)
         # evolve deterministic dynamics
         self.state = self.dynamics(self.state, u)
+        if self.perturb:
+            self.perturbation.step()
         # add noise
-        self.state = self.np_random.multivariate_normal(mean=self.state, cov=_sigma)
+        self.state = self.gaussian(mean=self.state, cov=_sigma)
         return self.state, [], False, {}
 
     def init(self):
         return self.x0, self.sigma0
 
     def reset(self):
-        self.state = self.np_random.multivariate_normal(mean=self.x0, cov=self.sigma0)
+        if self.perturb:
+            self.perturbation.reset()
+        self.state = self.gaussian(mean=self.x0, cov=self.sigma0)
         return self.state
 
 
@@ -4,6 +4,8 @@ from gym.utils import seeding
 
 import autograd.numpy as np
 
+from trajopt.envs.noise import GaussianNoise
+
 
 class LQRv0(gym.Env):
 
@@ -36,6 +38,7 @@ class LQRv0(gym.Env):
 
         self.state = None
         self.np_random = None
+        self.gaussian = GaussianNoise(self)
 
         self.seed()
 
@@ -63,6 +66,23 @@ class LQRv0(gym.Env):
 
         return xn
 
+    def dynamics_batch(self, x, u):
+        # states and actions of a batch in columns
+        _u = np.clip(u, -self.ulim, self.ulim)
+
+        def f(x, u):
+            return self.A @ x + self.B @ u + self.c[:, None]
+
+        k1 = f(x, _u)
+        k2 = f(x + 0.5 * self.dt * k1, _u)
+        k3 = f(x + 0.5 * self.dt * k2, _u)
+        k4 = f(x + self.dt * k3, _u)
+
+        xn = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
+        xn = np.clip(xn, -self.xlim[:, None], self.xlim[:, None])
+
+        return xn
+
     def inverse_dynamics(self, x, u):
         _u = np.clip(u, -self.ulim, self.ulim)
 
@@ -91,6 +111,14 @@ class LQRv0(gym.Env):
 
         return self.dt * c
 
+    def cost_batch(self, x, u, u_last, a):
+        # cost of a batch of states and actions in columns
+        c = np.sum(self.uw[:, None] * u**2, axis=0)
+        if a:
+            c += a * np.sum(self.gw[:, None] * (x - self.g[:, None])**2, axis=0)
+
+        return self.dt * c
+
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
         return [seed]
@@ -101,12 +129,12 @@ class LQRv0(gym.Env):
         # evolve deterministic dynamics
         self.state = self.dynamics(self.state, u)
         # add noise
-        self.state = self.np_random.multivariate_normal(mean=self.state, cov=_sigma)
+        self.state = self.gaussian(mean=self.state, cov=_sigma)
         return self.state, [], False, {}
 
     def init(self):
         return self.x0, self.sigma0
 
     def reset(self):
-        self.state = self.np_random.multivariate_normal(mean=self.x0, cov=self.sigma0)
+        self.state = self.gaussian(mean=self.x0, cov=self.sigma0)
         return self.state
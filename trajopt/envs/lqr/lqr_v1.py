@@ -3,7 +3,9 @@ from gym import spaces
 from gym.utils import seeding
 
 import autograd.numpy as np
-from scipy.stats import beta
+
+from trajopt.envs.perturbation import Perturbation, spawn_seed
+from trajopt.envs.noise import GaussianNoise
 
 
 class LQRv1(gym.Env):
@@ -41,6 +43,7 @@ class LQRv1(gym.Env):
 
         self.state = None
         self.np_random = None
+        self.gaussian = GaussianNoise(self)
 
         self.seed()
 
@@ -52,12 +55,27 @@ class LQRv1(gym.Env):
     def ulim(self):
         return self.umax
 
-    def dynamics(self, x, u):
-        _u = np.clip(u, -self.ulim, self.ulim)
+    @property
+    def perturb(self):
+        return self.perturbation is not None
 
+    @perturb.setter
+    def perturb(self, value):
+        # perturbations from their own stream of the env seed
+        self.perturbation = Perturbation({'m': (0.5, 2., 5.)},
+                                         seed=self.perturbation_seed) if value else None
+
+    def parameters(self, size=None):
+        # mass, perturbed per time step and episode
         m, k, d = self.m, self.k, self.d
         if self.perturb:
-            m += np.asscalar(0.5 * beta(2., 5.).rvs())
+            m = m + self.perturbation('m', size)
+        return m, k, d
+
+    def dynamics(self, x, u):
+        _u = np.clip(u, -self.ulim, self.ulim)
+
+        m, k, d = self.parameters()
 
         def f(x, u):
             return self.A(m, k, d) @ x + self.B @ u + self.c
@@ -72,6 +90,26 @@ class LQRv1(gym.Env):
 
         return xn
 
+    def dynamics_batch(self, x, u):
+        # states and actions of a batch in columns
+        _u = np.clip(u, -self.ulim, self.ulim)
+
+        m, k, d = self.parameters(x.shape[-1])
+
+        def f(x, u):
+            return np.vstack((x[1], - k / m * x[0] - 2. * d / m * x[1]))\
+                   + self.B @ u + self.c[:, None]
+
+        k1 = f(x, _u)
+        k2 = f(x + 0.5 * self.dt * k1, _u)
+        k3 = f(x + 0.5 * self.dt * k2, _u)
+        k4 = f(x + self.dt * k3, _u)
+
+        xn = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
+        xn = np.clip(xn, -self.xlim[:, None], self.xlim[:, None])
+
+        return xn
+
     def noise(self, x=None, u=None):
         _u = np.clip(u, -self.ulim, self.ulim)
         _x = np.clip(x, -self.xlim, self.xlim)
@@ -84,8 +122,19 @@ class LQRv1(gym.Env):
 
         return self.dt * c
 
+    def cost_batch(self, x, u, u_last, a):
+        # cost of a batch of states and actions in columns
+        c = np.sum(self.uw[:, None] * u**2, axis=0)
+        if a:
+            c += a * np.sum(self.gw[:, None] * (x - self.g[:, None])**2, axis=0)
+
+        return self.dt * c
+
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
+        # restart perturbations from a child of the new seed
+        self.perturbation_seed = spawn_seed(seed)
+        self.perturb = self.perturb
         return [seed]
 
     def step(self, u):
@@ -93,13 +142,17 @@ class LQRv1(gym.Env):
         _sigma = self.noise(self.state, u)
         # evolve deterministic dynamics
         self.state = self.dynamics(self.state, u)
+        if self.perturb:
+            self.perturbation.step()
         # add noise
-        self.state = self.np_random.multivariate_normal(mean=self.state, cov=_sigma)
+        self.state = self.gaussian(mean=self.state, cov=_sigma)
         return self.state, [], False, {}
 
     def init(self):
         return self.x0, self.sigma0
 
     def reset(self):
-        self.state = self.np_random.multivariate_normal(mean=self.x0, cov=self.sigma0)
+        if self.perturb:
+            self.perturbation.reset()
+        self.state = self.gaussian(mean=self.x0, cov=self.sigma0)
         return self.state
@@ -0,0 +1,65 @@
+import numpy as np
+
+
+class GaussianNoise:
+    # samples gaussian noise from the generator of an env,
+    # caching the factors of recurring covariances and
+    # drawing the standard normals in blocks
+
+    def __init__(self, env, block=4096, cache=8):
+        self.env = env
+
+        self.block = block
+        self.cache = cache
+
+        self._chols = {}
+
+        self._rng = None
+        self._eps = None
+        self._i = 0
+
+    @staticmethod
+    def factorize(cov):
+        try:
+            return np.linalg.cholesky(cov)
+        except np.linalg.LinAlgError:
+            # semi-definite, factorize like numpy does
+            U, s, _ = np.linalg.svd(cov)
+            return U * np.sqrt(s)
+
+    def chol(self, cov, cached=True):
+        # state-independent covariances are factorized once,
+        # state-dependent ones bypass the cache, so that they
+        # neither fill it nor evict the constant factors
+        if not cached:
+            return self.factorize(cov)
+
+        key = (cov.shape, cov.tobytes())
+        if key not in self._chols:
+            if len(self._chols) >= self.cache:
+                self._chols.pop(next(iter(self._chols)))
+            self._chols[key] = self.factorize(cov)
+
+        return self._chols[key]
+
+    def standard_normal(self, size):
+        rng = self.env.np_random
+
+        n = int(np.prod(size))
+        if n > self.block:
+            return rng.standard_normal(size)
+
+        # redraw once exhausted or after reseeding the env
+        if rng is not self._rng or self._i + n > self.block:
+            self._rng = rng
+            self._eps = rng.standard_normal(self.block)
+            self._i = 0
+
+        eps = self._eps[self._i:self._i + n].reshape(size)
+        self._i += n
+        return eps
+
+    def __call__(self, mean, cov, cached=True):
+        # mean either as vector or as batch in columns,
+        # cached=False for covariances that depend on the state
+        return mean + self.chol(cov, cached) @ self.standard_normal(np.shape(mean))
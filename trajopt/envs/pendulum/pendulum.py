@@ -6,8 +6,9 @@ import autograd.numpy as np
 from autograd import jacobian
 from autograd.tracer import getval
 
-from scipy.stats import multivariate_normal
-from scipy.stats import beta
+from trajopt.envs import codegen
+from trajopt.envs.perturbation import Perturbation, spawn_seed
+from trajopt.envs.noise import GaussianNoise
 
 
 def wrap_angle(x):
@@ -48,6 +49,7 @@ class Pendulum(gym.Env):
 
         self.state = None
         self.np_random = None
+        self.gaussian = GaussianNoise(self)
 
         self.seed()
 
@@ -59,27 +61,66 @@ class Pendulum(gym.Env):
     def ulim(self):
         return self.umax
 
+    @property
+    def dynamics_and_jacobians(self):
+        # code-generated dynamics with jacobians, if available
+        return None if self.perturb else codegen.build(self)
+
+    @property
+    def perturb(self):
+        return self.perturbation is not None
+
+    @perturb.setter
+    def perturb(self, value):
+        # perturbations from their own stream of the env seed
+        self.perturbation = Perturbation({'m': (0.5, 2., 5.), 'k': (1e-1, 2., 4.)},
+                                         seed=self.perturbation_seed) if value else None
+
+    def parameters(self, size=None):
+        # mass and damping, perturbed per time step and episode
+        m, k = 1., 0.025
+        if self.perturb:
+            m = m + self.perturbation('m', size)
+            k = k + self.perturbation('k', size)
+        return m, k
+
+    def _ode(self, x, u, m=1., k=0.025):
+        # continuous-time dynamics, states and actions
+        # either as vectors or as batches in columns
+        g, l = 9.81, 1.
+
+        th, dth = x
+        return np.stack((dth, - 3. * g / (2. * l) * np.sin(th + np.pi) +
+                         3. / (m * l ** 2) * (u[0] - k * dth)))
+
     def dynamics(self, x, u):
         _u = np.clip(u, -self.ulim, self.ulim)
 
-        g, m, l, k = 9.81, 1., 1., 0.025
+        m, k = self.parameters()
 
-        if self.perturb:
-            m += 0.5 * beta(2., 5.).rvs()
-            k += 1e-1 * beta(2., 4.).rvs()
+        k1 = self._ode(x, _u, m, k)
+        k2 = self._ode(x + 0.5 * self.dt * k1, _u, m, k)
+        k3 = self._ode(x + 0.5 * self.dt * k2, _u, m, k)
+        k4 = self._ode(x + self.dt * k3, _u, m, k)
 
-        def f(x, u):
-            th, dth = x
-            return np.hstack((dth, - 3. * g / (2. * l) * np.sin(th + np.pi) +
-                              3. / (m * l ** 2) * (u - k * dth)))
+        xn = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
+        xn = np.clip(xn, -self.xlim, self.xlim)
 
-        k1 = f(x, _u)
-        k2 = f(x + 0.5 * self.dt * k1, _u)
-        k3 = f(x + 0.5 * self.dt * k2, _u)
-        k4 = f(x + self.dt * k3, _u)
+        return xn
+
+    def dynamics_batch(self, x, u):
+        # states and actions of a batch in columns
+        _u = np.clip(u, -self.ulim[:, None], self.ulim[:, None])
+
+        m, k = self.parameters(x.shape[-1])
+
+        k1 = self._ode(x, _u, m, k)
+        k2 = self._ode(x + 0.5 * self.dt * k1, _u, m, k)
+        k3 = self._ode(x + 0.5 * self.dt * k2, _u, m, k)
+        k4 = self._ode(x + self.dt * k3, _u, m, k)
 
         xn = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
-        xn = np.clip(xn, -self.xlim, self.xlim)
+        xn = np.clip(xn, -self.xlim[:, None], self.xlim[:, None])
 
         return xn
 
@@ -103,7 +144,8 @@ class Pendulum(gym.Env):
 
         return xn
 
-    def linearized(self, x, u, dist=None):
+    def linearization(self, x, u):
+        # continuous-time taylor expansion around (x, u)
         _u = np.clip(u, -self.ulim, self.ulim)
 
         g, m, l, k = 9.81, 1., 1., 0.025
@@ -120,16 +162,31 @@ class Pendulum(gym.Env):
         Bt = dfdu(x, _u)
         ct = f(x, _u) - At @ x - Bt @ _u
 
-        dA = np.zeros((2, 2))
+        return At, Bt, ct
+
+    def linearization_perturbation(self, size=()):
+        # default model mismatch, trailing axes of shape size
+        from scipy.stats import beta
+
+        dA = np.zeros((self.dm_state, self.dm_state) + size)
+        dB = - 0.1 * beta(5., 1.).rvs((self.dm_state, self.dm_act) + size)
+        dc = - 1. * beta(5., 1.).rvs((self.dm_state, ) + size)
+        return dA, dB, dc
+
+    def linearized(self, x, u, dist=None):
+        _u = np.clip(u, -self.ulim, self.ulim)
+
+        At, Bt, ct = self.linearization(x, _u)
+
         if dist is not None:
+            from scipy.stats import multivariate_normal
             ABc = multivariate_normal(mean=dist['mu'], cov=dist['sigma']).rvs()
             dA = np.reshape(ABc[:self.dm_state ** 2], (self.dm_state, self.dm_state), order='F')
             dB = np.reshape(ABc[self.dm_state ** 2: self.dm_state ** 2 + self.dm_state * self.dm_act],
                             (self.dm_state, self.dm_act), order='F')
             dc = np.reshape(ABc[- self.dm_state:], (self.dm_state, ), order='F')
         else:
-            dB = - 0.1 * beta(5., 1.).rvs(2)[:, None]
-            dc = - 1. * beta(5., 1.).rvs(2)
+            dA, dB, dc = self.linearization_perturbation()
 
         At += dA
         Bt += dB
@@ -177,8 +234,25 @@ class Pendulum(gym.Env):
 
         return c
 
+    def cost_batch(self, x, u, u_last, a):
+        # cost of a batch of states and actions in columns
+        if self.slew_rate:
+            c = np.sum(self.uw[:, None] * (u - u_last)**2, axis=0)
+        else:
+            c = np.sum(self.uw[:, None] * u**2, axis=0)
+
+        if a:
+            y = np.vstack((wrap_angle(x[0]), x[1])) if self.periodic else x
+            z = self.features(y)
+            c += a * np.sum(self.gw[:, None] * (z - self.g[:, None])**2, axis=0)
+
+        return c
+
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
+        # restart perturbations from a child of the new seed
+        self.perturbation_seed = spawn_seed(seed)
+        self.perturb = self.perturb
         return [seed]
 
     def step(self, u):
@@ -186,8 +260,10 @@ class Pendulum(gym.Env):
         _sigma = self.noise(self.state, u)
         # evolve deterministic dynamics
         self.state = self.dynamics(self.state, u)
+        if self.perturb:
+            self.perturbation.step()
         # add noise
-        self.state = self.np_random.multivariate_normal(mean=self.state, cov=_sigma)
+        self.state = self.gaussian(mean=self.state, cov=_sigma)
         return self.state, [], False, {}
 
     def evolve(self, u, dist):
@@ -196,14 +272,16 @@ class Pendulum(gym.Env):
         # evolve deterministic dynamics
         self.state = self.linearized(self.state, u, dist)
         # add noise
-        self.state = self.np_random.multivariate_normal(mean=self.state, cov=_sigma)
+        self.state = self.gaussian(mean=self.state, cov=_sigma)
         return self.state, [], False, {}
 
     def init(self):
         return self.x0, self.sigma0
 
     def reset(self):
-        self.state = self.np_random.multivariate_normal(mean=self.x0, cov=self.sigma0)
+        if self.perturb:
+            self.perturbation.reset()
+        self.state = self.gaussian(mean=self.x0, cov=self.sigma0)
         return self.state
 
 
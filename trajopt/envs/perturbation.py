@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def spawn_seed(seed):
+    # seed sequence of the perturbations, a child of the env seed,
+    # so drawing them leaves the env's own generator untouched
+    return np.random.SeedSequence(seed).spawn(1)[0]
+
+
+class Perturbation:
+    # model parameter perturbations, one entry per time step and
+    # episode, so that every evaluation of the dynamics at the same
+    # step and episode sees the same model. entries are drawn in
+    # blocks of nb_steps x nb_episodes on first use, each block from
+    # its own child of the seed, so an entry only depends on the seed
+    # and on its step and episode, however long the runs
+
+    def __init__(self, params, nb_steps=1000, nb_episodes=100, seed=None):
+        # params maps a name to (scale, a, b) of a scaled beta
+        self.params = params
+
+        self.nb_steps = nb_steps
+        self.nb_episodes = nb_episodes
+
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed = seed
+
+        self.blocks = {}
+
+        # current time step and block of active episodes
+        self.t, self.n, self.nb = 0, 0, 0
+
+    def block(self, i, j):
+        # tables of the i-th block of steps and j-th block of episodes
+        if (i, j) not in self.blocks:
+            seq = np.random.SeedSequence(self.seed.entropy,
+                                         spawn_key=self.seed.spawn_key + (int(i), int(j)))
+            rng = np.random.default_rng(seq)
+            self.blocks[i, j] = {name: scale * rng.beta(a, b, (self.nb_steps, self.nb_episodes))
+                                 for name, (scale, a, b) in self.params.items()}
+        return self.blocks[i, j]
+
+    def reset(self, nb=1):
+        # move on to the next block of nb episodes
+        self.n, self.nb, self.t = self.n + self.nb, nb, 0
+
+        # episodes are never revisited, drop the blocks behind
+        j = self.n // self.nb_episodes
+        self.blocks = {k: v for k, v in self.blocks.items() if k[1] >= j}
+
+    def step(self):
+        self.t += 1
+
+    def __call__(self, name, size=None):
+        # entry of the first active episode at the current step,
+        # or entries of size consecutive episodes for batches
+        i, t = divmod(self.t, self.nb_steps)
+        if size is None:
+            j, n = divmod(self.n, self.nb_episodes)
+            return self.block(i, j)[name][t, n]
+
+        j, n = np.divmod(self.n + np.arange(size), self.nb_episodes)
+        if j[0] == j[-1]:
+            return self.block(i, int(j[0]))[name][t, n]
+        return np.array([self.block(i, _j)[name][t, _n] for _j, _n in zip(j, n)])
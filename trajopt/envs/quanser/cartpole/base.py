@@ -45,7 +45,7 @@ class QCartpoleBase(Base):
         self.seed()
 
     def _zero_sim_step(self):
-        return self._sim_step([0.0])
+        return self._sim_step([0.0])[0]
 
     def _lim_act(self, action):
         if np.abs(action) > 24.:
@@ -117,3 +117,26 @@ class CartpoleDynamics:
 
         s_ddot = np.linalg.solve(A, b)
         return s_ddot
+
+    def batch(self, s, v_m):
+        # states and actions of a batch in columns
+        x, theta, x_dot, theta_dot = s
+
+        F = (self.eta_g * self.Kg * self.eta_m * self.Kt) / (self.Rm * self.r_mp) *\
+            (-self.Kg * self.Km * x_dot / self.r_mp + self.eta_m * v_m[0])
+
+        # mass matrix [[a, b], [b, c]] per column
+        a = self.mp + self.Jeq
+        b = self.mp * self.pl * np.cos(theta + np.pi)
+        c = self.Jp + self.mp * self.pl ** 2
+
+        b0 = F - self.Beq * x_dot - self.mp * self.pl * np.sin(theta + np.pi) * theta_dot ** 2
+        b1 = 0. - self.Bp * theta_dot - self.mp * self.pl * self.g * np.sin(theta + np.pi)
+
+        # closed-form elimination in the order lapack takes in
+        # np.linalg.solve, bit for bit as |b| < a never pivots
+        l = b * (1. / a)
+        x1 = (b1 - l * b0) / (c - l * b)
+        x0 = (b0 - b * x1) / a
+
+        return np.vstack((x0, x1))
@@ -45,7 +45,7 @@ class QCartpole(QCartpoleBase):
         pos = self._sim_state[:2]
         # vel = self._sim_state[2:]
         vel = self._vel_filt(pos)
-        return np.concatenate([pos, vel])
+        return np.concatenate([pos, vel]), u_noisy
 
     def reset(self):
         self._calibrate()
@@ -142,6 +142,20 @@ class QCartpoleTO(QCartpoleBase):
         xn = x + self.timing.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
         return xn
 
+    def dynamics_batch(self, x, u):
+        # states and actions of a batch in columns
+        def f(x, u):
+            _acc = self.dyn.batch(x, u)
+            return np.vstack((x[2], x[3], _acc))
+
+        k1 = f(x, u)
+        k2 = f(x + 0.5 * self.timing.dt * k1, u)
+        k3 = f(x + 0.5 * self.timing.dt * k2, u)
+        k4 = f(x + self.timing.dt * k3, u)
+
+        xn = x + self.timing.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
+        return xn
+
     def features(self, x):
         return x
 
@@ -161,3 +175,11 @@ class QCartpoleTO(QCartpoleBase):
             return (_x - self._g).T @ np.diag(self._gw) @ (_x - self._g) + u.T @ np.diag(self._uw) @ u
         else:
             return u.T @ np.diag(self._uw) @ u
+
+    def cost_batch(self, x, u, a):
+        # cost of a batch of states and actions in columns
+        c = np.sum(self._uw[:, None] * u**2, axis=0)
+        if a:
+            _x = self.features(x)
+            c += np.sum(self._gw[:, None] * (_x - self._g[:, None])**2, axis=0)
+        return c
@@ -1,17 +1,18 @@
 import autograd.numpy as np
 import time
 
-from trajopt.envs.quanser.common import QSocket, VelocityFilter
+from trajopt.envs.quanser.common import QSocket, AsyncQSocket, VelocityFilter
 from trajopt.envs.quanser.cartpole.base import QCartpoleBase
 from trajopt.envs.quanser.cartpole.ctrl import GoToLimCtrl
 
 
 class QCartpoleRR(QCartpoleBase):
-    def __init__(self, ip, fs_ctrl):
+    def __init__(self, ip, fs_ctrl, port=9095, pipelined=False):
         super(QCartpoleRR, self).__init__(fs=500.0, fs_ctrl=fs_ctrl)
 
         # Initialize Socket:
-        self._qsoc = QSocket(ip, x_len=self.sensor_space.shape[0], u_len=self.action_space.shape[0])
+        qsocket = AsyncQSocket if pipelined else QSocket
+        self._qsoc = qsocket(ip, x_len=self.sensor_space.shape[0], u_len=self.action_space.shape[0], port=port)
 
         # Save the relative limits:
         self._calibrated = False
@@ -49,7 +50,7 @@ class QCartpoleRR(QCartpoleBase):
 
         while not ctrl.done:
             u = ctrl(state)
-            state = self._sim_step(u)
+            state = self._sim_step(u)[0]
 
         if ctrl.success:
             self._norm_x_lim[1] = state[0]
@@ -70,7 +71,7 @@ class QCartpoleRR(QCartpoleBase):
 
         while not ctrl.done:
             u = ctrl(state)
-            state = self._sim_step(u)
+            state = self._sim_step(u)[0]
 
         if ctrl.success:
             self._norm_x_lim[0] = state[0]
@@ -95,7 +96,7 @@ class QCartpoleRR(QCartpoleBase):
         state = self._zero_sim_step()
         while (time.time() - t0) < t_max:
             a = -np.sign(state[0]) * 1.5 * np.ones(1)
-            state = self._sim_step(a)
+            state = self._sim_step(a)[0]
 
             if np.abs(state[0]) <= self.c_lim/10.:
                 break
@@ -162,7 +163,7 @@ class QCartpoleRR(QCartpoleBase):
 
         # Normalize the angle from 0. to 2.*pi
         pos[1] = np.mod(pos[1], 2. * np.pi) - np.pi
-        return np.concatenate([pos, x_dot, th_dot])
+        return np.concatenate([pos, x_dot, th_dot]), a
 
     def reset(self, verbose=True):
 
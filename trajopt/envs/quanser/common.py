@@ -1,7 +1,11 @@
+import time
 import socket
 import struct
+import asyncio
+import threading
+from array import array
+import numpy as onp
 import autograd.numpy as np
-from scipy import signal
 import gym
 from gym import spaces
 from gym.utils import seeding
@@ -11,17 +15,18 @@ class QSocket:
     """
     Class for communication with Quarc.
     """
-    def __init__(self, ip, x_len, u_len):
+    def __init__(self, ip, x_len, u_len, port=9095):
         """
         Prepare socket for communication.
         :param ip: IP address of the Windows PC
         :param x_len: number of measured state variables to receive
         :param u_len: number of control variables to send
+        :param port: TCP port, fixed to 9095 in the Simulink model
         """
         self._x_fmt = '>' + x_len * 'd'
         self._u_fmt = '>' + u_len * 'd'
         self._buf_size = x_len * 8  # 8 bytes for each double
-        self._port = 9095  # fixed in Simulink model
+        self._port = port
         self._ip = ip
         self._soc = None
 
@@ -53,6 +58,181 @@ class QSocket:
         return open
 
 
+class AsyncQSocket:
+    """
+    Pipelined communication with Quarc over an asyncio connection.
+
+    Actions are written without waiting for the answer, while a reader
+    running in a background event loop keeps the received sensor frames
+    in a ring buffer along with per-packet send and receive timestamps.
+    """
+    def __init__(self, ip, x_len, u_len, port=9095, buf_len=1024, timeout=1.):
+        """
+        Prepare the transport, nothing is connected before `open`.
+        :param ip: IP address of the Windows PC
+        :param x_len: number of measured state variables to receive
+        :param u_len: number of control variables to send
+        :param port: TCP port, fixed to 9095 in the Simulink model
+        :param buf_len: number of sensor frames kept in the ring buffer
+        :param timeout: seconds to wait for connecting and for a frame
+        """
+        self._x_dtype = np.dtype('>f8')
+        self._u_dtype = np.dtype('>f8')
+        self._buf_size = x_len * 8  # 8 bytes for each double
+        self._u_len = u_len
+        self._port = port
+        self._ip = ip
+        self._timeout = timeout
+
+        self._buf_len = buf_len
+        self._frames = np.zeros((buf_len, x_len))
+        self._snd_stamps = np.zeros(buf_len)
+        self._rcv_stamps = np.zeros(buf_len)
+
+        self._cond = threading.Condition()
+        self._nb_snd, self._nb_rcv, self._nb_read = 0, 0, 0
+        self._eof = False
+
+        self._loop = None
+        self._thread = None
+        self._writer = None
+        self._task = None
+
+    async def _connect(self):
+        reader, self._writer = await asyncio.open_connection(self._ip, self._port)
+        soc = self._writer.get_extra_info('socket')
+        soc.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._task = asyncio.ensure_future(self._receive(reader))
+
+    async def _receive(self, reader):
+        try:
+            while True:
+                # waits for the full frame on short reads
+                data = await reader.readexactly(self._buf_size)
+                stamp = time.perf_counter()
+                with self._cond:
+                    i = self._nb_rcv % self._buf_len
+                    self._frames[i] = np.frombuffer(data, dtype=self._x_dtype)
+                    self._rcv_stamps[i] = stamp
+                    self._nb_rcv += 1
+                    self._cond.notify_all()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            with self._cond:
+                self._eof = True
+                self._cond.notify_all()
+
+    def send(self, u):
+        """
+        Send u without waiting for the answer.
+        :param u: control vector
+        """
+        data = np.asarray(u, dtype=self._u_dtype).tobytes()
+        assert len(data) == self._u_len * 8
+        with self._cond:
+            self._snd_stamps[self._nb_snd % self._buf_len] = time.perf_counter()
+            self._nb_snd += 1
+        self._loop.call_soon_threadsafe(self._writer.write, data)
+
+    def recv(self):
+        """
+        Receive the answer to the oldest unanswered action.
+        :return: x: vector of measured states
+        """
+        with self._cond:
+            n = self._nb_read
+            if not self._cond.wait_for(lambda: self._nb_rcv > n or self._eof,
+                                       self._timeout):
+                raise TimeoutError("No answer from Quarc within {0:.2f}s".format(self._timeout))
+            if self._nb_rcv <= n:
+                raise ConnectionError("Connection to Quarc closed")
+
+            # frames older than the ring buffer are lost
+            n = max(n, self._nb_rcv - self._buf_len)
+            x = np.array(self._frames[n % self._buf_len], dtype=np.float32)
+            self._nb_read = n + 1
+        return x
+
+    def snd_rcv(self, u):
+        """
+        Send u and receive x.
+        :param u: control vector
+        :return: x: vector of measured states
+        """
+        self.send(u)
+        return self.recv()
+
+    def latest(self):
+        """
+        Most recent sensor frame without waiting, None before the first.
+        :return: x: vector of measured states
+        """
+        with self._cond:
+            if self._nb_rcv == 0:
+                return None
+            return np.array(self._frames[(self._nb_rcv - 1) % self._buf_len], dtype=np.float32)
+
+    def _window(self):
+        # packets whose stamps are still in the ring buffer
+        with self._cond:
+            k = np.arange(max(self._nb_rcv - self._buf_len, 0), self._nb_rcv)
+            return self._snd_stamps[k % self._buf_len], self._rcv_stamps[k % self._buf_len]
+
+    def latency(self):
+        """
+        Round-trip times of the buffered packets.
+        :return: array of seconds, oldest first
+        """
+        snd, rcv = self._window()
+        return rcv - snd
+
+    def jitter(self, bins=50):
+        """
+        Histogram of the deviation of the inter-arrival times from their median.
+        :param bins: number or edges of the histogram bins
+        :return: counts and bin edges in seconds
+        """
+        _, rcv = self._window()
+        dt = np.diff(rcv)
+        if dt.size == 0:
+            return np.histogram(dt, bins)
+        return np.histogram(dt - np.median(dt), bins)
+
+    def open(self):
+        if self._loop is None:
+            with self._cond:
+                self._nb_snd, self._nb_rcv, self._nb_read = 0, 0, 0
+                self._eof = False
+
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+            self._thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._connect(), self._loop).result(self._timeout)
+            except BaseException:
+                self.close()
+                raise
+
+    async def _disconnect(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    def close(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._disconnect(), self._loop).result(self._timeout)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop, self._thread = None, None
+            self._writer, self._task = None, None
+
+    def is_open(self):
+        return self._loop is not None
+
+
 class SymmetricBoxSpace:
     """
     Generic real-valued box space with symmetric boundaries.
@@ -70,6 +250,10 @@ class SymmetricBoxSpace:
 class VelocityFilter:
     """
     Discrete velocity filter derived from a continuous one.
+
+    Runs the recursion of `scipy.signal.lfilter` (direct form II transposed)
+    on preallocated state, reproducing `lfilter` on the `cont2discrete`
+    coefficients bit for bit without calling into scipy per sample.
     """
     def __init__(self, x_len, num=(50, 0), den=(1, 50), dt=0.002, x_init=None):
         """
@@ -80,15 +264,22 @@ class VelocityFilter:
         :param dt: sampling time interval
         :param x_init: initial observation of the signal to filter
         """
+        # scipy.signal is slow to import and only needed here
+        from scipy import signal
+
         derivative_filter = signal.cont2discrete((num, den), dt)
         self.b = derivative_filter[0].ravel().astype(np.float32)
         self.a = derivative_filter[1].astype(np.float32)
+        self.x_len = x_len
         if x_init is None:
             self.z = np.zeros((max(len(self.a), len(self.b)) - 1, x_len),
                               dtype=np.float32)
         else:
             self.set_initial_state(x_init)
 
+        self._dtype = None
+        self._z = None
+
     def set_initial_state(self, x_init):
         """
         This method can be used to set the initial state of the velocity filter.
@@ -98,14 +289,110 @@ class VelocityFilter:
         :param x_init: initial observation
         """
         assert isinstance(x_init, np.ndarray)
+        from scipy import signal
+
         # Get the initial condition of the filter
         zi = signal.lfilter_zi(self.b, self.a)  # dim = order of the filter = 1
         # Set the filter state
         self.z = np.outer(zi, x_init)
 
+    def _prepare(self, x):
+        # coefficients and state in the precision lfilter would pick, only
+        # redone when the precision of the input or the state changes
+        dtype = np.result_type(self.b, self.a, x, self.z)
+        if dtype == np.float32:
+            typecode = 'f'
+        elif dtype == np.float64:
+            typecode = 'd'
+        else:
+            raise TypeError('velocity filter supports float32 and float64, '
+                            'got inputs promoting to %s' % dtype)
+
+        n = max(len(self.a), len(self.b))
+        b = np.zeros(n, dtype=dtype)
+        a = np.zeros(n, dtype=dtype)
+        b[:len(self.b)] = self.b
+        a[:len(self.a)] = self.a
+        if a[0] != 1.:
+            b, a = b / a[0], a / a[0]
+
+        # the state lives in a C array of floats or doubles, so scalar
+        # updates are rounded on every store just like in lfilter
+        self._zbuf = array(typecode, np.ascontiguousarray(self.z, dtype=dtype).tobytes())
+        self._r = array(typecode, [0.])
+        self.z = self._z = np.frombuffer(self._zbuf, dtype=dtype).reshape(n - 1, self.x_len)
+
+        self._bl, self._al = b.tolist(), a.tolist()
+        # one-element arrays, numpy scalars would not promote the input
+        self._b, self._a = list(b[:, None]), list(a[:, None])
+
+        self._y = np.zeros(self.x_len, dtype=dtype)
+        self._tmp = np.zeros(self.x_len, dtype=dtype)
+        self._dtype = x.dtype
+
     def __call__(self, x):
-        xd, self.z = signal.lfilter(self.b, self.a, x[None, :], 0, self.z)
-        return xd.ravel()
+        """
+        Filter one sample of all channels in place.
+        :param x: sample of shape (x_len, )
+        :return: filtered sample, a buffer that is overwritten by the next call
+        """
+        if x.dtype is not self._dtype or self.z is not self._z:
+            self._prepare(x)
+
+        b, a, z, r, y = self._bl, self._al, self._zbuf, self._r, self._y
+        n, c = len(b), self.x_len
+
+        # one channel at a time, cheaper than
+        # numpy calls for the few sensor channels
+        for j, xj in enumerate(x.tolist()):
+            r[0] = b[0] * xj
+            r[0] = z[j] + r[0]
+            yj = r[0]
+            for i in range(1, n - 1):
+                r[0] = b[i] * xj
+                r[0] = z[i * c + j] + r[0]
+                t = r[0]
+                r[0] = a[i] * yj
+                z[(i - 1) * c + j] = t - r[0]
+            r[0] = b[-1] * xj
+            t = r[0]
+            r[0] = a[-1] * yj
+            z[(n - 2) * c + j] = t - r[0]
+            y[j] = yj
+
+        return y
+
+    def batch(self, x, out=None):
+        """
+        Filter consecutive samples, vectorized over the channels.
+        :param x: samples of shape (n_samples, x_len), oldest first
+        :param out: optional output of the same shape
+        :return: filtered samples
+        """
+        if x.dtype is not self._dtype or self.z is not self._z:
+            self._prepare(x)
+
+        b, a, z, tmp = self._b, self._a, self._z, self._tmp
+        if out is None:
+            out = np.zeros(x.shape, dtype=z.dtype)
+
+        # plain numpy ufuncs, the autograd wrappers cost more than the flops
+        multiply, add, subtract = onp.multiply, onp.add, onp.subtract
+
+        for k in range(x.shape[0]):
+            xk, y = x[k], out[k]
+            multiply(xk, b[0], out=y)
+            add(z[0], y, out=y)
+            for i in range(1, len(b) - 1):
+                multiply(xk, b[i], out=tmp)
+                add(z[i], tmp, out=z[i - 1])
+                multiply(y, a[i], out=tmp)
+                subtract(z[i - 1], tmp, out=z[i - 1])
+            multiply(y, a[-1], out=tmp)
+            multiply(xk, b[-1], out=z[-1])
+            subtract(z[-1], tmp, out=z[-1])
+
+        return out
 
 
 class LabeledBox(spaces.Box):
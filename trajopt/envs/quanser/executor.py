@@ -0,0 +1,163 @@
+from time import perf_counter
+
+import numpy as np
+
+
+class PolicyExecutor:
+    """
+    Deploy-time executor of a time-varying linear(-Gaussian) controller.
+
+    Runs u = uref + alpha * kff + K (x - xref) [+ chol(sigma) eps] from
+    gains stored time-major and contiguous, writing into preallocated
+    buffers so that `step` allocates no arrays. Each call records its
+    latency and the period since the previous call, which is counted as a
+    deadline miss when it exceeds the control period `dt_ctrl`.
+
+    Only depends on numpy, so a saved controller can be run on the robot
+    without importing the solvers.
+    """
+    __slots__ = ('dm_state', 'dm_act', 'nb_steps', 'dt_ctrl',
+                 '_K', '_k', '_L', '_u', '_eps', '_tmp', '_rng',
+                 'latency', 'period', 'nb_calls', 'nb_misses', '_last')
+
+    def __init__(self, K, kff, sigma=None, xref=None, uref=None,
+                 alpha=1., dt_ctrl=None, stoch=False, seed=None):
+        """
+        Gains in the layout of the solvers, time along the last axis.
+        :param K: feedback gains of shape (dm_act, dm_state, nb_steps)
+        :param kff: feedforward terms of shape (dm_act, nb_steps)
+        :param sigma: action covariances of shape (dm_act, dm_act, nb_steps)
+        :param xref: reference states of shape (dm_state, nb_steps), as in iLQR
+        :param uref: reference actions of shape (dm_act, nb_steps), as in iLQR
+        :param alpha: step size on the feedforward terms, as in iLQR
+        :param dt_ctrl: control period to check the calls against, e.g. `Timing.dt_ctrl`
+        :param stoch: sample actions from sigma
+        :param seed: seed of the action noise
+        """
+        self.dm_act, self.dm_state, self.nb_steps = K.shape
+        self.dt_ctrl = np.inf if dt_ctrl is None else dt_ctrl
+
+        # fold references and step size into one offset per step
+        k = alpha * kff
+        if uref is not None:
+            k = k + uref
+        if xref is not None:
+            k = k - np.einsum('kht,ht->kt', K, xref)
+
+        K = np.ascontiguousarray(np.moveaxis(K, -1, 0), dtype=np.float64)
+        k = np.ascontiguousarray(np.moveaxis(k, -1, 0), dtype=np.float64)
+
+        # one view per step, indexing a list creates no array
+        self._K, self._k = list(K), list(k)
+
+        self._L = None
+        if stoch and sigma is not None:
+            L = np.zeros((self.nb_steps, self.dm_act, self.dm_act))
+            for t in range(self.nb_steps):
+                try:
+                    L[t] = np.linalg.cholesky(sigma[..., t])
+                except np.linalg.LinAlgError:
+                    # semi-definite, factorize like numpy does
+                    U, s, _ = np.linalg.svd(sigma[..., t])
+                    L[t] = U * np.sqrt(s)
+            self._L = list(L)
+
+        self._u = np.zeros((self.dm_act, ))
+        self._eps = np.zeros((self.dm_act, ))
+        self._tmp = np.zeros((self.dm_act, ))
+        self._rng = np.random.default_rng(seed)
+
+        self.latency = np.zeros((self.nb_steps, ))
+        self.period = np.zeros((self.nb_steps, ))
+        self.nb_calls, self.nb_misses = 0, 0
+        self._last = None
+
+    @classmethod
+    def from_controller(cls, ctl, **kwargs):
+        """
+        :param ctl: any controller with K, kff and optionally sigma,
+        e.g. `LinearGaussianControl` or `LinearControl`
+        :param kwargs: further arguments of the constructor
+        """
+        return cls(ctl.K, ctl.kff, sigma=getattr(ctl, 'sigma', None), **kwargs)
+
+    def reset(self):
+        # start of an episode, clears the timing records
+        self.latency[:] = 0.
+        self.period[:] = 0.
+        self.nb_calls, self.nb_misses = 0, 0
+        self._last = None
+
+    def step(self, x, t):
+        """
+        :param x: state of shape (dm_state, )
+        :param t: time step, smaller than nb_steps
+        :return: action, a buffer that is overwritten by the next call
+        """
+        tic = perf_counter()
+
+        u = self._u
+        np.dot(self._K[t], x, out=u)
+        np.add(u, self._k[t], out=u)
+        if self._L is not None:
+            self._rng.standard_normal(out=self._eps)
+            np.dot(self._L[t], self._eps, out=self._tmp)
+            np.add(u, self._tmp, out=u)
+
+        self.latency[t] = perf_counter() - tic
+        if self._last is not None:
+            period = tic - self._last
+            self.period[t] = period
+            if period > self.dt_ctrl:
+                self.nb_misses += 1
+        self._last = tic
+        self.nb_calls += 1
+
+        return u
+
+    def __call__(self, x, t):
+        return self.step(x, t)
+
+    def stats(self):
+        """
+        :return: latency and period statistics of the calls since the last reset
+        :rtype: dict
+        """
+        n = min(self.nb_calls, self.nb_steps)
+        latency, period = self.latency[:n], self.period[1:n]
+        return {'nb_calls': self.nb_calls,
+                'nb_misses': self.nb_misses,
+                'latency_mean': np.mean(latency) if n else np.nan,
+                'latency_max': np.max(latency) if n else np.nan,
+                'latency_p99': np.percentile(latency, 99) if n else np.nan,
+                'period_mean': np.mean(period) if n > 1 else np.nan,
+                'period_max': np.max(period) if n > 1 else np.nan}
+
+    @staticmethod
+    def save(path, ctl, xref=None, uref=None, alpha=1.):
+        """
+        Store the gains of a controller in the layout of the solvers.
+        :param path: file name of the npz archive
+        :param ctl: controller with K, kff and optionally sigma
+        """
+        arrays = {'K': ctl.K, 'kff': ctl.kff, 'alpha': np.array(alpha)}
+        if getattr(ctl, 'sigma', None) is not None:
+            arrays['sigma'] = ctl.sigma
+        if xref is not None:
+            arrays['xref'] = xref
+        if uref is not None:
+            arrays['uref'] = uref
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path, dt_ctrl=None, stoch=False, seed=None):
+        """
+        :param path: npz archive written by `save`
+        """
+        with np.load(path) as f:
+            return cls(f['K'], f['kff'],
+                       sigma=f['sigma'] if 'sigma' in f else None,
+                       xref=f['xref'] if 'xref' in f else None,
+                       uref=f['uref'] if 'uref' in f else None,
+                       alpha=float(f['alpha']), dt_ctrl=dt_ctrl,
+                       stoch=stoch, seed=seed)
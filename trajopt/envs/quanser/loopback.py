@@ -0,0 +1,166 @@
+import time
+import asyncio
+import threading
+
+import numpy as np
+
+from trajopt.envs.quanser.qube.base import QubeDynamics
+from trajopt.envs.quanser.cartpole.base import CartpoleDynamics, X_LIM
+
+
+class QuarcServer:
+    """
+    Local TCP stand-in for the Quarc Simulink endpoint.
+
+    Every action packet advances the simulated Qube or cartpole by one
+    sample of the sensor rate and is answered with its encoder positions,
+    so `QubeRR` and `QCartpoleRR` can be exercised without hardware.
+    """
+    def __init__(self, robot='qube', host='127.0.0.1', port=9095,
+                 fs=500.0, realtime=False, seed=None):
+        """
+        As on the real robot, the simulated state persists across
+        connections and the encoders count from power-up.
+        :param robot: 'qube' or 'cartpole'
+        :param host: address to listen on
+        :param port: TCP port, 9095 in the Simulink model
+        :param fs: sampling frequency of the emulated controller
+        :param realtime: pace the answers to the sampling frequency
+        :param seed: seed of the initial state
+        """
+        if robot == 'qube':
+            self.dyn = QubeDynamics()
+            self.act_max = 5.0
+            # rotary arm joint limit
+            self.pos_max = np.array([2.0, np.inf])
+            # 2048 counts per revolution
+            self.pos_res = np.array([2. * np.pi / 2048., 2. * np.pi / 2048.])
+            self.x0 = np.array([0., 0., 0., 0.])
+        elif robot == 'cartpole':
+            self.dyn = CartpoleDynamics()
+            self.act_max = 24.0
+            # end of the track
+            self.pos_max = np.array([X_LIM / 2., np.inf])
+            # 4096 counts per revolution of the pinion and the pole
+            self.pos_res = np.array([2. * np.pi * self.dyn.r_mp / 4096., 2. * np.pi / 4096.])
+            self.x0 = np.array([0., np.pi, 0., 0.])
+        else:
+            raise ValueError("unknown robot '%s', expected 'qube' or 'cartpole'" % robot)
+
+        self.robot = robot
+        self.host = host
+        self.port = port
+        self.dt = 1.0 / fs
+        self.realtime = realtime
+
+        self.u_len = 1
+
+        self._np_random = np.random.RandomState(seed)
+
+        # hanging pole with a slight offset
+        self._state = np.copy(self.x0)
+        self._state[1] += self._np_random.uniform(-1e-2, 1e-2)
+        self._zero = self._state[:2].copy()
+
+        self.nb_packets = 0
+
+        self._loop = None
+        self._thread = None
+        self._server = None
+        # handlers of open connections
+        self._tasks = set()
+
+    def _step(self, x, u):
+        u = np.clip(u, -self.act_max, self.act_max)
+        acc = self.dyn(x, u)
+
+        # euler step as in the simulated envs
+        x[3] += self.dt * acc[1]
+        x[2] += self.dt * acc[0]
+        x[1] += self.dt * x[3]
+        x[0] += self.dt * x[2]
+
+        # hard stops at the limits
+        hit = np.abs(x[:2]) > self.pos_max
+        x[:2] = np.clip(x[:2], -self.pos_max, self.pos_max)
+        x[2:] = np.where(hit, 0., x[2:])
+
+        return x
+
+    def _measure(self, x):
+        # quantized encoder readings relative to power-up
+        return np.round((x[:2] - self._zero) / self.pos_res) * self.pos_res
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+
+        t_next = time.perf_counter()
+        try:
+            while True:
+                data = await reader.readexactly(8 * self.u_len)
+                u = np.frombuffer(data, dtype='>f8')
+                x = self._step(self._state, u)
+                self.nb_packets += 1
+
+                if self.realtime:
+                    t_next += self.dt
+                    await asyncio.sleep(max(t_next - time.perf_counter(), 0.))
+
+                writer.write(self._measure(x).astype('>f8').tobytes())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # server stopped, end quietly
+            pass
+        finally:
+            writer.close()
+            self._tasks.discard(task)
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self):
+        # serve from a background thread
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+
+            async def _start():
+                self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+            self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(_start(), self._loop).result()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            async def _stop():
+                self._server.close()
+                # drop open connections before the loop goes away
+                for task in self._tasks:
+                    task.cancel()
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+                await self._server.wait_closed()
+
+            asyncio.run_coroutine_threadsafe(_stop(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop, self._thread, self._server = None, None, None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Quarc loopback server')
+    parser.add_argument('robot', choices=['qube', 'cartpole'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9095)
+    parser.add_argument('--realtime', action='store_true')
+    args = parser.parse_args()
+
+    server = QuarcServer(args.robot, args.host, args.port, realtime=args.realtime)
+    asyncio.run(server.serve())
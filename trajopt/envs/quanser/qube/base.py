@@ -62,6 +62,9 @@ class ActionLimiter:
         self._th_lim_stiffness = \
             action_space.high[0] / (self._th_lim_max - self._th_lim_min)
         self._clip = lambda a: np.clip(a, action_space.low, action_space.high)
+        # precision a scalar force is clipped in, float32 under the
+        # value-based casting of numpy 1.x, float64 under numpy 2
+        self._force_dtype = np.result_type(np.float64(0.), action_space.low)
         self._relu = lambda x: x * (x > 0.0)
 
     def _joint_lim_violation_force(self, x):
@@ -79,6 +82,16 @@ class ActionLimiter:
         force = self._joint_lim_violation_force(x)
         return self._clip(force if force else a)
 
+    def batch(self, x, a):
+        # states and actions of a batch in columns
+        th, _, thd, _ = x
+        up = self._relu(th-self._th_lim_max) - self._relu(th-self._th_lim_min)
+        dn = -self._relu(-th-self._th_lim_max)+self._relu(-th-self._th_lim_min)
+        active = np.logical_or(np.logical_and(th > self._th_lim_min, thd > 0.0),
+                               np.logical_and(th < -self._th_lim_min, thd < 0.0))
+        force = (self._th_lim_stiffness * (up + dn) * active).astype(self._force_dtype)
+        return self._clip(np.where(force != 0.0, force, a))
+
 
 class QubeDynamics:
     """Solve equation M qdd + C(q, qd) = tau for qdd."""
@@ -7,6 +7,7 @@ from gym import spaces
 from gym.utils import seeding
 
 from trajopt.envs.quanser.qube.base import QubeBase, QubeDynamics, ActionLimiter
+from trajopt.envs.noise import GaussianNoise
 
 
 class Qube(QubeBase):
@@ -143,6 +144,7 @@ class QubeTO(gym.Env):
 
         self.state = None
         self.np_random = None
+        self.gaussian = GaussianNoise(self)
 
         self.seed()
 
@@ -188,6 +190,24 @@ class QubeTO(gym.Env):
         xn = np.clip(xn, -self._xmax, self._xmax)
         return xn
 
+    def dynamics_batch(self, x, u):
+        # states and actions of a batch in columns
+        _u = self._lim_act.batch(x, u)
+
+        def f(x, u):
+            thdd, aldd = self.dyn(x, u)
+            return np.vstack((x[2], x[3], thdd, aldd))
+
+        k1 = f(x, _u)
+        k2 = f(x + 0.5 * self.dt * k1, _u)
+        k3 = f(x + 0.5 * self.dt * k2, _u)
+        k4 = f(x + self.dt * k3, _u)
+
+        xn = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
+
+        xn = np.clip(xn, -self._xmax[:, None], self._xmax[:, None])
+        return xn
+
     def features(self, x):
         return x
 
@@ -206,6 +226,12 @@ class QubeTO(gym.Env):
         _x = _J(getval(x)) @ x + _j
         return a * (_x - self._g).T @ np.diag(self._gw) @ (_x - self._g) + u.T @ np.diag(self._uw) @ u
 
+    def cost_batch(self, x, u, a):
+        # cost of a batch of states and actions in columns
+        _x = self.features(x)
+        return a * np.sum(self._gw[:, None] * (_x - self._g[:, None])**2, axis=0)\
+               + np.sum(self._uw[:, None] * u**2, axis=0)
+
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
         return [seed]
@@ -216,12 +242,12 @@ class QubeTO(gym.Env):
         # evolve deterministic dynamics
         self.state = self.dynamics(self.state, u)
         # add noise
-        self.state = self.np_random.multivariate_normal(mean=self.state, cov=_sigma)
+        self.state = self.gaussian(mean=self.state, cov=_sigma)
         return self.state, [], False, {}
 
     def reset(self):
         _mu_0, _sigma_0 = self.init()
-        self.state = self.np_random.multivariate_normal(mean=_mu_0, cov=_sigma_0)
+        self.state = self.gaussian(mean=_mu_0, cov=_sigma_0)
         return self.state
 
 
@@ -1,15 +1,16 @@
 import autograd.numpy as np
 
-from trajopt.envs.quanser.common import QSocket, VelocityFilter
+from trajopt.envs.quanser.common import QSocket, AsyncQSocket, VelocityFilter
 from trajopt.envs.quanser.qube.base import QubeBase
 from trajopt.envs.quanser.qube.ctrl import CalibrCtrl
 
 
 class QubeRR(QubeBase):
-    def __init__(self, ip, fs_ctrl):
+    def __init__(self, ip, fs_ctrl, port=9095, pipelined=False):
         super(QubeRR, self).__init__(fs=500.0, fs_ctrl=fs_ctrl)
-        self._qsoc = QSocket(ip, x_len=self.sensor_space.shape[0],
-                             u_len=self.action_space.shape[0])
+        qsocket = AsyncQSocket if pipelined else QSocket
+        self._qsoc = qsocket(ip, x_len=self.sensor_space.shape[0],
+                             u_len=self.action_space.shape[0], port=port)
         self._sens_offset = None
 
     def _calibrate(self):
@@ -30,18 +31,18 @@ class QubeRR(QubeBase):
 
         # Find theta offset by going to joint limits
         x = self._zero_sim_step()
-        act = CalibrCtrl()
+        act = CalibrCtrl(self.timing.render_rate)
         while not act.done:
-            x = self._sim_step(act(x))
+            x = self._sim_step(act(x))[0]
         self._sens_offset[0] = (act.go_right.th_lim + act.go_left.th_lim) / 2
 
         # Set current state
         self._state = self._zero_sim_step()
 
-    def _sim_step(self, x, u):
+    def _sim_step(self, u):
         pos = self._qsoc.snd_rcv(u)
         pos -= self._sens_offset
-        return np.concatenate([pos, self._vel_filt(pos)])
+        return np.concatenate([pos, self._vel_filt(pos)]), u
 
     def reset(self):
         self._qsoc.close()
@@ -0,0 +1,198 @@
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Single-producer single-consumer ring of fixed-width samples in shared memory.
+
+    The producer only ever writes a row and then publishes it by bumping
+    the sample count, so it never blocks and never takes a lock. A slow
+    consumer loses the oldest samples instead of stalling the producer.
+    """
+    def __init__(self, width, capacity=4096, name=None):
+        """
+        :param width: number of values per sample
+        :param capacity: number of samples kept
+        :param name: name of the shared memory to attach to, creates a new one if None
+        """
+        self.width = width
+        self.capacity = capacity
+
+        # sample count, closed flag and four slots of consumer statistics
+        nbytes = 2 * 8 + 4 * 8 + capacity * width * 8
+        self._owner = name is None
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=nbytes)
+
+        buf = self._shm.buf
+        self._head = np.ndarray((2, ), dtype=np.int64, buffer=buf)
+        self.stats = np.ndarray((4, ), dtype=np.float64, buffer=buf, offset=16)
+        self._data = np.ndarray((capacity, width), dtype=np.float64, buffer=buf, offset=48)
+
+        if self._owner:
+            self._head[:] = 0
+            self.stats[:] = 0.
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def count(self):
+        return int(self._head[0])
+
+    @property
+    def closed(self):
+        return bool(self._head[1])
+
+    def push(self, sample):
+        # write the row first, publish it second
+        n = self._head[0]
+        self._data[n % self.capacity] = sample
+        self._head[0] = n + 1
+
+    def pull(self, since):
+        """
+        Copy the samples published after a given count.
+        :param since: count returned by the previous pull, 0 at first
+        :return: new samples, oldest first, and the count to pull from next
+        :rtype: tuple
+        """
+        n = int(self._head[0])
+        # leave out the slot the producer may be writing
+        start = max(since, n - self.capacity + 1)
+        idx = np.arange(start, n) % self.capacity
+        rows = self._data[idx]
+
+        # drop rows that were overwritten while copying
+        lost = int(self._head[0]) - self.capacity + 1 - start
+        if lost > 0:
+            rows = rows[lost:]
+        return rows, n
+
+    def close(self):
+        # tells the consumer that no more samples follow
+        if self._owner:
+            self._head[1] = 1
+
+    def release(self):
+        del self._head, self.stats, self._data
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _render(name, width, capacity, labels, ylims, dt, maxt, fps):
+    # runs in its own process, draws the last maxt
+    # seconds of samples with blitting at up to fps
+    import matplotlib.pyplot as plt
+
+    buffer = RingBuffer(width, capacity, name=name)
+
+    n = int(round(maxt / dt))
+    t = np.arange(- n + 1, 1) * dt
+    y = np.full((n, width), np.nan)
+
+    fig, ax = plt.subplots(width, figsize=(14, 2.5 * width), sharex=True, squeeze=False)
+    ax = ax[:, 0]
+    lines = []
+    for i in range(width):
+        ax[i].set_xlim(- maxt, 0.)
+        ax[i].set_ylim(*ylims[i])
+        ax[i].set_ylabel(labels[i])
+        lines.append(ax[i].plot(t, y[:, i], animated=True)[0])
+
+    # the fixed time axis scrolls the data, not the axes,
+    # so the background only changes on resize
+    bg = {}
+
+    def _grab(event=None):
+        bg['fig'] = fig.canvas.copy_from_bbox(fig.bbox)
+
+    fig.canvas.mpl_connect('draw_event', _grab)
+    plt.show(block=False)
+    fig.canvas.draw()
+
+    last = 0
+    while plt.fignum_exists(fig.number) and not buffer.closed:
+        tic = time.perf_counter()
+
+        rows, last = buffer.pull(last)
+        k = min(len(rows), n)
+        if k:
+            y[:-k] = y[k:]
+            y[-k:] = rows[-k:]
+
+            fig.canvas.restore_region(bg['fig'])
+            for i in range(width):
+                lines[i].set_ydata(y[:, i])
+                ax[i].draw_artist(lines[i])
+            fig.canvas.blit(fig.bbox)
+        fig.canvas.flush_events()
+
+        # frames, total and maximal render time
+        toc = time.perf_counter() - tic
+        buffer.stats[0] += 1
+        buffer.stats[1] += toc
+        buffer.stats[2] = max(buffer.stats[2], toc)
+
+        time.sleep(max(1. / fps - toc, 0.))
+
+    plt.close(fig)
+    buffer.release()
+
+
+class Scope:
+    """
+    Live plot of telemetry, rendered by a separate process.
+
+    The control loop only pushes samples into a shared ring buffer, so
+    redrawing never delays a control step. Render times are measured in
+    the render process and reported back through the buffer.
+    """
+    def __init__(self, labels, ylims, dt=0.01, maxt=10., fps=30., capacity=4096):
+        """
+        :param labels: name of every value of a sample
+        :param ylims: (low, high) of every value of a sample
+        :param dt: time between samples
+        :param maxt: time span shown
+        :param fps: maximal frame rate
+        :param capacity: number of samples the buffer keeps
+        """
+        self.buffer = RingBuffer(len(labels), capacity)
+        self._stats = None
+        self._proc = mp.Process(target=_render, daemon=True,
+                                args=(self.buffer.name, len(labels), capacity,
+                                      tuple(labels), tuple(ylims), dt, maxt, fps))
+
+    def start(self):
+        self._proc.start()
+        return self
+
+    def is_alive(self):
+        return self._proc.is_alive()
+
+    def push(self, sample):
+        self.buffer.push(sample)
+
+    def stats(self):
+        """
+        :return: number of frames, mean and maximal render time
+        :rtype: dict
+        """
+        if self._stats is not None:
+            return self._stats
+        frames, total, worst = self.buffer.stats[:3]
+        return {'frames': int(frames),
+                'render_mean': total / frames if frames else np.nan,
+                'render_max': worst}
+
+    def close(self):
+        self.buffer.close()
+        if self._proc.is_alive():
+            self._proc.join(timeout=5.)
+        self._stats = self.stats()
+        self.buffer.release()
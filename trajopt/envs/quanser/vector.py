@@ -0,0 +1,164 @@
+import autograd.numpy as np
+
+from trajopt.envs.quanser.common import VelocityFilter
+
+
+class VectorBase:
+    """
+    Simulates copies of a Quanser env in parallel.
+
+    Every step integrates the whole control interval for all copies at
+    once. The noise of all sub-steps is drawn up front, in the order the
+    single env would draw it, so a single copy reproduces the env exactly.
+    States, observations and actions of the copies live in columns.
+    """
+    def __init__(self, env, nb_envs):
+        """
+        :param env: simulated env to copy, e.g. `Qube` or `QCartpole`
+        :param nb_envs: number of parallel copies
+        """
+        self.env = env.unwrapped
+        self.nb_envs = nb_envs
+
+        self.timing = self.env.timing
+        self.dyn = self.env.dyn
+
+        self._sim_state = None
+        self._state = None
+
+    def seed(self, seed=None):
+        return self.env.seed(seed)
+
+    def _calibrate(self):
+        raise NotImplementedError
+
+    def _sim_steps(self, u, nb_steps):
+        """
+        Integrate all copies over a number of simulation steps.
+
+        :param u: actions of shape (1, nb_envs), held over all steps
+        :param nb_steps: number of simulation steps
+        :return: states of the last step, and actions used
+        :rtype: tuple
+        """
+        raise NotImplementedError
+
+    def _zero_sim_step(self):
+        return self._sim_steps(np.zeros((1, self.nb_envs)), 1)[0]
+
+    def _ctrl_step(self, u):
+        return self._sim_steps(u, self.timing.n_sim_per_ctrl)
+
+    def step(self, u):
+        rwd, done = self.env._rwd(self._state, u)
+        rwd = np.broadcast_to(rwd, (self.nb_envs, ))
+        done = np.broadcast_to(done, (self.nb_envs, ))
+
+        # copies that are done get no action
+        if np.any(done):
+            u = np.where(done, u * 0., u)
+
+        self._state, act = self._ctrl_step(u)
+
+        obs = self.env._observation(self._state)
+        return obs, rwd, done, {'x': self._state, 'u': act}
+
+    def reset(self):
+        self._calibrate()
+        return self.step(np.zeros((1, self.nb_envs)))[0]
+
+
+class VectorQube(VectorBase):
+    def __init__(self, env, nb_envs):
+        super(VectorQube, self).__init__(env, nb_envs)
+        self._lim_act = self.env._lim_act
+        self._low = self.env.state_space.low[:, None]
+        self._high = self.env.state_space.high[:, None]
+
+    def _calibrate(self):
+        # same initial distribution as Qube._calibrate
+        _low, _high = np.array([-0.1, - np.pi / 36., -0.1, -0.1]),\
+                      np.array([0.1, np.pi / 36., 0.1, 0.1])
+        self._sim_state = self.env._np_random.uniform(low=_low, high=_high,
+                                                      size=(self.nb_envs, 4)).T.copy()
+        self._state = self._zero_sim_step()
+
+    def _sim_steps(self, u, nb_steps):
+        # action noise and observation noise of every step, from the
+        # global generator like Qube._sim_step
+        eps = np.random.randn(nb_steps, 5, self.nb_envs)
+
+        dt = self.timing.dt
+        x = self._sim_state
+
+        u_noisy = None
+        for k in range(nb_steps):
+            # add action noise
+            u_noisy = u + eps[k, :1] * 1e-2
+
+            u_cmd = self._lim_act.batch(x, u_noisy)
+            thdd, aldd = self.dyn(x, u_cmd)
+
+            # Update internal simulation state
+            x[3] += dt * aldd
+            x[2] += dt * thdd
+            x[1] += dt * x[3]
+            x[0] += dt * x[2]
+
+            # apply state constraints
+            x = np.clip(x, self._low, self._high)
+
+            # add observation noise
+            x = x + eps[k, 1:] * 1e-4
+
+        self._sim_state = x
+        return x, u_noisy
+
+
+class VectorQCartpole(VectorBase):
+    def __init__(self, env, nb_envs):
+        super(VectorQCartpole, self).__init__(env, nb_envs)
+        self._vel_filt = None
+
+    def _calibrate(self):
+        # one filter channel per copy and position,
+        # same filter and initial state as QCartpole._calibrate
+        _wcf, _zetaf = 62.8318, 0.9  # filter params
+        self._vel_filt = VelocityFilter(x_len=2 * self.nb_envs,
+                                        x_init=np.repeat(np.array([0., np.pi]), self.nb_envs),
+                                        dt=self.timing.dt,
+                                        num=(_wcf ** 2, 0),
+                                        den=(1, 2. * _wcf * _zetaf, _wcf ** 2))
+
+        self._sim_state = np.zeros((4, self.nb_envs))
+        self._sim_state[1] = np.pi + 0.01 * self.env._np_random.standard_normal(self.nb_envs)
+        self._state = self._zero_sim_step()
+
+    def _sim_steps(self, u, nb_steps):
+        # action noise of every step, from the env's generator
+        # like QCartpole._sim_step
+        eps = 1e-6 * np.float32(self.env._np_random.standard_normal((nb_steps, 1, self.nb_envs)))
+
+        dt = self.timing.dt
+        x = self._sim_state
+
+        # positions of every step, filtered at once afterwards
+        pos = np.zeros((nb_steps, 2 * self.nb_envs))
+
+        u_noisy = None
+        for k in range(nb_steps):
+            u_noisy = u + eps[k]
+
+            acc = self.dyn.batch(x, u_noisy)
+
+            # Update internal simulation state
+            x[3] += dt * acc[-1]
+            x[2] += dt * acc[-2]
+            x[1] += dt * x[3]
+            x[0] += dt * x[2]
+
+            pos[k] = x[:2].ravel()
+
+        # Pretend to only observe position and obtain velocity by filtering
+        vel = self._vel_filt.batch(pos)[-1]
+        return np.vstack((x[:2], vel.reshape(2, self.nb_envs))), u_noisy
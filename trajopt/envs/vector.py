@@ -0,0 +1,90 @@
+import autograd.numpy as np
+
+from trajopt.envs.noise import GaussianNoise
+
+
+class VectorEnv:
+    # steps nb_envs copies of an environment at once,
+    # states and actions of all copies live in columns
+
+    def __init__(self, env, nb_envs):
+        self.env = env.unwrapped
+        self.nb_envs = nb_envs
+
+        self.dm_state = self.env.observation_space.shape[0]
+        self.dm_act = self.env.action_space.shape[0]
+
+        # cached factors, one noise block for all copies
+        self.gaussian = GaussianNoise(self.env)
+
+        self.state = None
+
+    @property
+    def np_random(self):
+        return self.env.np_random
+
+    @property
+    def perturb(self):
+        return getattr(self.env, 'perturb', False)
+
+    def seed(self, seed=None):
+        return self.env.seed(seed)
+
+    def dynamics(self, x, u):
+        return self.env.dynamics_batch(x, u)
+
+    def cost(self, *args):
+        return self.env.cost_batch(*args)
+
+    def step(self, u):
+        # noise models are state-action independent,
+        # evaluate on the first copy only
+        _sigma = self.env.noise(self.state[:, 0], u[:, 0])
+        # evolve deterministic dynamics
+        self.state = self.env.dynamics_batch(self.state, u)
+        if self.perturb:
+            self.env.perturbation.step()
+        # add noise
+        self.state = self.gaussian(mean=self.state, cov=_sigma)
+        return self.state, [], False, {}
+
+    def reset(self):
+        # one perturbation episode per copy
+        if self.perturb:
+            self.env.perturbation.reset(self.nb_envs)
+        _mu_0, _sigma_0 = self.env.init()
+        _mu_0 = np.repeat(_mu_0[:, None], self.nb_envs, axis=1)
+        self.state = self.gaussian(mean=_mu_0, cov=_sigma_0)
+        return self.state
+
+    def rollout(self, ctl, nb_steps, weighting, stoch=True):
+        data = {'x': np.zeros((self.dm_state, nb_steps, self.nb_envs)),
+                'u': np.zeros((self.dm_act, nb_steps, self.nb_envs)),
+                'xn': np.zeros((self.dm_state, nb_steps, self.nb_envs)),
+                'c': np.zeros((nb_steps + 1, self.nb_envs))}
+
+        # linear-gaussian controllers carry a covariance
+        stoch = stoch and hasattr(ctl, 'sigma')
+
+        _u_last = np.zeros((self.dm_act, self.nb_envs))
+
+        x = self.reset()
+        for t in range(nb_steps):
+            u = np.einsum('kh,hn->kn', ctl.K[..., t], x) + ctl.kff[..., t][:, None]
+            if stoch:
+                _chol = np.linalg.cholesky(ctl.sigma[..., t])
+                u = u + _chol @ np.random.randn(self.dm_act, self.nb_envs)
+            data['u'][..., t, :] = u
+
+            # expose true reward function
+            data['c'][t] = self.cost(x, u, _u_last, weighting[t])
+            _u_last = u
+
+            data['x'][..., t, :] = x
+            x, _, _, _ = self.step(u)
+            data['xn'][..., t, :] = x
+
+        data['c'][-1] = self.cost(x, np.zeros((self.dm_act, self.nb_envs)),
+                                  np.zeros((self.dm_act, self.nb_envs)), weighting[-1])
+
+        return data
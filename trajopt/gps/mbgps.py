@@ -3,14 +3,18 @@ import autograd.numpy as np
 import scipy as sc
 from scipy import optimize
 
+from trajopt import profiling
+
+from trajopt.envs.vector import VectorEnv
+
 from trajopt.gps.objects import Gaussian, QuadraticCost
 from trajopt.gps.objects import AnalyticalLinearGaussianDynamics, AnalyticalQuadraticCost
 from trajopt.gps.objects import QuadraticStateValue, QuadraticStateActionValue
 from trajopt.gps.objects import LinearGaussianControl
 from trajopt.gps.objects import pass_alpha_as_vector
 
-from trajopt.gps.core import kl_divergence, quad_expectation, augment_cost
-from trajopt.gps.core import forward_pass, backward_pass
+from trajopt.native.core.gps import kl_divergence, quad_expectation, augment_cost
+from trajopt.native.core.gps import forward_pass, backward_pass
 
 
 class MBGPS:
@@ -25,6 +29,7 @@ class MBGPS:
 
         # expose necessary functions
         self.env_dyn = self.env.unwrapped.dynamics
+        self.env_dyn_jac = getattr(self.env.unwrapped, 'dynamics_and_jacobians', None)
         self.env_noise = self.env.unwrapped.noise
         self.env_cost = self.env.unwrapped.cost
         self.env_init = init_state
@@ -67,7 +72,8 @@ class MBGPS:
         self.qfunc = QuadraticStateActionValue(self.dm_state, self.dm_act, self.nb_steps)
 
         self.dyn = AnalyticalLinearGaussianDynamics(self.env_dyn, self.env_noise,
-                                                    self.dm_state, self.dm_act, self.nb_steps)
+                                                    self.dm_state, self.dm_act, self.nb_steps,
+                                                    f_jac=self.env_dyn_jac)
 
         self.ctl = LinearGaussianControl(self.dm_state, self.dm_act, self.nb_steps, init_action_sigma)
         self.ctl.kff = 1e-4 * np.random.randn(self.dm_act, self.nb_steps)
@@ -97,6 +103,11 @@ class MBGPS:
             env = env
             env_cost = env.unwrapped.cost
 
+        # step all episodes at once if the env is vectorized
+        if hasattr(env.unwrapped, 'dynamics_batch'):
+            venv = VectorEnv(env, nb_episodes)
+            return venv.rollout(self.ctl, self.nb_steps, self.weighting, stoch)
+
         data = {'x': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
                 'u': np.zeros((self.dm_act, self.nb_steps, nb_episodes)),
                 'xn': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
@@ -171,6 +182,8 @@ class MBGPS:
         return agcost
 
     def dual(self, alpha):
+        profiling.count('dual_evaluations')
+
         # augmented cost
         agcost = self.augment_cost(alpha)
 
@@ -223,16 +236,19 @@ class MBGPS:
 
         plt.show()
 
+    @profiling.profiled
     def run(self, nb_iter=10, verbose=False):
         _trace = []
 
         # get mean traj. and linear system dynamics
+        profiling.phase('rollout')
         self.xdist, self.udist, lgd, _cost = self.propagate(self.ctl)
 
         # update linearization of dynamics
         self.dyn.params = lgd.A, lgd.B, lgd.c, lgd.sigma
 
         # get quadratic cost around mean traj.
+        profiling.phase('taylor_expansion')
         self.cost.taylor_expansion(self.xdist.mu, self.udist.mu, self.weighting)
 
         # mean objective under current dists.
@@ -240,6 +256,9 @@ class MBGPS:
         _trace.append(self.last_return)
 
         for iter in range(nb_iter):
+            profiling.iteration(iter)
+
+            profiling.phase('dual_optimization')
             if self.kl_stepwise:
                 init = 1e4 * np.ones((self.nb_steps,))
                 bounds = ((1e-16, 1e16), ) * self.nb_steps
@@ -256,10 +275,12 @@ class MBGPS:
             self.alpha = res.x
 
             # re-compute after opt.
+            profiling.phase('backward_pass')
             agcost = self.augment_cost(self.alpha)
             lgc, xvalue, xuvalue, diverge = self.backward_pass(self.alpha, agcost)
 
             # get expected improvment:
+            profiling.phase('forward_pass')
             xdist, udist, xudist = self.forward_pass(lgc)
             _expected_return = self.cost.evaluate(xdist.mu, udist.mu)
 
@@ -273,6 +294,7 @@ class MBGPS:
                 self.ctl = lgc
 
                 # extended-Kalman forward simulation
+                profiling.phase('rollout')
                 xdist, udist, lgd, _cost = self.propagate(lgc)
 
                 # current return
@@ -295,6 +317,7 @@ class MBGPS:
                 self.xdist, self.udist = xdist, udist
 
                 # update quadratic cost around mean traj.
+                profiling.phase('taylor_expansion')
                 self.cost.taylor_expansion(self.xdist.mu, self.udist.mu, self.weighting)
 
                 # update value functions
@@ -316,6 +339,7 @@ class MBGPS:
                         print("%6s %6s %6s %12s" % ("iter", "req.", "act.", "return"))
                     print("%6i %6.2f %6.2f %12.2f" % (iter, np.sum(self.kl_bound), np.sum(kl), _return))
             else:
+                profiling.count('dual_retries')
                 print("Something is wrong, KL not satisfied")
                 if self.kl_stepwise:
                     self.alpha = 1e8 * np.ones((self.nb_steps,))
@@ -3,6 +3,10 @@ import autograd.numpy as np
 import scipy as sc
 from scipy import optimize
 
+from trajopt import profiling
+
+from trajopt.envs.vector import VectorEnv
+
 from trajopt.gps.objects import Gaussian, QuadraticCost
 from trajopt.gps.objects import LearnedLinearGaussianDynamics, AnalyticalQuadraticCost
 from trajopt.gps.objects import LearnedLinearGaussianDynamicsWithKnownNoise
@@ -10,8 +14,8 @@ from trajopt.gps.objects import QuadraticStateValue, QuadraticStateActionValue
 from trajopt.gps.objects import LinearGaussianControl
 from trajopt.gps.objects import pass_alpha_as_vector
 
-from trajopt.gps.core import kl_divergence, quad_expectation, augment_cost
-from trajopt.gps.core import forward_pass, backward_pass
+from trajopt.native.core.gps import kl_divergence, quad_expectation, augment_cost
+from trajopt.native.core.gps import forward_pass, backward_pass
 
 
 class MFGPS:
@@ -93,6 +97,11 @@ class MFGPS:
         self.data = {}
 
     def rollout(self, nb_episodes, stoch=True):
+        # step all episodes at once if the env is vectorized
+        if hasattr(self.env.unwrapped, 'dynamics_batch'):
+            venv = VectorEnv(self.env, nb_episodes)
+            return venv.rollout(self.ctl, self.nb_steps, self.weighting, stoch)
+
         data = {'x': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
                 'u': np.zeros((self.dm_act, self.nb_steps, nb_episodes)),
                 'xn': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
@@ -158,6 +167,8 @@ class MFGPS:
         return agcost
 
     def dual(self, alpha):
+        profiling.count('dual_evaluations')
+
         # augmented cost
         agcost = self.augment_cost(alpha)
 
@@ -210,22 +221,27 @@ class MFGPS:
 
         plt.show()
 
+    @profiling.profiled
     def run(self, nb_learning_episodes,
             nb_evaluation_episodes, nb_iter=10,
             verbose=False):
         _trace = []
 
         # run init controller
+        profiling.phase('rollout')
         self.data = self.rollout(nb_learning_episodes)
         eval = self.rollout(nb_evaluation_episodes)
 
         # fit time-variant linear dynamics
+        profiling.phase('dynamics_learning')
         self.dyn.learn(self.data)
 
         # current state distribution
+        profiling.phase('forward_pass')
         self.xdist, self.udist, self.xudist = self.forward_pass(self.ctl)
 
         # get quadratic cost around mean traj.
+        profiling.phase('taylor_expansion')
         self.cost.taylor_expansion(self.xdist.mu, self.udist.mu, self.weighting)
 
         # mean objective under current ctrl.
@@ -233,6 +249,9 @@ class MFGPS:
         _trace.append(self.last_return)
 
         for iter in range(nb_iter):
+            profiling.iteration(iter)
+
+            profiling.phase('dual_optimization')
             if self.kl_stepwise:
                 init = 1e8 * np.ones((self.nb_steps,))
                 bounds = ((1e-16, 1e16), ) * self.nb_steps
@@ -249,10 +268,12 @@ class MFGPS:
             self.alpha = res.x
 
             # re-compute after opt.
+            profiling.phase('backward_pass')
             agcost = self.augment_cost(self.alpha)
             lgc, xvalue, xuvalue, diverge = self.backward_pass(self.alpha, agcost)
 
             # get expected improvment:
+            profiling.phase('forward_pass')
             xdist, udist, xudist = self.forward_pass(lgc)
             _expected_return = self.cost.evaluate(xdist.mu, udist.mu)
 
@@ -269,6 +290,7 @@ class MFGPS:
                 self.vfunc, self.qfunc = xvalue, xuvalue
 
                 # run current controller
+                profiling.phase('rollout')
                 self.data = self.rollout(nb_learning_episodes)
                 eval = self.rollout(nb_evaluation_episodes)
 
@@ -286,12 +308,15 @@ class MFGPS:
                     self.kl_mult = np.maximum(np.minimum(_mult * self.kl_mult, self.kl_mult_max), self.kl_mult_min)
 
                 # fit time-variant linear dynamics
+                profiling.phase('dynamics_learning')
                 self.dyn.learn(self.data)
 
                 # current state distribution
+                profiling.phase('forward_pass')
                 self.xdist, self.udist, self.xudist = self.forward_pass(self.ctl)
 
                 # get quadratic cost around mean traj.
+                profiling.phase('taylor_expansion')
                 self.cost.taylor_expansion(self.xdist.mu, self.udist.mu, self.weighting)
 
                 # mean objective under last dists.
@@ -310,6 +335,7 @@ class MFGPS:
                         print("%6s %6s %6s %12s" % ("iter", "req.", "act.", "return"))
                     print("%6i %6.2f %6.2f %12.2f" % (iter, np.sum(self.kl_bound), np.sum(kl), _return))
             else:
+                profiling.count('dual_retries')
                 print("Something is wrong, KL not satisfied")
                 if self.kl_stepwise:
                     self.alpha = 1e8 * np.ones((self.nb_steps,))
@@ -7,14 +7,16 @@ from mimo.distributions import MatrixNormalWithKnownPrecision
 from mimo.distributions import LinearGaussianWithMatrixNormal
 from mimo.distributions import LinearGaussianWithKnownPrecision
 
+from trajopt import trajectory
+
 
 class Gaussian:
     def __init__(self, nb_dim, nb_steps):
         self.nb_dim = nb_dim
         self.nb_steps = nb_steps
 
-        self.mu = np.zeros((self.nb_dim, self.nb_steps))
-        self.sigma = np.zeros((self.nb_dim, self.nb_dim, self.nb_steps))
+        self.mu = trajectory.zeros((self.nb_dim, self.nb_steps))
+        self.sigma = trajectory.zeros((self.nb_dim, self.nb_dim, self.nb_steps))
         for t in range(self.nb_steps):
             self.sigma[..., t] = np.eye(self.nb_dim)
 
@@ -35,8 +37,8 @@ class QuadraticStateValue:
         self.dm_state = dm_state
         self.nb_steps = nb_steps
 
-        self.V = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.v = np.zeros((self.dm_state, self.nb_steps, ))
+        self.V = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.v = trajectory.zeros((self.dm_state, self.nb_steps, ))
         self.v0 = np.zeros((self.nb_steps, ))
 
 
@@ -46,12 +48,12 @@ class QuadraticStateActionValue:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.Qxx = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.Quu = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
-        self.Qux = np.zeros((self.dm_act, self.dm_state, self.nb_steps))
+        self.Qxx = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.Quu = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.Qux = trajectory.zeros((self.dm_act, self.dm_state, self.nb_steps))
 
-        self.qx = np.zeros((self.dm_state, self.nb_steps, ))
-        self.qu = np.zeros((self.dm_act, self.nb_steps, ))
+        self.qx = trajectory.zeros((self.dm_state, self.nb_steps, ))
+        self.qu = trajectory.zeros((self.dm_act, self.nb_steps, ))
 
         self.q0 = np.zeros((self.nb_steps, ))
 
@@ -63,13 +65,13 @@ class QuadraticCost:
 
         self.nb_steps = nb_steps
 
-        self.Cxx = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.cx = np.zeros((self.dm_state, self.nb_steps))
+        self.Cxx = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.cx = trajectory.zeros((self.dm_state, self.nb_steps))
 
-        self.Cuu = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
-        self.cu = np.zeros((self.dm_act, self.nb_steps))
+        self.Cuu = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.cu = trajectory.zeros((self.dm_act, self.nb_steps))
 
-        self.Cxu = np.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.Cxu = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
         self.c0 = np.zeros((self.nb_steps, ))
 
     @property
@@ -136,10 +138,10 @@ class LinearGaussianDynamics:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.A = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.B = np.zeros((self.dm_state, self.dm_act, self.nb_steps))
-        self.c = np.zeros((self.dm_state, self.nb_steps))
-        self.sigma = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.A = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.B = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.c = trajectory.zeros((self.dm_state, self.nb_steps))
+        self.sigma = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
         for t in range(self.nb_steps):
             self.sigma[..., t] = 1e-8 * np.eye(self.dm_state)
 
@@ -156,7 +158,7 @@ class LinearGaussianDynamics:
 
 
 class AnalyticalLinearGaussianDynamics(LinearGaussianDynamics):
-    def __init__(self, f_dyn, noise, dm_state, dm_act, nb_steps):
+    def __init__(self, f_dyn, noise, dm_state, dm_act, nb_steps, f_jac=None):
         super(AnalyticalLinearGaussianDynamics, self).__init__(dm_state, dm_act, nb_steps)
 
         self.f = f_dyn
@@ -165,6 +167,9 @@ class AnalyticalLinearGaussianDynamics(LinearGaussianDynamics):
         self.dfdx = jacobian(self.f, 0)
         self.dfdu = jacobian(self.f, 1)
 
+        # code-generated jacobians over all time steps
+        self.f_jac = f_jac
+
     def evalf(self, x, u):
         return self.f(x, u)
 
@@ -188,9 +193,19 @@ class AnalyticalLinearGaussianDynamics(LinearGaussianDynamics):
             udist.mu[..., t] = np.clip(lgc.K[..., t] @ xdist.mu[..., t] + lgc.kff[..., t], -ulim, ulim)
             xdist.mu[..., t + 1] = self.evalf(xdist.mu[..., t], udist.mu[..., t])
 
+        if self.f_jac is not None:
+            _x, _u = xdist.mu[..., :-1], udist.mu
+            _xn, lgd.A, lgd.B = self.f_jac(_x, _u)
+            # residual of taylor expansion
+            lgd.c = _xn - np.einsum('kht,ht->kt', lgd.A, _x)\
+                    - np.einsum('kht,ht->kt', lgd.B, _u)
+
         for t in range(self.nb_steps):
-            lgd.A[..., t], lgd.B[..., t], lgd.c[..., t], lgd.sigma[..., t] =\
-                self.taylor_expansion(xdist.mu[..., t], udist.mu[..., t])
+            if self.f_jac is not None:
+                lgd.sigma[..., t] = self.noise(xdist.mu[..., t], udist.mu[..., t])
+            else:
+                lgd.A[..., t], lgd.B[..., t], lgd.c[..., t], lgd.sigma[..., t] =\
+                    self.taylor_expansion(xdist.mu[..., t], udist.mu[..., t])
 
             # construct variace of next time step with extend Kalman filtering
             mu_x, sigma_x = xdist.mu[..., t], xdist.sigma[..., t]
@@ -267,10 +282,10 @@ class LinearGaussianControl:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.K = np.zeros((self.dm_act, self.dm_state, self.nb_steps))
-        self.kff = np.zeros((self.dm_act, self.nb_steps))
+        self.K = trajectory.zeros((self.dm_act, self.dm_state, self.nb_steps))
+        self.kff = trajectory.zeros((self.dm_act, self.nb_steps))
 
-        self.sigma = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.sigma = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
         for t in range(self.nb_steps):
             self.sigma[..., t] = init_ctl_sigma * np.eye(self.dm_act)
 
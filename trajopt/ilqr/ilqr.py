@@ -1,10 +1,13 @@
 import autograd.numpy as np
 
+from trajopt import trajectory
+from trajopt import profiling
+
 from trajopt.ilqr.objects import AnalyticalLinearDynamics, AnalyticalQuadraticCost
 from trajopt.ilqr.objects import QuadraticStateValue, QuadraticStateActionValue
 from trajopt.ilqr.objects import LinearControl
 
-from trajopt.ilqr.core import backward_pass
+from trajopt.native.core.ilqr import backward_pass
 
 
 class iLQR:
@@ -21,9 +24,16 @@ class iLQR:
 
         # expose necessary functions
         self.env_dyn = self.env.unwrapped.dynamics
+        self.env_dyn_jac = getattr(self.env.unwrapped, 'dynamics_and_jacobians', None)
         self.env_cost = self.env.unwrapped.cost
         self.env_init = init_state
 
+        # vectorized envs evaluate all step sizes at once
+        self.batch = hasattr(self.env.unwrapped, 'dynamics_batch')
+        if self.batch:
+            self.env_dyn_batch = self.env.unwrapped.dynamics_batch
+            self.env_cost_batch = self.env.unwrapped.cost_batch
+
         self.ulim = self.env.action_space.high
 
         self.dm_state = self.env.observation_space.shape[0]
@@ -56,15 +66,16 @@ class iLQR:
         self.tolgrad = tolgrad
 
         # reference trajectory
-        self.xref = np.zeros((self.dm_state, self.nb_steps + 1))
+        self.xref = trajectory.zeros((self.dm_state, self.nb_steps + 1))
         self.xref[..., 0] = self.env_init
 
-        self.uref = np.zeros((self.dm_act, self.nb_steps))
+        self.uref = trajectory.zeros((self.dm_act, self.nb_steps))
 
         self.vfunc = QuadraticStateValue(self.dm_state, self.nb_steps + 1)
         self.qfunc = QuadraticStateActionValue(self.dm_state, self.dm_act, self.nb_steps)
 
-        self.dyn = AnalyticalLinearDynamics(self.env_dyn, self.dm_state, self.dm_act, self.nb_steps)
+        self.dyn = AnalyticalLinearDynamics(self.env_dyn, self.dm_state, self.dm_act, self.nb_steps,
+                                            f_jac=self.env_dyn_jac)
 
         self.ctl = LinearControl(self.dm_state, self.dm_act, self.nb_steps)
         self.ctl.kff = 1e-4 * np.random.randn(self.dm_act, self.nb_steps)
@@ -87,8 +98,8 @@ class iLQR:
         self.last_return = - np.inf
 
     def forward_pass(self, ctl, alpha):
-        state = np.zeros((self.dm_state, self.nb_steps + 1))
-        action = np.zeros((self.dm_act, self.nb_steps))
+        state = trajectory.zeros((self.dm_state, self.nb_steps + 1))
+        action = trajectory.zeros((self.dm_act, self.nb_steps))
         cost = np.zeros((self.nb_steps + 1, ))
 
         state[..., 0] = self.env_init
@@ -101,6 +112,26 @@ class iLQR:
         cost[..., -1] = self.env_cost(state[..., -1], np.zeros((self.dm_act, )), np.zeros((self.dm_act, )), self.weighting[-1])
         return state, action, cost
 
+    def forward_pass_batch(self, ctl, alphas):
+        # one rollout per step size, stacked along the last axis
+        nb = len(alphas)
+
+        state = np.zeros((self.dm_state, self.nb_steps + 1, nb))
+        action = np.zeros((self.dm_act, self.nb_steps, nb))
+        cost = np.zeros((self.nb_steps + 1, nb))
+
+        state[..., 0, :] = self.env_init[:, None]
+        for t in range(self.nb_steps):
+            dx = state[..., t, :] - self.xref[:, t][:, None]
+            _act = self.uref[:, t][:, None] + alphas * ctl.kff[..., t][:, None] + ctl.K[..., t] @ dx
+            action[..., t, :] = np.clip(_act, -self.ulim[:, None], self.ulim[:, None])
+            cost[t] = self.env_cost_batch(state[..., t, :], action[..., t, :], action[..., t - 1, :], self.weighting[t])
+            state[..., t + 1, :] = self.env_dyn_batch(state[..., t, :], action[..., t, :])
+
+        cost[-1] = self.env_cost_batch(state[..., -1, :], np.zeros((self.dm_act, nb)),
+                                       np.zeros((self.dm_act, nb)), self.weighting[-1])
+        return state, action, cost
+
     def backward_pass(self):
         lc = LinearControl(self.dm_state, self.dm_act, self.nb_steps)
         xvalue = QuadraticStateValue(self.dm_state, self.nb_steps + 1)
@@ -133,9 +164,11 @@ class iLQR:
 
         plt.show()
 
+    @profiling.profiled
     def run(self, nb_iter=25, verbose=False):
         _trace = []
         # init trajectory
+        profiling.phase('rollout')
         for alpha in self.alphas:
             _state, _action, _cost = self.forward_pass(self.ctl, alpha)
             if np.all(_state < 1e8):
@@ -148,8 +181,14 @@ class iLQR:
 
         _trace.append(self.last_return)
 
+        # step sizes in the first batch of the line search
+        _nb_first = 1
+
         for iter in range(nb_iter):
+            profiling.iteration(iter)
+
             # get linear system dynamics around ref traj.
+            profiling.phase('taylor_expansion')
             self.dyn.taylor_expansion(self.xref, self.uref)
 
             # get quadratic cost around ref traj.
@@ -158,10 +197,13 @@ class iLQR:
             xvalue, xuvalue = None, None
             lc, dvalue = None, None
             # execute a backward pass
+            profiling.phase('backward_pass')
             backpass_done = False
             while not backpass_done:
                 lc, xvalue, xuvalue, dvalue, diverge = self.backward_pass()
                 if np.any(diverge):
+                    profiling.count('backward_pass_retries')
+                    profiling.count('lmbda_increases')
                     # increase lmbda
                     self.dlmbda = np.maximum(self.dlmbda * self.mult_lmbda, self.mult_lmbda)
                     self.lmbda = np.maximum(self.lmbda * self.dlmbda, self.min_lmbda)
@@ -182,13 +224,26 @@ class iLQR:
             _state, _action = None, None
             _return, _dreturn = None, None
             # execute a forward pass
+            profiling.phase('line_search')
             fwdpass_done = False
             if backpass_done:
-                for alpha in self.alphas:
+                for n, alpha in enumerate(self.alphas):
+                    profiling.count('line_search_trials')
                     self.alpha = alpha
 
                     # apply on actual system
-                    _state, _action, _cost = self.forward_pass(ctl=lc, alpha=self.alpha)
+                    if self.batch:
+                        # batch the step sizes up to the one accepted last,
+                        # the full step alone while it keeps being accepted,
+                        # and the remaining ones only if none of those is
+                        if n == 0 or n == _nb_first:
+                            _first = n
+                            _alphas = self.alphas[:_nb_first] if n == 0 else self.alphas[_nb_first:]
+                            _states, _actions, _costs = self.forward_pass_batch(lc, _alphas)
+                        m = n - _first
+                        _state, _action, _cost = _states[..., m], _actions[..., m], _costs[..., m]
+                    else:
+                        _state, _action, _cost = self.forward_pass(ctl=lc, alpha=self.alpha)
 
                     # summed mean return
                     _return = np.sum(_cost)
@@ -203,12 +258,15 @@ class iLQR:
 
             # accept or reject
             if fwdpass_done:
+                _nb_first = n + 1
+
                 # decrease lmbda
                 self.dlmbda = np.minimum(self.dlmbda / self.mult_lmbda, 1. / self.mult_lmbda)
                 self.lmbda = self.lmbda * self.dlmbda * (self.lmbda > self.min_lmbda)
 
-                self.xref = _state
-                self.uref = _action
+                # batched rollouts are not time-major
+                self.xref = trajectory.asarray(_state)
+                self.uref = trajectory.asarray(_action)
                 self.last_return = _return
 
                 self.vfunc = xvalue
@@ -222,6 +280,9 @@ class iLQR:
                 if _dreturn < self.tolfun:
                     break
             else:
+                _nb_first = len(self.alphas)
+
+                profiling.count('lmbda_increases')
                 # increase lmbda
                 self.dlmbda = np.maximum(self.dlmbda * self.mult_lmbda, self.mult_lmbda)
                 self.lmbda = np.maximum(self.lmbda * self.dlmbda, self.min_lmbda)
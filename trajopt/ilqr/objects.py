@@ -1,14 +1,16 @@
 import autograd.numpy as np
 from autograd import jacobian, hessian
 
+from trajopt import trajectory
+
 
 class QuadraticStateValue:
     def __init__(self, dm_state, nb_steps):
         self.dm_state = dm_state
         self.nb_steps = nb_steps
 
-        self.V = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.v = np.zeros((self.dm_state, self.nb_steps, ))
+        self.V = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.v = trajectory.zeros((self.dm_state, self.nb_steps, ))
 
 
 class QuadraticStateActionValue:
@@ -17,12 +19,12 @@ class QuadraticStateActionValue:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.Qxx = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.Quu = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
-        self.Qux = np.zeros((self.dm_act, self.dm_state, self.nb_steps))
+        self.Qxx = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.Quu = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.Qux = trajectory.zeros((self.dm_act, self.dm_state, self.nb_steps))
 
-        self.qx = np.zeros((self.dm_state, self.nb_steps, ))
-        self.qu = np.zeros((self.dm_act, self.nb_steps, ))
+        self.qx = trajectory.zeros((self.dm_state, self.nb_steps, ))
+        self.qu = trajectory.zeros((self.dm_act, self.nb_steps, ))
 
 
 class QuadraticCost:
@@ -32,13 +34,13 @@ class QuadraticCost:
 
         self.nb_steps = nb_steps
 
-        self.Cxx = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.cx = np.zeros((self.dm_state, self.nb_steps))
+        self.Cxx = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.cx = trajectory.zeros((self.dm_state, self.nb_steps))
 
-        self.Cuu = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
-        self.cu = np.zeros((self.dm_act, self.nb_steps))
+        self.Cuu = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.cu = trajectory.zeros((self.dm_act, self.nb_steps))
 
-        self.Cxu = np.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.Cxu = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
 
     @property
     def params(self):
@@ -84,8 +86,8 @@ class LinearDynamics:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.A = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.B = np.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.A = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.B = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
 
     @property
     def params(self):
@@ -100,7 +102,7 @@ class LinearDynamics:
 
 
 class AnalyticalLinearDynamics(LinearDynamics):
-    def __init__(self, f_dyn, dm_state, dm_act, nb_steps):
+    def __init__(self, f_dyn, dm_state, dm_act, nb_steps, f_jac=None):
         super(AnalyticalLinearDynamics, self).__init__(dm_state, dm_act, nb_steps)
 
         self.f = f_dyn
@@ -108,10 +110,17 @@ class AnalyticalLinearDynamics(LinearDynamics):
         self.dfdx = jacobian(self.f, 0)
         self.dfdu = jacobian(self.f, 1)
 
+        # code-generated jacobians over all time steps
+        self.f_jac = f_jac
+
     def evalf(self, x, u):
         return self.f(x, u)
 
     def taylor_expansion(self, x, u):
+        if self.f_jac is not None:
+            _, self.A, self.B = self.f_jac(x[..., :self.nb_steps], u[..., :self.nb_steps])
+            return
+
         for t in range(self.nb_steps):
             self.A[..., t] = self.dfdx(x[..., t], u[..., t])
             self.B[..., t] = self.dfdu(x[..., t], u[..., t])
@@ -123,8 +132,8 @@ class LinearControl:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.K = np.zeros((self.dm_act, self.dm_state, self.nb_steps))
-        self.kff = np.zeros((self.dm_act, self.nb_steps))
+        self.K = trajectory.zeros((self.dm_act, self.dm_state, self.nb_steps))
+        self.kff = trajectory.zeros((self.dm_act, self.nb_steps))
 
     @property
     def params(self):
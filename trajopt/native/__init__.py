@@ -0,0 +1,27 @@
+from contextlib import contextmanager
+
+from trajopt import profiling
+import trajopt.native.core as core
+
+
+# kernels report to the profiler of a profiled solver run, done
+# before any solver imports them from the submodules of core
+for _module in (core.ilqr, core.gps, core.rgps, core.bspilqr,
+                core.elqr, core.riccati):
+    for _name, _kernel in list(vars(_module).items()):
+        if not _name.startswith('_') and callable(_kernel):
+            setattr(_module, _name, profiling.native(_kernel))
+
+
+@contextmanager
+def threads(nb_threads):
+    # number of BLAS and OpenMP threads used by the native kernels
+    # called within. the setting is global, so set it once around a
+    # pool of solver threads, e.g. to 1, rather than in each of them.
+    # an openmp count left to openmp is left to it again afterwards
+    last = core.get_num_threads()
+    core.set_num_threads(nb_threads, nb_threads)
+    try:
+        yield
+    finally:
+        core.set_num_threads(*last)
@@ -0,0 +1,97 @@
+#pragma once
+
+// one setting for all kernels, they share the armadillo templates
+#define ARMA_DONT_PRINT_ERRORS
+
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+#include <armadillo>
+
+#include <algorithm>
+#include <optional>
+
+
+namespace trajopt {
+
+namespace py = pybind11;
+
+
+typedef py::array_t<double, py::array::f_style | py::array::forcecast> array_tf;
+typedef py::array_t<double, py::array::c_style | py::array::forcecast> array_tc;
+
+
+// kernels hold the GIL only to view their inputs and allocate their
+// outputs, the numerics run without it. they keep no state between
+// calls, so concurrent calls from several threads are safe as long as
+// no thread writes to the input arrays of a running call
+
+class release_gil {
+
+    std::optional<py::gil_scoped_release> _release;
+
+public:
+    release_gil() { _release.emplace(); }
+
+    // take the GIL back to build the python result
+    void acquire() { _release.reset(); }
+};
+
+
+// read-only views on the memory of numpy arrays, valid as long as the
+// array lives, i.e. for the call. arrays that are not fortran-ordered
+// doubles are converted once by pybind11 when the call is made
+
+inline const arma::cube view_cube(const array_tf &m) {
+    return arma::cube(const_cast<double *>(m.data()), m.shape(0), m.shape(1), m.shape(2), false, true);
+}
+
+
+inline const arma::mat view_mat(const array_tf &m) {
+    return arma::mat(const_cast<double *>(m.data()), m.shape(0), m.shape(1), false, true);
+}
+
+
+inline const arma::vec view_vec(const array_tf &m) {
+    return arma::vec(const_cast<double *>(m.data()), m.size(), false, true);
+}
+
+
+// outputs are allocated by numpy and written in place
+// through writable views, returning them copies nothing
+
+inline array_tf zeros_array(py::ssize_t n_rows) {
+    array_tf m({n_rows});
+    std::fill_n(m.mutable_data(), m.size(), 0.);
+    return m;
+}
+
+
+inline array_tf zeros_array(py::ssize_t n_rows, py::ssize_t n_cols) {
+    array_tf m({n_rows, n_cols});
+    std::fill_n(m.mutable_data(), m.size(), 0.);
+    return m;
+}
+
+
+inline array_tf zeros_array(py::ssize_t n_rows, py::ssize_t n_cols, py::ssize_t n_slices) {
+    array_tf m({n_rows, n_cols, n_slices});
+    std::fill_n(m.mutable_data(), m.size(), 0.);
+    return m;
+}
+
+
+inline arma::cube wrap_cube(array_tf &m) {
+    return arma::cube(m.mutable_data(), m.shape(0), m.shape(1), m.shape(2), false, true);
+}
+
+
+inline arma::mat wrap_mat(array_tf &m) {
+    return arma::mat(m.mutable_data(), m.shape(0), m.shape(1), false, true);
+}
+
+
+inline arma::vec wrap_vec(array_tf &m) {
+    return arma::vec(m.mutable_data(), m.size(), false, true);
+}
+
+}
@@ -0,0 +1,27 @@
+#pragma once
+
+#include <atomic>
+
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+
+namespace trajopt {
+
+// openmp threads of the kernels for all calling threads, unlike
+// omp_set_num_threads which only applies to the thread calling it,
+// 0 leaves it to openmp
+extern std::atomic<int> nb_omp_threads;
+
+
+inline int omp_threads() {
+#ifdef _OPENMP
+    int nb_threads = nb_omp_threads.load();
+    return nb_threads > 0 ? nb_threads : omp_get_max_threads();
+#else
+    return 1;
+#endif
+}
+
+}
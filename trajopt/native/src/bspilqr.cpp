@@ -1,82 +1,31 @@
-#include <pybind11/pybind11.h>
-#include <pybind11/numpy.h>
-#include <armadillo>
+#include <trajopt/numpy.hpp>
 
-namespace py = pybind11;
 
-using namespace arma;
-
-
-typedef py::array_t<double, py::array::f_style | py::array::forcecast> array_tf;
-typedef py::array_t<double, py::array::c_style | py::array::forcecast> array_tc;
-
-
-cube array_to_cube(array_tf m) {
-
-    py::buffer_info _m_buff = m.request();
-    int n_rows = _m_buff.shape[0];
-    int n_cols = _m_buff.shape[1];
-    int n_slices = _m_buff.shape[2];
-
-    cube _m_arma((double *)_m_buff.ptr, n_rows, n_cols, n_slices);
-
-    return _m_arma;
-}
-
-
-mat array_to_mat(array_tf m) {
-
-    py::buffer_info _m_buff = m.request();
-    int n_rows = _m_buff.shape[0];
-    int n_cols = _m_buff.shape[1];
-
-    mat _m_arma((double *)_m_buff.ptr, n_rows, n_cols);
-
-    return _m_arma;
-}
-
-
-vec array_to_vec(array_tf m) {
-
-    py::buffer_info _m_buff = m.request();
-    int n_rows = _m_buff.shape[0];
-
-    vec _m_vec((double *)_m_buff.ptr, n_rows);
-
-    return _m_vec;
-}
+namespace trajopt {
+namespace bspilqr {
 
+using namespace arma;
 
-array_tf cube_to_array(cube m) {
-
-    auto _m_array = array_tf({m.n_rows, m.n_cols, m.n_slices});
-
-    py::buffer_info _m_buff = _m_array.request();
-    std::memcpy(_m_buff.ptr, m.memptr(), sizeof(double) * m.n_rows * m.n_cols * m.n_slices);
-
-    return _m_array;
-}
-
-
-array_tf mat_to_array(mat m) {
-
-    auto _m_array = array_tf({m.n_rows, m.n_cols});
-
-    py::buffer_info _m_buff = _m_array.request();
-    std::memcpy(_m_buff.ptr, m.memptr(), sizeof(double) * m.n_rows * m.n_cols);
-
-    return _m_array;
-}
 
+vec vectorise_sym(const mat &S, bool vech) {
 
-array_tf vec_to_array(vec m) {
+    if (!vech)
+        return vectorise(S);
 
-    auto _m_array = array_tf({m.n_rows});
+    // half-vectorized with doubled off-diagonals, such that
+    // the inner product with vech(dW) equals the one of vec(S) and vec(dW)
+    int n = S.n_rows;
+    vec _S(n * (n + 1) / 2);
 
-    py::buffer_info _m_buff = _m_array.request();
-    std::memcpy(_m_buff.ptr, m.memptr(), sizeof(double) * m.n_rows);
+    int k = 0;
+    for(int j = 0; j < n; j++) {
+        for(int i = j; i < n; i++) {
+            _S(k) = (i == j) ? S(i, j) : 2. * S(i, j);
+            k++;
+        }
+    }
 
-    return _m_array;
+    return _S;
 }
 
 
@@ -87,29 +36,32 @@ py::tuple backward_pass(array_tf _Q, array_tf _q,
                         array_tf _T, array_tf _U,
                         array_tf _V, array_tf _X,
                         array_tf _Y, array_tf _Z,
-                        double lmbda, int reg,
+                        double lmbda, int reg, bool vech,
                         int dm_belief, int dm_act, int nb_steps) {
 
     // inputs
-    cube Q = array_to_cube(_Q);
-    mat q = array_to_mat(_q);
+    const cube Q = view_cube(_Q);
+    const mat q = view_mat(_q);
+
+    const cube R = view_cube(_R);
+    const mat r = view_mat(_r);
 
-    cube R = array_to_cube(_R);
-    mat r = array_to_mat(_r);
+    const cube P = view_cube(_P);
+    const mat p = view_mat(_p);
 
-    cube P = array_to_cube(_P);
-    mat p = array_to_mat(_p);
+    const cube F = view_cube(_F);
+    const cube G = view_cube(_G);
 
-    cube F = array_to_cube(_F);
-    cube G = array_to_cube(_G);
+    const cube T = view_cube(_T);
+    const cube U = view_cube(_U);
+    const cube V = view_cube(_V);
 
-    cube T = array_to_cube(_T);
-    cube U = array_to_cube(_U);
-    cube V = array_to_cube(_V);
+    const cube X = view_cube(_X);
+    const cube Y = view_cube(_Y);
+    const cube Z = view_cube(_Z);
 
-    cube X = array_to_cube(_X);
-    cube Y = array_to_cube(_Y);
-    cube Z = array_to_cube(_Z);
+    // full or half-vectorized covariance
+    int dm_cov = vech ? dm_belief * (dm_belief + 1) / 2 : dm_belief * dm_belief;
 
     // outputs
     cube C(dm_belief, dm_belief, nb_steps);
@@ -119,22 +71,30 @@ py::tuple backward_pass(array_tf _Q, array_tf _q,
     mat d(dm_act, nb_steps);
 
     cube E(dm_act, dm_belief, nb_steps);
-    mat e(dm_belief * dm_belief, nb_steps);
+    mat e(dm_cov, nb_steps);
 
     cube Ereg(dm_act, dm_belief, nb_steps);
     cube Dreg(dm_act, dm_act, nb_steps);
     cube Dinv(dm_act, dm_act, nb_steps);
 
-    cube S(dm_belief, dm_belief, nb_steps + 1);
-    mat s(dm_belief, nb_steps + 1);
-    mat tau(dm_belief * dm_belief, nb_steps + 1);
+    array_tf _S = zeros_array(dm_belief, dm_belief, nb_steps + 1);
+    cube S = wrap_cube(_S);
+    array_tf _s = zeros_array(dm_belief, nb_steps + 1);
+    mat s = wrap_mat(_s);
+    array_tf _tau = zeros_array(dm_cov, nb_steps + 1);
+    mat tau = wrap_mat(_tau);
 
-    vec dS(2);
+    array_tf _dS = zeros_array(2);
+    vec dS = wrap_vec(_dS);
 
     cube Sreg(dm_belief, dm_belief, nb_steps + 1);
 
-    cube K(dm_act, dm_belief, nb_steps);
-    mat kff(dm_act, nb_steps);
+    array_tf _K = zeros_array(dm_act, dm_belief, nb_steps);
+    cube K = wrap_cube(_K);
+    array_tf _kff = zeros_array(dm_act, nb_steps);
+    mat kff = wrap_mat(_kff);
+
+    release_gil gil;
 
     int _diverge = 0;
 
@@ -149,13 +109,15 @@ py::tuple backward_pass(array_tf _Q, array_tf _q,
         D.slice(i) = R.slice(i) + G.slice(i).t() * S.slice(i+1) * G.slice(i);
         E.slice(i) = (P.slice(i) + F.slice(i).t() * S.slice(i+1) * G.slice(i)).t();
 
+        vec _S = vectorise_sym(S.slice(i+1), vech);
+
         c.col(i) = q.col(i) + F.slice(i).t() * s.col(i+1) + T.slice(i).t() * tau.col(i+1)
-                   + 0.5 * X.slice(i).t() * vectorise(S.slice(i+1));
+                   + 0.5 * X.slice(i).t() * _S;
 
         d.col(i) = r.col(i) + G.slice(i).t() * s.col(i+1) + V.slice(i).t() * tau.col(i+1)
-                   + 0.5 * Z.slice(i).t() * vectorise(S.slice(i+1));
+                   + 0.5 * Z.slice(i).t() * _S;
 
-        e.col(i) = p.col(i) + U.slice(i).t() * tau.col(i) + 0.5 * Y.slice(i).t() * vectorise(S.slice(i+1));
+        e.col(i) = p.col(i) + U.slice(i).t() * tau.col(i) + 0.5 * Y.slice(i).t() * _S;
 
         Sreg.slice(i+1) = S.slice(i+1);
         if (reg==2)
@@ -188,23 +150,17 @@ py::tuple backward_pass(array_tf _Q, array_tf _q,
         S.slice(i) = 0.5 * (S.slice(i) + S.slice(i).t());
 	}
 
-    // transform outputs to numpy
-    array_tf _S = cube_to_array(S);
-    array_tf _s = mat_to_array(s);
-    array_tf _tau = mat_to_array(tau);
-
-    array_tf _dS = vec_to_array(dS);
-
-    array_tf _K = cube_to_array(K);
-    array_tf _kff = mat_to_array(kff);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_S, _s, _tau,
                                        _dS, _K, _kff, _diverge);
 	return output;
 }
 
 
-PYBIND11_MODULE(core, m)
+void register_functions(py::module &m)
 {
     m.def("backward_pass", &backward_pass);
 }
+
+}
+}
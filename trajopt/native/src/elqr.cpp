@@ -0,0 +1,181 @@
+#include <trajopt/numpy.hpp>
+
+
+namespace trajopt {
+namespace elqr {
+
+using namespace arma;
+
+
+mat spd_solve(const mat &A, const mat &B) {
+
+    // cholesky solve, general solve if not positive definite
+    mat U;
+    if (chol(U, symmatu(A)))
+        return solve(trimatu(U), solve(trimatl(U.t()), B));
+
+    return solve(A, B);
+}
+
+
+void value_update(const mat &Qxx, const mat &Quu, const mat &Qux,
+                  const vec &qx, const vec &qu, double q0,
+                  mat &K, vec &kff, mat &V, vec &v, double &v0) {
+
+    // one factorization for feedback and feedforward terms
+    mat _k = - spd_solve(Quu, join_horiz(Qux, qu));
+
+    K = _k.head_cols(Qux.n_cols);
+    kff = _k.col(Qux.n_cols);
+
+    V = Qxx + Qux.t() * K;
+    V = 0.5 * (V + V.t());
+
+    v = qx + Qux.t() * kff;
+    v0 = q0 + 0.5 * dot(qu, kff);
+}
+
+
+py::tuple forward_step(array_tf _A, array_tf _B, array_tf _c,
+                       array_tf _Cxx, array_tf _Cuu, array_tf _Cxu,
+                       array_tf _cx, array_tf _cu, double c0,
+                       array_tf _V, array_tf _v, double v0,
+                       array_tf _Vgo, array_tf _vgo) {
+
+    // inverse dynamics and cost around the current state
+    const mat A = view_mat(_A);
+    const mat B = view_mat(_B);
+    const vec c = view_vec(_c);
+
+    const mat Cxx = view_mat(_Cxx);
+    const mat Cuu = view_mat(_Cuu);
+    const mat Cxu = view_mat(_Cxu);
+    const vec cx = view_vec(_cx);
+    const vec cu = view_vec(_cu);
+
+    // cost-to-come at t, cost-to-go at t+1
+    const mat V = view_mat(_V);
+    const vec v = view_vec(_v);
+
+    const mat Vgo = view_mat(_Vgo);
+    const vec vgo = view_vec(_vgo);
+
+    // outputs
+    int dm_state = A.n_cols, dm_act = B.n_cols;
+
+    array_tf _K = zeros_array(dm_act, dm_state);
+    mat K = wrap_mat(_K);
+    array_tf _kff = zeros_array(dm_act);
+    vec kff = wrap_vec(_kff);
+
+    array_tf _Vn = zeros_array(dm_state, dm_state);
+    mat Vn = wrap_mat(_Vn);
+    array_tf _vn = zeros_array(dm_state);
+    vec vn = wrap_vec(_vn);
+    double v0n;
+
+    array_tf _x = zeros_array(dm_state);
+    vec x = wrap_vec(_x);
+
+    release_gil gil;
+
+    mat M = Cxx + V;
+    vec m = cx + v;
+
+    mat MA = M * A;
+    mat MB = M * B;
+    vec Mc = M * c;
+
+    mat Qxx = A.t() * MA;
+    mat Quu = B.t() * MB + B.t() * Cxu + Cxu.t() * B + Cuu;
+    mat Qux = B.t() * MA + Cxu.t() * A;
+
+    vec qx = A.t() * (Mc + m);
+    vec qu = B.t() * (Mc + m) + Cxu.t() * c + cu;
+    double q0 = 0.5 * dot(c, Mc) + dot(c, m) + c0 + v0;
+
+    value_update(Qxx, Quu, Qux, qx, qu, q0, K, kff, Vn, vn, v0n);
+
+    // minimizer of cost-to-go plus cost-to-come
+    x = - spd_solve(Vgo + Vn, vgo + vn);
+
+    gil.acquire();
+    py::tuple output =  py::make_tuple(_K, _kff, _Vn, _vn, v0n, _x);
+    return output;
+}
+
+
+py::tuple backward_step(array_tf _A, array_tf _B, array_tf _c,
+                        array_tf _Cxx, array_tf _Cuu, array_tf _Cxu,
+                        array_tf _cx, array_tf _cu, double c0,
+                        array_tf _V, array_tf _v, double v0,
+                        array_tf _Vcome, array_tf _vcome) {
+
+    // forward dynamics and cost around the current state
+    const mat A = view_mat(_A);
+    const mat B = view_mat(_B);
+    const vec c = view_vec(_c);
+
+    const mat Cxx = view_mat(_Cxx);
+    const mat Cuu = view_mat(_Cuu);
+    const mat Cxu = view_mat(_Cxu);
+    const vec cx = view_vec(_cx);
+    const vec cu = view_vec(_cu);
+
+    // cost-to-go at t+1, cost-to-come at t
+    const mat V = view_mat(_V);
+    const vec v = view_vec(_v);
+
+    const mat Vcome = view_mat(_Vcome);
+    const vec vcome = view_vec(_vcome);
+
+    // outputs
+    int dm_state = A.n_cols, dm_act = B.n_cols;
+
+    array_tf _K = zeros_array(dm_act, dm_state);
+    mat K = wrap_mat(_K);
+    array_tf _kff = zeros_array(dm_act);
+    vec kff = wrap_vec(_kff);
+
+    array_tf _Vn = zeros_array(dm_state, dm_state);
+    mat Vn = wrap_mat(_Vn);
+    array_tf _vn = zeros_array(dm_state);
+    vec vn = wrap_vec(_vn);
+    double v0n;
+
+    array_tf _x = zeros_array(dm_state);
+    vec x = wrap_vec(_x);
+
+    release_gil gil;
+
+    mat VA = V * A;
+    mat VB = V * B;
+    vec Vc = V * c;
+
+    mat Qxx = Cxx + A.t() * VA;
+    mat Quu = Cuu + B.t() * VB;
+    mat Qux = Cxu.t() + B.t() * VA;
+
+    vec qx = cx + A.t() * (Vc + v);
+    vec qu = cu + B.t() * (Vc + v);
+    double q0 = c0 + v0 + 0.5 * dot(c, Vc) + dot(c, v);
+
+    value_update(Qxx, Quu, Qux, qx, qu, q0, K, kff, Vn, vn, v0n);
+
+    // minimizer of cost-to-go plus cost-to-come
+    x = - spd_solve(Vn + Vcome, vn + vcome);
+
+    gil.acquire();
+    py::tuple output =  py::make_tuple(_K, _kff, _Vn, _vn, v0n, _x);
+    return output;
+}
+
+
+void register_functions(py::module &m)
+{
+    m.def("forward_step", &forward_step);
+    m.def("backward_step", &backward_step);
+}
+
+}
+}
@@ -1,83 +1,10 @@
-#include <pybind11/pybind11.h>
-#include <pybind11/numpy.h>
-#include <armadillo>
+#include <trajopt/numpy.hpp>
 
-namespace py = pybind11;
 
-using namespace arma;
-
-
-typedef py::array_t<double, py::array::f_style | py::array::forcecast> array_tf;
-typedef py::array_t<double, py::array::c_style | py::array::forcecast> array_tc;
-
-
-cube array_to_cube(array_tf m) {
-
-    py::buffer_info _m_buff = m.request();
-    int n_rows = _m_buff.shape[0];
-    int n_cols = _m_buff.shape[1];
-    int n_slices = _m_buff.shape[2];
-
-    cube _m_arma((double *)_m_buff.ptr, n_rows, n_cols, n_slices);
-
-    return _m_arma;
-}
-
-
-mat array_to_mat(array_tf m) {
-
-    py::buffer_info _m_buff = m.request();
-    int n_rows = _m_buff.shape[0];
-    int n_cols = _m_buff.shape[1];
-
-    mat _m_arma((double *)_m_buff.ptr, n_rows, n_cols);
-
-    return _m_arma;
-}
-
-
-vec array_to_vec(array_tf m) {
-
-    py::buffer_info _m_buff = m.request();
-    int n_rows = _m_buff.shape[0];
-
-    vec _m_vec((double *)_m_buff.ptr, n_rows);
-
-    return _m_vec;
-}
-
-
-array_tf cube_to_array(cube m) {
-
-    auto _m_array = array_tf({m.n_rows, m.n_cols, m.n_slices});
-
-    py::buffer_info _m_buff = _m_array.request();
-    std::memcpy(_m_buff.ptr, m.memptr(), sizeof(double) * m.n_rows * m.n_cols * m.n_slices);
-
-    return _m_array;
-}
+namespace trajopt {
+namespace gps {
 
-
-array_tf mat_to_array(mat m) {
-
-    auto _m_array = array_tf({m.n_rows, m.n_cols});
-
-    py::buffer_info _m_buff = _m_array.request();
-    std::memcpy(_m_buff.ptr, m.memptr(), sizeof(double) * m.n_rows * m.n_cols);
-
-    return _m_array;
-}
-
-
-array_tf vec_to_array(vec m) {
-
-    auto _m_array = array_tf({m.n_rows});
-
-    py::buffer_info _m_buff = _m_array.request();
-    std::memcpy(_m_buff.ptr, m.memptr(), sizeof(double) * m.n_rows);
-
-    return _m_array;
-}
+using namespace arma;
 
 
 py::tuple kl_divergence(array_tf _p_K, array_tf _p_kff, array_tf _p_sigma_ctl,
@@ -85,18 +12,21 @@ py::tuple kl_divergence(array_tf _p_K, array_tf _p_kff, array_tf _p_sigma_ctl,
                         array_tf _mu_x, array_tf _sigma_x,
                         int dm_state, int dm_act, int nb_steps) {
 
-    cube p_K = array_to_cube(_p_K);
-    mat p_kff = array_to_mat(_p_kff);
-    cube p_sigma_ctl = array_to_cube(_p_sigma_ctl);
+    const cube p_K = view_cube(_p_K);
+    const mat p_kff = view_mat(_p_kff);
+    const cube p_sigma_ctl = view_cube(_p_sigma_ctl);
+
+    const cube q_K = view_cube(_q_K);
+    const mat q_kff = view_mat(_q_kff);
+    const cube q_sigma_ctl = view_cube(_q_sigma_ctl);
 
-    cube q_K = array_to_cube(_q_K);
-    mat q_kff = array_to_mat(_q_kff);
-    cube q_sigma_ctl = array_to_cube(_q_sigma_ctl);
+    const mat mu_x  = view_mat(_mu_x);
+    const cube sigma_x = view_cube(_sigma_x);
 
-    mat mu_x  = array_to_mat(_mu_x);
-    cube sigma_x = array_to_cube(_sigma_x);
+    array_tf _kl = zeros_array(nb_steps);
+    vec kl = wrap_vec(_kl);
 
-    vec kl(nb_steps);
+    release_gil gil;
 
     for(int i = 0; i < nb_steps; i++) {
         mat q_lambda_ctl = inv_sympd(q_sigma_ctl.slice(i));
@@ -114,8 +44,7 @@ py::tuple kl_divergence(array_tf _p_K, array_tf _p_kff, array_tf _p_sigma_ctl,
 		                  + 0.5 * diff_kff);
     }
 
-    array_tf _kl = vec_to_array(kl);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_kl);
     return output;
 }
@@ -123,11 +52,13 @@ py::tuple kl_divergence(array_tf _p_K, array_tf _p_kff, array_tf _p_sigma_ctl,
 double quad_expectation(array_tf _mu, array_tf _sigma_s,
                         array_tf _Q, array_tf _q, double _q0) {
 
-    vec mu  = array_to_vec(_mu);
-    mat sigma_s = array_to_mat(_sigma_s);
+    const vec mu  = view_vec(_mu);
+    const mat sigma_s = view_mat(_sigma_s);
 
-    mat Q = array_to_mat(_Q);
-    vec q = array_to_vec(_q);
+    const mat Q = view_mat(_Q);
+    const vec q = view_vec(_q);
+
+    release_gil gil;
 
 	double result = as_scalar(mu.t() * Q * mu) + as_scalar(mu.t() * q) + _q0 + trace(Q * sigma_s);
 	return result;
@@ -139,26 +70,34 @@ py::tuple augment_cost(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
                        array_tf _alpha, int dm_state, int dm_act, int nb_steps) {
 
     // inputs
-    cube Cxx = array_to_cube(_Cxx);
-    mat cx = array_to_mat(_cx);
-    cube Cuu = array_to_cube(_Cuu);
-    mat cu = array_to_mat(_cu);
-    cube Cxu = array_to_cube(_Cxu);
-    vec c0 = array_to_vec(_c0);
+    const cube Cxx = view_cube(_Cxx);
+    const mat cx = view_mat(_cx);
+    const cube Cuu = view_cube(_Cuu);
+    const mat cu = view_mat(_cu);
+    const cube Cxu = view_cube(_Cxu);
+    const vec c0 = view_vec(_c0);
 
-    cube K = array_to_cube(_K);
-    mat kff = array_to_mat(_kff);
-    cube sigma_ctl = array_to_cube(_sigma_ctl);
+    const cube K = view_cube(_K);
+    const mat kff = view_mat(_kff);
+    const cube sigma_ctl = view_cube(_sigma_ctl);
 
-    vec alpha = array_to_vec(_alpha);
+    const vec alpha = view_vec(_alpha);
 
     // outputs
-    cube agCxx(dm_state, dm_state, nb_steps + 1);
-    mat agcx(dm_state, nb_steps + 1);
-    cube agCuu(dm_act, dm_act, nb_steps + 1);
-    mat agcu(dm_act, nb_steps + 1);
-    cube agCxu(dm_state, dm_act, nb_steps + 1);
-    vec agc0(nb_steps + 1);
+    array_tf _agCxx = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube agCxx = wrap_cube(_agCxx);
+    array_tf _agcx = zeros_array(dm_state, nb_steps + 1);
+    mat agcx = wrap_mat(_agcx);
+    array_tf _agCuu = zeros_array(dm_act, dm_act, nb_steps + 1);
+    cube agCuu = wrap_cube(_agCuu);
+    array_tf _agcu = zeros_array(dm_act, nb_steps + 1);
+    mat agcu = wrap_mat(_agcu);
+    array_tf _agCxu = zeros_array(dm_state, dm_act, nb_steps + 1);
+    cube agCxu = wrap_cube(_agCxu);
+    array_tf _agc0 = zeros_array(nb_steps + 1);
+    vec agc0 = wrap_vec(_agc0);
+
+    release_gil gil;
 
     for (int i = 0; i < nb_steps; i++) {
         mat lambda_ctl = inv_sympd(sigma_ctl.slice(i));
@@ -180,14 +119,7 @@ py::tuple augment_cost(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
     agCxu.slice(nb_steps) = Cxu.slice(nb_steps);
     agc0(nb_steps) = c0(nb_steps);
 
-    // transform outputs to numpy
-    array_tf _agCxx = cube_to_array(agCxx);
-    array_tf _agcx = mat_to_array(agcx);
-    array_tf _agCuu =  cube_to_array(agCuu);
-    array_tf _agcu = mat_to_array(agcu);
-    array_tf _agCxu =  cube_to_array(agCxu);
-    array_tf _agc0 = vec_to_array(agc0);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_agCxx, _agcx, _agCuu, _agcu, _agCxu, _agc0);
     return output;
 }
@@ -198,27 +130,35 @@ py::tuple forward_pass(array_tf _mu_x0, array_tf _sigma_x0,
                        int dm_state, int dm_act, int nb_steps) {
 
     // inputs
-    vec mu_x0 = array_to_vec(_mu_x0);
-    mat sigma_x0 = array_to_mat(_sigma_x0);
+    const vec mu_x0 = view_vec(_mu_x0);
+    const mat sigma_x0 = view_mat(_sigma_x0);
 
-    cube A = array_to_cube(_A);
-    cube B = array_to_cube(_B);
-    mat c = array_to_mat(_c);
-    cube sigma_dyn = array_to_cube(_sigma_dyn);
+    const cube A = view_cube(_A);
+    const cube B = view_cube(_B);
+    const mat c = view_mat(_c);
+    const cube sigma_dyn = view_cube(_sigma_dyn);
 
-    cube K = array_to_cube(_K);
-    mat kff = array_to_mat(_kff);
-    cube sigma_ctl = array_to_cube(_sigma_ctl);
+    const cube K = view_cube(_K);
+    const mat kff = view_mat(_kff);
+    const cube sigma_ctl = view_cube(_sigma_ctl);
 
     // outputs
-    mat mu_x(dm_state, nb_steps + 1);
-    cube sigma_x(dm_state, dm_state, nb_steps + 1);
+    array_tf _mu_x = zeros_array(dm_state, nb_steps + 1);
+    mat mu_x = wrap_mat(_mu_x);
+    array_tf _sigma_x = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube sigma_x = wrap_cube(_sigma_x);
 
-    mat mu_u(dm_act, nb_steps);
-    cube sigma_u(dm_act, dm_act, nb_steps);
+    array_tf _mu_u = zeros_array(dm_act, nb_steps);
+    mat mu_u = wrap_mat(_mu_u);
+    array_tf _sigma_u = zeros_array(dm_act, dm_act, nb_steps);
+    cube sigma_u = wrap_cube(_sigma_u);
 
-    mat mu_xu(dm_state + dm_act, nb_steps + 1);
-    cube sigma_xu(dm_state + dm_act, dm_state + dm_act, nb_steps + 1);
+    array_tf _mu_xu = zeros_array(dm_state + dm_act, nb_steps + 1);
+    mat mu_xu = wrap_mat(_mu_xu);
+    array_tf _sigma_xu = zeros_array(dm_state + dm_act, dm_state + dm_act, nb_steps + 1);
+    cube sigma_xu = wrap_cube(_sigma_xu);
+
+    release_gil gil;
 
     mu_x.col(0) = mu_x0;
     sigma_x.slice(0) = sigma_x0;
@@ -256,14 +196,7 @@ py::tuple forward_pass(array_tf _mu_x0, array_tf _sigma_x0,
         }
     }
 
-    // transform outputs to numpy
-    array_tf _mu_x = mat_to_array(mu_x);
-    array_tf _sigma_x = cube_to_array(sigma_x);
-    array_tf _mu_u =  mat_to_array(mu_u);
-    array_tf _sigma_u = cube_to_array(sigma_u);
-    array_tf _mu_xu =  mat_to_array(mu_xu);
-    array_tf _sigma_xu = cube_to_array(sigma_xu);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_mu_x, _sigma_x, _mu_u, _sigma_u, _mu_xu, _sigma_xu);
     return output;
 }
@@ -275,37 +208,51 @@ py::tuple backward_pass(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
                         array_tf _alpha, int dm_state, int dm_act, int nb_steps) {
 
     // inputs
-    cube Cxx = array_to_cube(_Cxx);
-    mat cx = array_to_mat(_cx);
-    cube Cuu = array_to_cube(_Cuu);
-    mat cu = array_to_mat(_cu);
-    cube Cxu = array_to_cube(_Cxu);
-    vec c0 = array_to_vec(_c0);
+    const cube Cxx = view_cube(_Cxx);
+    const mat cx = view_mat(_cx);
+    const cube Cuu = view_cube(_Cuu);
+    const mat cu = view_mat(_cu);
+    const cube Cxu = view_cube(_Cxu);
+    const vec c0 = view_vec(_c0);
 
-    cube A = array_to_cube(_A);
-    cube B = array_to_cube(_B);
-    mat c = array_to_mat(_c);
-    cube sigma_dyn = array_to_cube(_sigma_dyn);
+    const cube A = view_cube(_A);
+    const cube B = view_cube(_B);
+    const mat c = view_mat(_c);
+    const cube sigma_dyn = view_cube(_sigma_dyn);
 
-    vec alpha = array_to_vec(_alpha);
+    const vec alpha = view_vec(_alpha);
 
     // outputs
     cube Q(dm_state + dm_act, dm_state + dm_act, nb_steps);
-    cube Qxx(dm_state, dm_state, nb_steps);
-    cube Qux(dm_act, dm_state, nb_steps);
-    cube Quu(dm_act, dm_act, nb_steps);
+    array_tf _Qxx = zeros_array(dm_state, dm_state, nb_steps);
+    cube Qxx = wrap_cube(_Qxx);
+    array_tf _Qux = zeros_array(dm_act, dm_state, nb_steps);
+    cube Qux = wrap_cube(_Qux);
+    array_tf _Quu = zeros_array(dm_act, dm_act, nb_steps);
+    cube Quu = wrap_cube(_Quu);
     cube Quu_inv(dm_act, dm_act, nb_steps);
-    mat qx(dm_state, nb_steps);
-    mat qu(dm_act, nb_steps);
-    vec q0(nb_steps);
-
-    cube V(dm_state, dm_state, nb_steps + 1);
-    mat v(dm_state, nb_steps + 1);
-    vec v0(nb_steps + 1);
-
-    cube K(dm_act, dm_state, nb_steps);
-    mat kff(dm_act, nb_steps);
-    cube sigma_ctl(dm_act, dm_act, nb_steps);
+    array_tf _qx = zeros_array(dm_state, nb_steps);
+    mat qx = wrap_mat(_qx);
+    array_tf _qu = zeros_array(dm_act, nb_steps);
+    mat qu = wrap_mat(_qu);
+    array_tf _q0 = zeros_array(nb_steps);
+    vec q0 = wrap_vec(_q0);
+
+    array_tf _V = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube V = wrap_cube(_V);
+    array_tf _v = zeros_array(dm_state, nb_steps + 1);
+    mat v = wrap_mat(_v);
+    array_tf _v0 = zeros_array(nb_steps + 1);
+    vec v0 = wrap_vec(_v0);
+
+    array_tf _K = zeros_array(dm_act, dm_state, nb_steps);
+    cube K = wrap_cube(_K);
+    array_tf _kff = zeros_array(dm_act, nb_steps);
+    mat kff = wrap_mat(_kff);
+    array_tf _sigma_ctl = zeros_array(dm_act, dm_act, nb_steps);
+    cube sigma_ctl = wrap_cube(_sigma_ctl);
+
+    release_gil gil;
     cube lambda_ctl(dm_act, dm_act, nb_steps);
 
     int _diverge = 0;
@@ -349,23 +296,7 @@ py::tuple backward_pass(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
                               + 0.5 * (dm_act * log (2. * datum::pi) - log(det(- 2. * Quu.slice(i)))));
 	}
 
-    // transform outputs to numpy
-    array_tf _Qxx = cube_to_array(Qxx);
-    array_tf _Qux = cube_to_array(Qux);
-    array_tf _Quu = cube_to_array(Quu);
-
-    array_tf _qx = mat_to_array(qx);
-    array_tf _qu = mat_to_array(qu);
-    array_tf _q0 = mat_to_array(q0);
-
-    array_tf _V = cube_to_array(V);
-    array_tf _v = mat_to_array(v);
-    array_tf _v0 = vec_to_array(v0);
-
-    array_tf _K = cube_to_array(K);
-    array_tf _kff = mat_to_array(kff);
-    array_tf _sigma_ctl = cube_to_array(sigma_ctl);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_Qxx, _Qux, _Quu, _qx, _qu, _q0,
                                         _V, _v, _v0,
                                         _K, _kff, _sigma_ctl, _diverge);
@@ -374,7 +305,7 @@ py::tuple backward_pass(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
 }
 
 
-PYBIND11_MODULE(core, m)
+void register_functions(py::module &m)
 {
     m.def("kl_divergence", &kl_divergence);
     m.def("quad_expectation", &quad_expectation);
@@ -382,3 +313,6 @@ PYBIND11_MODULE(core, m)
     m.def("forward_pass", &forward_pass);
     m.def("backward_pass", &backward_pass);
 }
+
+}
+}
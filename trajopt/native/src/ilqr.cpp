@@ -0,0 +1,116 @@
+#include <trajopt/numpy.hpp>
+
+
+namespace trajopt {
+namespace ilqr {
+
+using namespace arma;
+
+
+py::tuple backward_pass(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
+                        array_tf _cu, array_tf _Cxu,
+                        array_tf _A, array_tf _B,
+                        double lmbda, int reg,
+                        int dm_state, int dm_act, int nb_steps) {
+
+    // inputs
+    const cube Cxx = view_cube(_Cxx);
+    const mat cx = view_mat(_cx);
+    const cube Cuu = view_cube(_Cuu);
+    const mat cu = view_mat(_cu);
+    const cube Cxu = view_cube(_Cxu);
+
+    const cube A = view_cube(_A);
+    const cube B = view_cube(_B);
+
+    // outputs
+    cube Q(dm_state + dm_act, dm_state + dm_act, nb_steps);
+    array_tf _Qxx = zeros_array(dm_state, dm_state, nb_steps);
+    cube Qxx = wrap_cube(_Qxx);
+    array_tf _Qux = zeros_array(dm_act, dm_state, nb_steps);
+    cube Qux = wrap_cube(_Qux);
+    array_tf _Quu = zeros_array(dm_act, dm_act, nb_steps);
+    cube Quu = wrap_cube(_Quu);
+    array_tf _qx = zeros_array(dm_state, nb_steps);
+    mat qx = wrap_mat(_qx);
+    array_tf _qu = zeros_array(dm_act, nb_steps);
+    mat qu = wrap_mat(_qu);
+
+    cube Qux_reg(dm_act, dm_state, nb_steps);
+    cube Quu_reg(dm_act, dm_act, nb_steps);
+    cube Quu_inv(dm_act, dm_act, nb_steps);
+
+    array_tf _V = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube V = wrap_cube(_V);
+    array_tf _v = zeros_array(dm_state, nb_steps + 1);
+    mat v = wrap_mat(_v);
+    array_tf _dV = zeros_array(2);
+    vec dV = wrap_vec(_dV);
+
+    cube V_reg(dm_state, dm_state, nb_steps + 1);
+
+    array_tf _K = zeros_array(dm_act, dm_state, nb_steps);
+    cube K = wrap_cube(_K);
+    array_tf _kff = zeros_array(dm_act, nb_steps);
+    mat kff = wrap_mat(_kff);
+
+    release_gil gil;
+
+    int _diverge = 0;
+
+    // last time step
+    V.slice(nb_steps) = Cxx.slice(nb_steps);
+    v.col(nb_steps) = cx.col(nb_steps);
+
+	for(int i = nb_steps - 1; i>= 0; --i)
+	{
+        Qxx.slice(i) = Cxx.slice(i) + A.slice(i).t() * V.slice(i+1) * A.slice(i);
+        Quu.slice(i) = Cuu.slice(i) + B.slice(i).t() * V.slice(i+1) * B.slice(i);
+        Qux.slice(i) = (Cxu.slice(i) + A.slice(i).t() * V.slice(i+1) * B.slice(i)).t();
+
+        qu.col(i) = cu.col(i) + B.slice(i).t() * v.col(i+1);
+        qx.col(i) = cx.col(i) + A.slice(i).t() * v.col(i+1);
+
+        V_reg.slice(i+1) = V.slice(i+1);
+        if (reg==2)
+            V_reg.slice(i+1) += lmbda * eye(dm_state, dm_state);
+
+        Qux_reg.slice(i) = (Cxu.slice(i) + A.slice(i).t() * V_reg.slice(i+1) * B.slice(i)).t();
+
+        Quu_reg.slice(i) = Cuu.slice(i) + B.slice(i).t() * V_reg.slice(i+1) * B.slice(i);
+        if (reg==1)
+            Quu_reg.slice(i) += lmbda * eye(dm_act, dm_act);
+
+        if (!(Quu_reg.slice(i)).is_sympd()) {
+            _diverge = i;
+            break;
+        }
+
+        Quu_inv.slice(i) = inv(Quu_reg.slice(i));
+        K.slice(i) = - Quu_inv.slice(i) * Qux_reg.slice(i);
+        kff.col(i) = - Quu_inv.slice(i) * qu.col(i);
+
+        dV += join_vert(kff.col(i).t() * qu.col(i), 0.5 * kff.col(i).t() * Quu.slice(i) * kff.col(i));
+
+        v.col(i) = qx.col(i) + K.slice(i).t() * Quu.slice(i) * kff.col(i) +
+                   K.slice(i).t() * qu.col(i) + Qux.slice(i).t() * kff.col(i);
+
+        V.slice(i) = Qxx.slice(i) + K.slice(i).t() * Quu.slice(i) * K.slice(i) +
+                     K.slice(i).t() * Qux.slice(i) + Qux.slice(i).t() * K.slice(i);
+        V.slice(i) = 0.5 * (V.slice(i) + V.slice(i).t());
+	}
+
+    gil.acquire();
+    py::tuple output =  py::make_tuple(_Qxx, _Qux, _Quu, _qx, _qu,
+                                       _V, _v, _dV, _K, _kff, _diverge);
+	return output;
+}
+
+
+void register_functions(py::module &m)
+{
+    m.def("backward_pass", &backward_pass);
+}
+
+}
+}
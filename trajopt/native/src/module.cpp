@@ -0,0 +1,73 @@
+#include <trajopt/numpy.hpp>
+#include <trajopt/threads.hpp>
+
+namespace py = pybind11;
+
+
+namespace trajopt {
+
+namespace ilqr { void register_functions(py::module &m); }
+namespace gps { void register_functions(py::module &m); }
+namespace rgps { void register_functions(py::module &m); }
+namespace bspilqr { void register_functions(py::module &m); }
+namespace elqr { void register_functions(py::module &m); }
+namespace riccati { void register_functions(py::module &m); }
+
+std::atomic<int> nb_omp_threads(0);
+
+}
+
+
+// weak, so that the module also loads against other BLAS libraries
+extern "C" {
+void openblas_set_num_threads(int) __attribute__((weak));
+int openblas_get_num_threads() __attribute__((weak));
+}
+
+
+// both settings hold for all threads of the process, 0 openmp
+// threads leave the count to openmp again, negative ones keep it
+void set_num_threads(int blas_threads, int omp_threads) {
+
+    if (openblas_set_num_threads && blas_threads > 0)
+        openblas_set_num_threads(blas_threads);
+
+    if (omp_threads >= 0)
+        trajopt::nb_omp_threads = omp_threads;
+}
+
+
+// blas threads are -1 if not linked against openblas, openmp
+// threads as set, 0 if left to openmp, so they can be restored
+py::tuple get_num_threads() {
+
+    int blas_threads = openblas_get_num_threads ? openblas_get_num_threads() : -1;
+    return py::make_tuple(blas_threads, trajopt::nb_omp_threads.load());
+}
+
+
+template <typename Register>
+void add_submodule(py::module &m, const char *name, Register _register) {
+
+    py::module sub = m.def_submodule(name);
+    _register(sub);
+
+    // importable as e.g. trajopt.native.core.ilqr
+    py::module::import("sys").attr("modules")[sub.attr("__name__")] = sub;
+}
+
+
+// one extension for all solvers, each in a submodule, so that
+// the numpy helpers and armadillo are compiled and loaded once
+PYBIND11_MODULE(core, m)
+{
+    add_submodule(m, "ilqr", &trajopt::ilqr::register_functions);
+    add_submodule(m, "gps", &trajopt::gps::register_functions);
+    add_submodule(m, "rgps", &trajopt::rgps::register_functions);
+    add_submodule(m, "bspilqr", &trajopt::bspilqr::register_functions);
+    add_submodule(m, "elqr", &trajopt::elqr::register_functions);
+    add_submodule(m, "riccati", &trajopt::riccati::register_functions);
+
+    m.def("set_num_threads", &set_num_threads);
+    m.def("get_num_threads", &get_num_threads);
+}
@@ -1,104 +1,33 @@
-#define ARMA_DONT_PRINT_ERRORS
+#include <trajopt/numpy.hpp>
+#include <trajopt/threads.hpp>
 
-#include <pybind11/pybind11.h>
-#include <pybind11/numpy.h>
-#include <armadillo>
 
-namespace py = pybind11;
+namespace trajopt {
+namespace rgps {
 
 using namespace arma;
 
 
-typedef py::array_t<double, py::array::f_style | py::array::forcecast> array_tf;
-typedef py::array_t<double, py::array::c_style | py::array::forcecast> array_tc;
-
-
-cube array_to_cube(array_tf m) {
-
-    py::buffer_info _m_buff = m.request();
-    int n_rows = _m_buff.shape[0];
-    int n_cols = _m_buff.shape[1];
-    int n_slices = _m_buff.shape[2];
-
-    cube _m_arma((double *)_m_buff.ptr, n_rows, n_cols, n_slices);
-
-    return _m_arma;
-}
-
-
-mat array_to_mat(array_tf m) {
-
-    py::buffer_info _m_buff = m.request();
-    int n_rows = _m_buff.shape[0];
-    int n_cols = _m_buff.shape[1];
-
-    mat _m_arma((double *)_m_buff.ptr, n_rows, n_cols);
-
-    return _m_arma;
-}
-
-
-vec array_to_vec(array_tf m) {
-
-    py::buffer_info _m_buff = m.request();
-    int n_rows = _m_buff.shape[0];
-
-    vec _m_vec((double *)_m_buff.ptr, n_rows);
-
-    return _m_vec;
-}
-
-
-array_tf cube_to_array(cube m) {
-
-    auto _m_array = array_tf({m.n_rows, m.n_cols, m.n_slices});
-
-    py::buffer_info _m_buff = _m_array.request();
-    std::memcpy(_m_buff.ptr, m.memptr(), sizeof(double) * m.n_rows * m.n_cols * m.n_slices);
-
-    return _m_array;
-}
-
-
-array_tf mat_to_array(mat m) {
-
-    auto _m_array = array_tf({m.n_rows, m.n_cols});
-
-    py::buffer_info _m_buff = _m_array.request();
-    std::memcpy(_m_buff.ptr, m.memptr(), sizeof(double) * m.n_rows * m.n_cols);
-
-    return _m_array;
-}
-
-
-array_tf vec_to_array(vec m) {
-
-    auto _m_array = array_tf({m.n_rows});
-
-    py::buffer_info _m_buff = _m_array.request();
-    std::memcpy(_m_buff.ptr, m.memptr(), sizeof(double) * m.n_rows);
-
-    return _m_array;
-}
-
-
 py::tuple policy_divergence(array_tf _p_K, array_tf _p_kff, array_tf _p_sigma_ctl,
                             array_tf _q_K, array_tf _q_kff, array_tf _q_sigma_ctl,
                             array_tf _mu_x, array_tf _sigma_x,
                             int dm_state, int dm_act, int nb_steps) {
 
-    cube p_K = array_to_cube(_p_K);
-    mat p_kff = array_to_mat(_p_kff);
-    cube p_sigma_ctl = array_to_cube(_p_sigma_ctl);
+    const cube p_K = view_cube(_p_K);
+    const mat p_kff = view_mat(_p_kff);
+    const cube p_sigma_ctl = view_cube(_p_sigma_ctl);
 
-    cube q_K = array_to_cube(_q_K);
-    mat q_kff = array_to_mat(_q_kff);
-    cube q_sigma_ctl = array_to_cube(_q_sigma_ctl);
+    const cube q_K = view_cube(_q_K);
+    const mat q_kff = view_mat(_q_kff);
+    const cube q_sigma_ctl = view_cube(_q_sigma_ctl);
 
-    mat mu_x  = array_to_mat(_mu_x);
-    cube sigma_x = array_to_cube(_sigma_x);
+    const mat mu_x  = view_mat(_mu_x);
+    const cube sigma_x = view_cube(_sigma_x);
 
-    vec kl(nb_steps);
+    array_tf _kl = zeros_array(nb_steps);
+    vec kl = wrap_vec(_kl);
+
+    release_gil gil;
 
     for(int i = 0; i < nb_steps; i++) {
         mat q_lambda_ctl = inv_sympd(q_sigma_ctl.slice(i));
@@ -116,8 +45,7 @@ py::tuple policy_divergence(array_tf _p_K, array_tf _p_kff, array_tf _p_sigma_ct
 		                  + 0.5 * diff_kff);
     }
 
-    array_tf _kl = vec_to_array(kl);
-
+    gil.acquire();
     py::tuple output = py::make_tuple(_kl);
     return output;
 }
@@ -126,13 +54,16 @@ py::tuple gaussian_divergence(array_tf _mu_p, array_tf _sigma_p,
                               array_tf _mu_q, array_tf _sigma_q,
                               int dm_state, int nb_steps) {
 
-    mat mu_p = array_to_mat(_mu_p);
-    cube sigma_p = array_to_cube(_sigma_p);
+    const mat mu_p = view_mat(_mu_p);
+    const cube sigma_p = view_cube(_sigma_p);
+
+    const mat mu_q = view_mat(_mu_q);
+    const cube sigma_q = view_cube(_sigma_q);
 
-    mat mu_q = array_to_mat(_mu_q);
-    cube sigma_q = array_to_cube(_sigma_q);
+    array_tf _kl = zeros_array(nb_steps);
+    vec kl = wrap_vec(_kl);
 
-    vec kl(nb_steps);
+    release_gil gil;
 
     for(int i = 0; i < nb_steps; i++) {
         mat lambda_q = inv_sympd(sigma_q.slice(i));
@@ -145,41 +76,72 @@ py::tuple gaussian_divergence(array_tf _mu_p, array_tf _sigma_p,
         kl(i) = 0.5 * (_trace + quad + log_det - dm_state);
     }
 
-    array_tf _kl = vec_to_array(kl);
-
+    gil.acquire();
     py::tuple output = py::make_tuple(_kl);
     return output;
 }
 
 
+void sqrtm_sym(const mat &S, mat &S_sqrt, mat &S_inv_sqrt) {
+
+    // symmetric square root and its inverse from one eigendecomposition
+    vec eigval;
+    mat eigvec;
+    eig_sym(eigval, eigvec, 0.5 * (S + S.t()));
+
+    vec sqrt_eigval = sqrt(clamp(eigval, datum::eps, datum::inf));
+
+    S_sqrt = eigvec * diagmat(sqrt_eigval) * eigvec.t();
+    S_inv_sqrt = eigvec * diagmat(1. / sqrt_eigval) * eigvec.t();
+}
+
+
+mat interp_w2_step(const mat &sigma_q, const mat &sqrt_sigma_q, const mat &inv_sqrt_sigma_q,
+                   const mat &sigma_p, double alpha) {
+
+    mat _cross = sqrt_sigma_q * sigma_p * sqrt_sigma_q;
+
+    vec eigval;
+    mat eigvec;
+    eig_sym(eigval, eigvec, 0.5 * (_cross + _cross.t()));
+    mat sqrt_cross = eigvec * diagmat(sqrt(clamp(eigval, 0., datum::inf))) * eigvec.t();
+
+    mat _sigma = (1. - alpha) * sigma_q + alpha * sqrt_cross;
+    mat sigma = inv_sqrt_sigma_q * _sigma * _sigma * inv_sqrt_sigma_q;
+
+    return 0.5 * (sigma + sigma.t());
+}
+
+
 py::tuple gaussian_interp_w2(array_tf _mu_q, array_tf _sigma_q,
                              array_tf _mu_p, array_tf _sigma_p,
                              double alpha, int dim, int nb_steps) {
 
-    mat mu_q = array_to_mat(_mu_q);
-    cube sigma_q = array_to_cube(_sigma_q);
+    const mat mu_q = view_mat(_mu_q);
+    const cube sigma_q = view_cube(_sigma_q);
 
-    mat mu_p = array_to_mat(_mu_p);
-    cube sigma_p = array_to_cube(_sigma_p);
+    const mat mu_p = view_mat(_mu_p);
+    const cube sigma_p = view_cube(_sigma_p);
 
-    mat mu(dim, nb_steps);
-    cube sigma(dim, dim, nb_steps);
+    array_tf _mu = zeros_array(dim, nb_steps);
+    mat mu = wrap_mat(_mu);
+    array_tf _sigma = zeros_array(dim, dim, nb_steps);
+    cube sigma = wrap_cube(_sigma);
 
-    for(int i = 0; i < nb_steps; i++) {
-        mu.col(i) = (1. - alpha) * mu_q.col(i) + alpha * mu_p.col(i);
+    release_gil gil;
 
-        mat chol_sigma_q = real(sqrtmat(sigma_q.slice(i)));
-        mat inv_chol_sigma_q = inv_sympd(chol_sigma_q);
-        mat _sigma = (1. - alpha) * sigma_q.slice(i)
-                     + alpha * real(sqrtmat(chol_sigma_q * sigma_p.slice(i) * chol_sigma_q));
+    mu = (1. - alpha) * mu_q + alpha * mu_p;
 
-        sigma.slice(i) = inv_chol_sigma_q * _sigma * _sigma * inv_chol_sigma_q;
-    }
+    #pragma omp parallel for num_threads(omp_threads())
+    for(int i = 0; i < nb_steps; i++) {
+        mat sqrt_sigma_q, inv_sqrt_sigma_q;
+        sqrtm_sym(sigma_q.slice(i), sqrt_sigma_q, inv_sqrt_sigma_q);
 
-    // transform outputs to numpy
-    array_tf _mu = mat_to_array(mu);
-    array_tf _sigma = cube_to_array(sigma);
+        sigma.slice(i) = interp_w2_step(sigma_q.slice(i), sqrt_sigma_q, inv_sqrt_sigma_q,
+                                        sigma_p.slice(i), alpha);
+    }
 
+    gil.acquire();
     py::tuple output =  py::make_tuple(_mu, _sigma);
     return output;
 }
@@ -189,14 +151,18 @@ py::tuple gaussian_interp_kl(array_tf _mu_q, array_tf _sigma_q,
                              array_tf _mu_p, array_tf _sigma_p,
                              double alpha, int dim, int nb_steps) {
 
-    mat mu_q = array_to_mat(_mu_q);
-    cube sigma_q = array_to_cube(_sigma_q);
+    const mat mu_q = view_mat(_mu_q);
+    const cube sigma_q = view_cube(_sigma_q);
+
+    const mat mu_p = view_mat(_mu_p);
+    const cube sigma_p = view_cube(_sigma_p);
 
-    mat mu_p = array_to_mat(_mu_p);
-    cube sigma_p = array_to_cube(_sigma_p);
+    array_tf _mu = zeros_array(dim, nb_steps);
+    mat mu = wrap_mat(_mu);
+    array_tf _sigma = zeros_array(dim, dim, nb_steps);
+    cube sigma = wrap_cube(_sigma);
 
-    mat mu(dim, nb_steps);
-    cube sigma(dim, dim, nb_steps);
+    release_gil gil;
 
     for(int i = 0; i < nb_steps; i++) {
         mat lambda_q = inv_sympd(sigma_q.slice(i));
@@ -206,10 +172,7 @@ py::tuple gaussian_interp_kl(array_tf _mu_q, array_tf _sigma_q,
         mu.col(i) = sigma.slice(i) * (alpha * lambda_p * mu_p.col(i) + (1. - alpha) * lambda_q * mu_q.col(i));
     }
 
-    // transform outputs to numpy
-    array_tf _mu = mat_to_array(mu);
-    array_tf _sigma = cube_to_array(sigma);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_mu, _sigma);
     return output;
 }
@@ -218,11 +181,13 @@ py::tuple gaussian_interp_kl(array_tf _mu_q, array_tf _sigma_q,
 double quad_expectation(array_tf _mu, array_tf _sigma_s,
                         array_tf _Q, array_tf _q, double _q0) {
 
-    vec mu  = array_to_vec(_mu);
-    mat sigma_s = array_to_mat(_sigma_s);
+    const vec mu  = view_vec(_mu);
+    const mat sigma_s = view_mat(_sigma_s);
 
-    mat Q = array_to_mat(_Q);
-    vec q = array_to_vec(_q);
+    const mat Q = view_mat(_Q);
+    const vec q = view_vec(_q);
+
+    release_gil gil;
 
 	double result = as_scalar(mu.t() * Q * mu) + as_scalar(mu.t() * q) + _q0 + trace(Q * sigma_s);
 	return result;
@@ -235,12 +200,12 @@ py::tuple cubature_forward_pass(array_tf _mu_x0, array_tf _sigma_x0,
                                 int dm_state, int dm_act, int nb_steps) {
 
     // inputs
-    vec mu_x0 = array_to_vec(_mu_x0);
-    mat sigma_x0 = array_to_mat(_sigma_x0);
+    const vec mu_x0 = view_vec(_mu_x0);
+    const mat sigma_x0 = view_mat(_sigma_x0);
 
-    mat mu_param = array_to_mat(_mu_param);
-    cube sigma_param = array_to_cube(_sigma_param);
-    cube sigma_dyn = array_to_cube(_sigma_dyn);
+    const mat mu_param = view_mat(_mu_param);
+    const cube sigma_param = view_cube(_sigma_param);
+    const cube sigma_dyn = view_cube(_sigma_dyn);
 
     mat A(dm_state, dm_state);
     mat B(dm_state, dm_act);
@@ -257,19 +222,27 @@ py::tuple cubature_forward_pass(array_tf _mu_x0, array_tf _sigma_x0,
     mat input_cubature_points(dm_augmented, 2 * dm_augmented);
     mat output_cubature_points(dm_state, 2 * dm_augmented);
 
-    cube K = array_to_cube(_K);
-    mat kff = array_to_mat(_kff);
-    cube sigma_ctl = array_to_cube(_sigma_ctl);
+    const cube K = view_cube(_K);
+    const mat kff = view_mat(_kff);
+    const cube sigma_ctl = view_cube(_sigma_ctl);
 
     // outputs
-    mat mu_x(dm_state, nb_steps + 1);
-    cube sigma_x(dm_state, dm_state, nb_steps + 1);
+    array_tf _mu_x = zeros_array(dm_state, nb_steps + 1);
+    mat mu_x = wrap_mat(_mu_x);
+    array_tf _sigma_x = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube sigma_x = wrap_cube(_sigma_x);
 
-    mat mu_u(dm_act, nb_steps);
-    cube sigma_u(dm_act, dm_act, nb_steps);
+    array_tf _mu_u = zeros_array(dm_act, nb_steps);
+    mat mu_u = wrap_mat(_mu_u);
+    array_tf _sigma_u = zeros_array(dm_act, dm_act, nb_steps);
+    cube sigma_u = wrap_cube(_sigma_u);
 
-    mat mu_xu(dm_state + dm_act, nb_steps + 1);
-    cube sigma_xu(dm_state + dm_act, dm_state + dm_act, nb_steps + 1);
+    array_tf _mu_xu = zeros_array(dm_state + dm_act, nb_steps + 1);
+    mat mu_xu = wrap_mat(_mu_xu);
+    array_tf _sigma_xu = zeros_array(dm_state + dm_act, dm_state + dm_act, nb_steps + 1);
+    cube sigma_xu = wrap_cube(_sigma_xu);
+
+    release_gil gil;
 
     mu_x.col(0) = mu_x0;
     sigma_x.slice(0) = sigma_x0;
@@ -348,14 +321,7 @@ py::tuple cubature_forward_pass(array_tf _mu_x0, array_tf _sigma_x0,
         }
     }
 
-    // transform outputs to numpy
-    array_tf _mu_x = mat_to_array(mu_x);
-    array_tf _sigma_x = cube_to_array(sigma_x);
-    array_tf _mu_u =  mat_to_array(mu_u);
-    array_tf _sigma_u = cube_to_array(sigma_u);
-    array_tf _mu_xu =  mat_to_array(mu_xu);
-    array_tf _sigma_xu = cube_to_array(sigma_xu);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_mu_x, _sigma_x, _mu_u, _sigma_u, _mu_xu, _sigma_xu);
     return output;
 }
@@ -367,26 +333,34 @@ py::tuple policy_augment_cost(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
                               array_tf _alpha, int dm_state, int dm_act, int nb_steps) {
 
     // inputs
-    cube Cxx = array_to_cube(_Cxx);
-    mat cx = array_to_mat(_cx);
-    cube Cuu = array_to_cube(_Cuu);
-    mat cu = array_to_mat(_cu);
-    cube Cxu = array_to_cube(_Cxu);
-    vec c0 = array_to_vec(_c0);
+    const cube Cxx = view_cube(_Cxx);
+    const mat cx = view_mat(_cx);
+    const cube Cuu = view_cube(_Cuu);
+    const mat cu = view_mat(_cu);
+    const cube Cxu = view_cube(_Cxu);
+    const vec c0 = view_vec(_c0);
 
-    cube K = array_to_cube(_K);
-    mat kff = array_to_mat(_kff);
-    cube sigma_ctl = array_to_cube(_sigma_ctl);
+    const cube K = view_cube(_K);
+    const mat kff = view_mat(_kff);
+    const cube sigma_ctl = view_cube(_sigma_ctl);
 
-    vec alpha = array_to_vec(_alpha);
+    const vec alpha = view_vec(_alpha);
 
     // outputs
-    cube agCxx(dm_state, dm_state, nb_steps + 1);
-    mat agcx(dm_state, nb_steps + 1);
-    cube agCuu(dm_act, dm_act, nb_steps + 1);
-    mat agcu(dm_act, nb_steps + 1);
-    cube agCxu(dm_state, dm_act, nb_steps + 1);
-    vec agc0(nb_steps + 1);
+    array_tf _agCxx = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube agCxx = wrap_cube(_agCxx);
+    array_tf _agcx = zeros_array(dm_state, nb_steps + 1);
+    mat agcx = wrap_mat(_agcx);
+    array_tf _agCuu = zeros_array(dm_act, dm_act, nb_steps + 1);
+    cube agCuu = wrap_cube(_agCuu);
+    array_tf _agcu = zeros_array(dm_act, nb_steps + 1);
+    mat agcu = wrap_mat(_agcu);
+    array_tf _agCxu = zeros_array(dm_state, dm_act, nb_steps + 1);
+    cube agCxu = wrap_cube(_agCxu);
+    array_tf _agc0 = zeros_array(nb_steps + 1);
+    vec agc0 = wrap_vec(_agc0);
+
+    release_gil gil;
 
     for (int i = 0; i < nb_steps; i++) {
         mat lambda_ctl = inv_sympd(sigma_ctl.slice(i));
@@ -408,14 +382,7 @@ py::tuple policy_augment_cost(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
     agCxu.slice(nb_steps) = Cxu.slice(nb_steps);
     agc0(nb_steps) = c0(nb_steps);
 
-    // transform outputs to numpy
-    array_tf _agCxx = cube_to_array(agCxx);
-    array_tf _agcx = mat_to_array(agcx);
-    array_tf _agCuu =  cube_to_array(agCuu);
-    array_tf _agcu = mat_to_array(agcu);
-    array_tf _agCxu =  cube_to_array(agCxu);
-    array_tf _agc0 = vec_to_array(agc0);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_agCxx, _agcx, _agCuu, _agcu, _agCxu, _agc0);
     return output;
 }
@@ -427,18 +394,18 @@ py::tuple policy_backward_pass(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
                                array_tf _alpha, int dm_state, int dm_act, int nb_steps) {
 
     // inputs
-    cube Cxx = array_to_cube(_Cxx);
-    mat cx = array_to_mat(_cx);
-    cube Cuu = array_to_cube(_Cuu);
-    mat cu = array_to_mat(_cu);
-    cube Cxu = array_to_cube(_Cxu);
-    vec c0 = array_to_vec(_c0);
+    const cube Cxx = view_cube(_Cxx);
+    const mat cx = view_mat(_cx);
+    const cube Cuu = view_cube(_Cuu);
+    const mat cu = view_mat(_cu);
+    const cube Cxu = view_cube(_Cxu);
+    const vec c0 = view_vec(_c0);
 
-    mat mu_param = array_to_mat(_mu_param);
-    cube sigma_param = array_to_cube(_sigma_param);
-    cube sigma_dyn = array_to_cube(_sigma_dyn);
+    const mat mu_param = view_mat(_mu_param);
+    const cube sigma_param = view_cube(_sigma_param);
+    const cube sigma_dyn = view_cube(_sigma_dyn);
 
-    vec alpha = array_to_vec(_alpha);
+    const vec alpha = view_vec(_alpha);
 
     mat A(dm_state, dm_state);
     mat B(dm_state, dm_act);
@@ -454,21 +421,35 @@ py::tuple policy_backward_pass(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
 
     // outputs
     cube Q(dm_state + dm_act, dm_state + dm_act, nb_steps);
-    cube Qxx(dm_state, dm_state, nb_steps);
-    cube Qux(dm_act, dm_state, nb_steps);
-    cube Quu(dm_act, dm_act, nb_steps);
+    array_tf _Qxx = zeros_array(dm_state, dm_state, nb_steps);
+    cube Qxx = wrap_cube(_Qxx);
+    array_tf _Qux = zeros_array(dm_act, dm_state, nb_steps);
+    cube Qux = wrap_cube(_Qux);
+    array_tf _Quu = zeros_array(dm_act, dm_act, nb_steps);
+    cube Quu = wrap_cube(_Quu);
     cube Quu_inv(dm_act, dm_act, nb_steps);
-    mat qx(dm_state, nb_steps);
-    mat qu(dm_act, nb_steps);
-    vec q0(nb_steps);
-
-    cube V(dm_state, dm_state, nb_steps + 1);
-    mat v(dm_state, nb_steps + 1);
-    vec v0(nb_steps + 1);
-
-    cube K(dm_act, dm_state, nb_steps);
-    mat kff(dm_act, nb_steps);
-    cube sigma_ctl(dm_act, dm_act, nb_steps);
+    array_tf _qx = zeros_array(dm_state, nb_steps);
+    mat qx = wrap_mat(_qx);
+    array_tf _qu = zeros_array(dm_act, nb_steps);
+    mat qu = wrap_mat(_qu);
+    array_tf _q0 = zeros_array(nb_steps);
+    vec q0 = wrap_vec(_q0);
+
+    array_tf _V = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube V = wrap_cube(_V);
+    array_tf _v = zeros_array(dm_state, nb_steps + 1);
+    mat v = wrap_mat(_v);
+    array_tf _v0 = zeros_array(nb_steps + 1);
+    vec v0 = wrap_vec(_v0);
+
+    array_tf _K = zeros_array(dm_act, dm_state, nb_steps);
+    cube K = wrap_cube(_K);
+    array_tf _kff = zeros_array(dm_act, nb_steps);
+    mat kff = wrap_mat(_kff);
+    array_tf _sigma_ctl = zeros_array(dm_act, dm_act, nb_steps);
+    cube sigma_ctl = wrap_cube(_sigma_ctl);
+
+    release_gil gil;
     cube lambda_ctl(dm_act, dm_act, nb_steps);
 
     int _diverge = -1;
@@ -538,23 +519,7 @@ py::tuple policy_backward_pass(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
                               + 0.5 * (dm_act * log (2. * datum::pi) - log(det(- 2. * Quu.slice(i)))));
 	}
 
-    // transform outputs to numpy
-    array_tf _Qxx = cube_to_array(Qxx);
-    array_tf _Qux = cube_to_array(Qux);
-    array_tf _Quu = cube_to_array(Quu);
-
-    array_tf _qx = mat_to_array(qx);
-    array_tf _qu = mat_to_array(qu);
-    array_tf _q0 = mat_to_array(q0);
-
-    array_tf _V = cube_to_array(V);
-    array_tf _v = mat_to_array(v);
-    array_tf _v0 = vec_to_array(v0);
-
-    array_tf _K = cube_to_array(K);
-    array_tf _kff = mat_to_array(kff);
-    array_tf _sigma_ctl = cube_to_array(sigma_ctl);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_Qxx, _Qux, _Quu, _qx, _qu, _q0,
                                         _V, _v, _v0,
                                         _K, _kff, _sigma_ctl, _diverge);
@@ -567,13 +532,18 @@ py::tuple parameter_augment_cost(array_tf _mu_nominal, array_tf _sigma_nominal,
                                  double beta, int dm_param, int nb_steps) {
 
     // inputs
-    mat mu_nominal = array_to_mat(_mu_nominal);
-    cube sigma_nominal = array_to_cube(_sigma_nominal);
+    const mat mu_nominal = view_mat(_mu_nominal);
+    const cube sigma_nominal = view_cube(_sigma_nominal);
 
     // outputs
-    cube agCxx(dm_param, dm_param, nb_steps);
-    mat agcx(dm_param, nb_steps);
-    vec agc0(nb_steps);
+    array_tf _agCxx = zeros_array(dm_param, dm_param, nb_steps);
+    cube agCxx = wrap_cube(_agCxx);
+    array_tf _agcx = zeros_array(dm_param, nb_steps);
+    mat agcx = wrap_mat(_agcx);
+    array_tf _agc0 = zeros_array(nb_steps);
+    vec agc0 = wrap_vec(_agc0);
+
+    release_gil gil;
 
     for (int i = 0; i < nb_steps; i++) {
         mat lambda_nominal = inv_sympd(sigma_nominal.slice(i));
@@ -584,11 +554,7 @@ py::tuple parameter_augment_cost(array_tf _mu_nominal, array_tf _sigma_nominal,
                             + 0.5 * beta * mu_nominal.col(i).t() * lambda_nominal * mu_nominal.col(i));
     }
 
-    // transform outputs to numpy
-    array_tf _agCxx = cube_to_array(agCxx);
-    array_tf _agcx = mat_to_array(agcx);
-    array_tf _agc0 = vec_to_array(agc0);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_agCxx, _agcx, _agc0);
     return output;
 }
@@ -601,25 +567,25 @@ py::tuple parameter_backward_pass(array_tf _mu_x, array_tf _sigma_x,
                                   double beta, int dm_state, int dm_act, int dm_param, int nb_steps) {
 
     // inputs
-    mat mu_x = array_to_mat(_mu_x);
-    cube sigma_x = array_to_cube(_sigma_x);
+    const mat mu_x = view_mat(_mu_x);
+    const cube sigma_x = view_cube(_sigma_x);
 
-    cube K = array_to_cube(_K);
-    mat kff = array_to_mat(_kff);
-    cube sigma_ctl = array_to_cube(_sigma_ctl);
+    const cube K = view_cube(_K);
+    const mat kff = view_mat(_kff);
+    const cube sigma_ctl = view_cube(_sigma_ctl);
 
-    cube sigma_dyn = array_to_cube(_sigma_dyn);
+    const cube sigma_dyn = view_cube(_sigma_dyn);
 
-    cube Cxx = array_to_cube(_Cxx);
-    mat cx = array_to_mat(_cx);
-    cube Cuu = array_to_cube(_Cuu);
-    mat cu = array_to_mat(_cu);
-    cube Cxu = array_to_cube(_Cxu);
-    vec c0 = array_to_vec(_c0);
+    const cube Cxx = view_cube(_Cxx);
+    const mat cx = view_mat(_cx);
+    const cube Cuu = view_cube(_Cuu);
+    const mat cu = view_mat(_cu);
+    const cube Cxu = view_cube(_Cxu);
+    const vec c0 = view_vec(_c0);
 
-    cube agCpp = array_to_cube(_agCpp);
-    mat agcp = array_to_mat(_agcp);
-    vec agc0 = array_to_vec(_agc0);
+    const cube agCpp = view_cube(_agCpp);
+    const mat agcp = view_mat(_agcp);
+    const vec agc0 = view_vec(_agc0);
 
     // recreate state-action-offset dist.
     mat mu_u(dm_act, nb_steps);
@@ -676,12 +642,19 @@ py::tuple parameter_backward_pass(array_tf _mu_x, array_tf _sigma_x,
     double p0;
 
     // outputs
-    mat mu_optimal(dm_param, nb_steps);
-    cube sigma_optimal(dm_param, dm_param, nb_steps);
+    array_tf _mu_optimal = zeros_array(dm_param, nb_steps);
+    mat mu_optimal = wrap_mat(_mu_optimal);
+    array_tf _sigma_optimal = zeros_array(dm_param, dm_param, nb_steps);
+    cube sigma_optimal = wrap_cube(_sigma_optimal);
 
-    cube V(dm_state, dm_state, nb_steps + 1);
-    mat v(dm_state, nb_steps + 1);
-    vec v0(nb_steps + 1);
+    array_tf _V = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube V = wrap_cube(_V);
+    array_tf _v = zeros_array(dm_state, nb_steps + 1);
+    mat v = wrap_mat(_v);
+    array_tf _v0 = zeros_array(nb_steps + 1);
+    vec v0 = wrap_vec(_v0);
+
+    release_gil gil;
 
     int _diverge = -1;
 
@@ -754,14 +727,7 @@ py::tuple parameter_backward_pass(array_tf _mu_x, array_tf _sigma_x,
                             + c_cl.t() * V.slice(i + 1) * c_cl + c_cl.t() * v.col(i + 1) );
 	}
 
-    // transform outputs to numpy
-    array_tf _V = cube_to_array(V);
-    array_tf _v = mat_to_array(v);
-    array_tf _v0 = vec_to_array(v0);
-
-    array_tf _mu_optimal = mat_to_array(mu_optimal);
-    array_tf _sigma_optimal = cube_to_array(sigma_optimal);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_V, _v, _v0, _mu_optimal, _sigma_optimal, _diverge);
 
     return output;
@@ -773,23 +739,28 @@ py::tuple parameter_dual_regularization(array_tf _p_mu, array_tf _p_sigma,
                                         double kappa, int dm_state, int nb_steps) {
 
     // inputs
-    mat p_mu = array_to_mat(_p_mu);
-    cube p_sigma = array_to_cube(_p_sigma);
+    const mat p_mu = view_mat(_p_mu);
+    const cube p_sigma = view_cube(_p_sigma);
+
+    const mat q_mu = view_mat(_q_mu);
+    const cube q_sigma = view_cube(_q_sigma);
+
+    // outputs
+    array_tf _regCxx = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube regCxx = wrap_cube(_regCxx);
+    array_tf _regcx = zeros_array(dm_state, nb_steps + 1);
+    mat regcx = wrap_mat(_regcx);
+    array_tf _regc0 = zeros_array(nb_steps + 1);
+    vec regc0 = wrap_vec(_regc0);
+
+    release_gil gil;
 
     cube p_lambda = p_sigma;
     p_lambda.each_slice([](mat& X){ X = inv_sympd(X); } );
 
-    mat q_mu = array_to_mat(_q_mu);
-    cube q_sigma = array_to_cube(_q_sigma);
-
     cube q_lambda = q_sigma;
     q_lambda.each_slice([](mat& X){ X = inv_sympd(X); } );
 
-    // outputs
-    cube regCxx(dm_state, dm_state, nb_steps + 1);
-    mat regcx(dm_state, nb_steps + 1);
-    vec regc0(nb_steps + 1);
-
     for (int i = 0; i < nb_steps + 1; i++) {
         regCxx.slice(i) = 0.5 * kappa * (p_lambda.slice(i) - q_lambda.slice(i));
         regcx.col(i) = - kappa * (p_lambda.slice(i) * p_mu.col(i) - q_lambda.slice(i) * q_mu.col(i));
@@ -800,11 +771,7 @@ py::tuple parameter_dual_regularization(array_tf _p_mu, array_tf _p_sigma,
                              - 0.5 * kappa * q_mu.col(i).t() * q_lambda.slice(i) * q_mu.col(i));
     }
 
-    // transform outputs to numpy
-    array_tf _regCxx = cube_to_array(regCxx);
-    array_tf _regcx = mat_to_array(regcx);
-    array_tf _regc0 = vec_to_array(regc0);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_regCxx, _regcx, _regc0);
     return output;
 
@@ -819,29 +786,29 @@ py::tuple regularized_parameter_backward_pass(array_tf _mu_x, array_tf _sigma_x,
                                               double beta, int dm_state, int dm_act, int dm_param, int nb_steps) {
 
     // inputs
-    mat mu_x = array_to_mat(_mu_x);
-    cube sigma_x = array_to_cube(_sigma_x);
+    const mat mu_x = view_mat(_mu_x);
+    const cube sigma_x = view_cube(_sigma_x);
 
-    cube K = array_to_cube(_K);
-    mat kff = array_to_mat(_kff);
-    cube sigma_ctl = array_to_cube(_sigma_ctl);
+    const cube K = view_cube(_K);
+    const mat kff = view_mat(_kff);
+    const cube sigma_ctl = view_cube(_sigma_ctl);
 
-    cube sigma_dyn = array_to_cube(_sigma_dyn);
+    const cube sigma_dyn = view_cube(_sigma_dyn);
 
-    cube Cxx = array_to_cube(_Cxx);
-    mat cx = array_to_mat(_cx);
-    cube Cuu = array_to_cube(_Cuu);
-    mat cu = array_to_mat(_cu);
-    cube Cxu = array_to_cube(_Cxu);
-    vec c0 = array_to_vec(_c0);
+    const cube Cxx = view_cube(_Cxx);
+    const mat cx = view_mat(_cx);
+    const cube Cuu = view_cube(_Cuu);
+    const mat cu = view_mat(_cu);
+    const cube Cxu = view_cube(_Cxu);
+    const vec c0 = view_vec(_c0);
 
-    cube agCpp = array_to_cube(_agCpp);
-    mat agcp = array_to_mat(_agcp);
-    vec agc0 = array_to_vec(_agc0);
+    const cube agCpp = view_cube(_agCpp);
+    const mat agcp = view_mat(_agcp);
+    const vec agc0 = view_vec(_agc0);
 
-    cube regCxx = array_to_cube(_regCxx);
-    mat regcx = array_to_mat(_regcx);
-    vec regc0 = array_to_vec(_regc0);
+    const cube regCxx = view_cube(_regCxx);
+    const mat regcx = view_mat(_regcx);
+    const vec regc0 = view_vec(_regc0);
 
     // recreate state-action-offset dist.
     mat mu_u(dm_act, nb_steps);
@@ -898,12 +865,19 @@ py::tuple regularized_parameter_backward_pass(array_tf _mu_x, array_tf _sigma_x,
     double p0;
 
     // outputs
-    mat mu_optimal(dm_param, nb_steps);
-    cube sigma_optimal(dm_param, dm_param, nb_steps);
+    array_tf _mu_optimal = zeros_array(dm_param, nb_steps);
+    mat mu_optimal = wrap_mat(_mu_optimal);
+    array_tf _sigma_optimal = zeros_array(dm_param, dm_param, nb_steps);
+    cube sigma_optimal = wrap_cube(_sigma_optimal);
+
+    array_tf _V = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube V = wrap_cube(_V);
+    array_tf _v = zeros_array(dm_state, nb_steps + 1);
+    mat v = wrap_mat(_v);
+    array_tf _v0 = zeros_array(nb_steps + 1);
+    vec v0 = wrap_vec(_v0);
 
-    cube V(dm_state, dm_state, nb_steps + 1);
-    mat v(dm_state, nb_steps + 1);
-    vec v0(nb_steps + 1);
+    release_gil gil;
 
     int _diverge = -1;
 
@@ -976,20 +950,13 @@ py::tuple regularized_parameter_backward_pass(array_tf _mu_x, array_tf _sigma_x,
                             + c_cl.t() * V.slice(i + 1) * c_cl + c_cl.t() * v.col(i + 1) );
 	}
 
-    // transform outputs to numpy
-    array_tf _V = cube_to_array(V);
-    array_tf _v = mat_to_array(v);
-    array_tf _v0 = vec_to_array(v0);
-
-    array_tf _mu_optimal = mat_to_array(mu_optimal);
-    array_tf _sigma_optimal = cube_to_array(sigma_optimal);
-
+    gil.acquire();
     py::tuple output =  py::make_tuple(_V, _v, _v0, _mu_optimal, _sigma_optimal, _diverge);
 
     return output;
 }
 
-PYBIND11_MODULE(core, m)
+void register_functions(py::module &m)
 {
     m.def("policy_divergence", &policy_divergence);
     m.def("gaussian_divergence", &gaussian_divergence);
@@ -1004,3 +971,6 @@ PYBIND11_MODULE(core, m)
     m.def("parameter_dual_regularization", &parameter_dual_regularization);
     m.def("regularized_parameter_backward_pass", &regularized_parameter_backward_pass);
 }
+
+}
+}
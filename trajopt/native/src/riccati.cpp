@@ -0,0 +1,103 @@
+#include <trajopt/numpy.hpp>
+
+
+namespace trajopt {
+namespace riccati {
+
+using namespace arma;
+
+
+py::tuple backward_pass(array_tf _Cxx, array_tf _cx, array_tf _Cuu,
+                        array_tf _cu, array_tf _Cxu,
+                        array_tf _A, array_tf _B, array_tf _c,
+                        bool invariant, double tol,
+                        int dm_state, int dm_act, int nb_steps) {
+
+    // inputs
+    const cube Cxx = view_cube(_Cxx);
+    const mat cx = view_mat(_cx);
+    const cube Cuu = view_cube(_Cuu);
+    const mat cu = view_mat(_cu);
+    const cube Cxu = view_cube(_Cxu);
+
+    const cube A = view_cube(_A);
+    const cube B = view_cube(_B);
+    const mat c = view_mat(_c);
+
+    // outputs
+    array_tf _V = zeros_array(dm_state, dm_state, nb_steps + 1);
+    cube V = wrap_cube(_V);
+    array_tf _v = zeros_array(dm_state, nb_steps + 1);
+    mat v = wrap_mat(_v);
+
+    array_tf _K = zeros_array(dm_act, dm_state, nb_steps);
+    cube K = wrap_cube(_K);
+    array_tf _kff = zeros_array(dm_act, nb_steps);
+    mat kff = wrap_mat(_kff);
+
+    mat VA, VB, Qxx, Quu, Qux, L, _k;
+    vec _vn, qx, qu;
+
+    release_gil gil;
+
+    // last time step
+    V.slice(nb_steps) = Cxx.slice(nb_steps);
+    v.col(nb_steps) = cx.col(nb_steps);
+
+    for(int i = nb_steps - 1; i >= 0; --i)
+    {
+        VA = V.slice(i+1) * A.slice(i);
+        VB = V.slice(i+1) * B.slice(i);
+
+        // affine terms enter through the next linear value
+        _vn = 2.0 * V.slice(i+1) * c.col(i) + v.col(i+1);
+
+        Qxx = Cxx.slice(i) + A.slice(i).t() * VA;
+        Quu = Cuu.slice(i) + B.slice(i).t() * VB;
+        Qux = Cxu.slice(i).t() + B.slice(i).t() * VA;
+
+        qx = cx.col(i) + A.slice(i).t() * _vn;
+        qu = cu.col(i) + B.slice(i).t() * _vn;
+
+        // one factorization for feedback and feedforward terms,
+        // a general solve if Quu is not positive definite
+        if (chol(L, Quu, "lower"))
+            _k = - solve(trimatu(L.t()), solve(trimatl(L), join_horiz(Qux, 0.5 * qu)));
+        else
+            _k = - solve(Quu, join_horiz(Qux, 0.5 * qu));
+
+        K.slice(i) = _k.head_cols(dm_state);
+        kff.col(i) = _k.col(dm_state);
+
+        V.slice(i) = Qxx + Qux.t() * K.slice(i);
+        V.slice(i) = 0.5 * (V.slice(i) + V.slice(i).t());
+        v.col(i) = qx + 2.0 * Qux.t() * kff.col(i);
+
+        // a converged time-invariant recursion is at its fixed point,
+        // reuse the stationary gains for all earlier steps
+        if (invariant && i < nb_steps - 1
+                && abs(V.slice(i) - V.slice(i+1)).max() <= tol * abs(V.slice(i)).max()
+                && abs(v.col(i) - v.col(i+1)).max() <= tol * abs(v.col(i)).max()) {
+            for(int j = i - 1; j >= 0; --j) {
+                K.slice(j) = K.slice(i);
+                kff.col(j) = kff.col(i);
+                V.slice(j) = V.slice(i);
+                v.col(j) = v.col(i);
+            }
+            break;
+        }
+    }
+
+    gil.acquire();
+    py::tuple output = py::make_tuple(_K, _kff, _V, _v);
+    return output;
+}
+
+
+void register_functions(py::module &m)
+{
+    m.def("backward_pass", &backward_pass);
+}
+
+}
+}
@@ -0,0 +1,238 @@
+import os
+import copy
+import json
+import time
+import threading
+import functools
+from contextvars import ContextVar
+
+import numpy as np
+
+
+# profiling of solver runs. solvers mark where each iteration and each
+# of its phases begins, a phase lasts until the next mark, and count
+# retries and trials. the marks go to the callbacks of the profiler
+# passed to run(profiler=...), without one they return at once and
+# native kernels are called directly
+#
+# phases: taylor_expansion, backward_pass, forward_pass, line_search,
+# dual_optimization, parameter_optimization, rollout, dynamics_learning
+# and for elqr forward_lqr and backward_lqr
+#
+# counts: backward_pass_retries, lmbda_increases, line_search_trials,
+# dual_evaluations and dual_retries
+#
+# work before the first iteration is recorded as iteration -1
+
+
+_session = ContextVar('trajopt_profiling_session', default=None)
+
+
+class Profiler:
+    """
+    Callbacks of a profiled solver run, all of them do nothing.
+
+    Subclass and override the ones of interest. Times are
+    time.perf_counter() values in seconds. The callbacks run in
+    the thread of the solver, use one profiler per solver thread.
+    """
+    def on_run(self, solver, start):
+        pass
+
+    def on_iteration(self, iteration, start):
+        pass
+
+    def on_phase(self, name, start, stop):
+        pass
+
+    def on_count(self, name, n):
+        pass
+
+    def on_native(self, name, nbytes, start, stop):
+        pass
+
+    def on_end(self, solver, stop):
+        pass
+
+
+class _Session:
+    # the phase of a profiled run that is still open
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.phase, self.start = None, None
+
+    def mark(self, name):
+        now = time.perf_counter()
+        if self.phase is not None:
+            self.profiler.on_phase(self.phase, self.start, now)
+        self.phase, self.start = name, now
+        return now
+
+    def iteration(self, iteration):
+        self.profiler.on_iteration(iteration, self.mark(None))
+
+    def begin(self, solver):
+        self.profiler.on_run(solver, time.perf_counter())
+        self.iteration(-1)
+
+    def end(self, solver):
+        self.profiler.on_end(solver, self.mark(None))
+
+
+def phase(name):
+    session = _session.get()
+    if session is not None:
+        session.mark(name)
+
+
+def iteration(iteration):
+    session = _session.get()
+    if session is not None:
+        session.iteration(iteration)
+
+
+def count(name, n=1):
+    session = _session.get()
+    if session is not None:
+        session.profiler.on_count(name, n)
+
+
+def _nbytes(arrays):
+    return sum(a.nbytes for a in arrays if isinstance(a, np.ndarray))
+
+
+def native(fn):
+    # wraps a native kernel to report its time and the bytes
+    # of its array arguments and results to the profiler
+    @functools.wraps(fn)
+    def _native(*args, **kwargs):
+        session = _session.get()
+        if session is None:
+            return fn(*args, **kwargs)
+
+        start = time.perf_counter()
+        out = fn(*args, **kwargs)
+        stop = time.perf_counter()
+
+        nbytes = _nbytes(args) + _nbytes(kwargs.values())\
+                 + _nbytes(out if isinstance(out, tuple) else (out, ))
+        session.profiler.on_native(fn.__name__, nbytes, start, stop)
+        return out
+
+    return _native
+
+
+def profiled(run):
+    # adds the profiler keyword to the run method of a solver
+    @functools.wraps(run)
+    def _run(self, *args, profiler=None, **kwargs):
+        session = None if profiler is None else _Session(profiler)
+        token = _session.set(session)
+        try:
+            if session is not None:
+                session.begin(self)
+            return run(self, *args, **kwargs)
+        finally:
+            if session is not None:
+                session.end(self)
+            _session.reset(token)
+
+    return _run
+
+
+class Trace(Profiler):
+    """
+    Default profiler, collects wall times per iteration and phase,
+    counts and native calls of one or more runs.
+    """
+    def __init__(self):
+        self.runs = []
+
+        # (name, category, start, stop, args) of every interval
+        self.events = []
+        self._run, self._open = None, None
+        self._tid = threading.get_ident()
+
+    def _close(self, stop):
+        # closes the open run or iteration
+        name, category, start, record = self._open
+        record['time'] = stop - start
+
+        args = dict(record['counts']) if category == 'iteration' else None
+        self.events.append((name, category, start, stop, args))
+
+    def on_run(self, solver, start):
+        self.runs.append({'solver': type(solver).__name__, 'time': 0.,
+                          'phases': {}, 'counts': {}, 'native': {},
+                          'iterations': []})
+        self._run = (type(solver).__name__ + '.run', 'run', start, self.runs[-1])
+        self._open = None
+        self._tid = threading.get_ident()
+
+    def on_iteration(self, iteration, start):
+        if self._open is not None:
+            self._close(start)
+
+        record = {'iteration': iteration, 'time': 0.,
+                  'phases': {}, 'counts': {}, 'native': {}}
+        self.runs[-1]['iterations'].append(record)
+        self._open = ('iteration %d' % iteration, 'iteration', start, record)
+
+    def _records(self):
+        # totals of the open iteration and of its run
+        return self._open[3], self.runs[-1]
+
+    def on_phase(self, name, start, stop):
+        for record in self._records():
+            record['phases'][name] = record['phases'].get(name, 0.) + stop - start
+        self.events.append((name, 'phase', start, stop, None))
+
+    def on_count(self, name, n):
+        for record in self._records():
+            record['counts'][name] = record['counts'].get(name, 0) + n
+
+    def on_native(self, name, nbytes, start, stop):
+        for record in self._records():
+            calls = record['native'].setdefault(name, {'calls': 0, 'bytes': 0, 'time': 0.})
+            calls['calls'] += 1
+            calls['bytes'] += nbytes
+            calls['time'] += stop - start
+        self.events.append((name, 'native', start, stop, {'bytes': nbytes}))
+
+    def on_end(self, solver, stop):
+        self._close(stop)
+        self._open = self._run
+        self._close(stop)
+        self._open = None
+
+    def record(self):
+        """
+        :return: one dict per run with its solver, time, totals of phases,
+         counts and native calls, and the same per iteration
+        :rtype: list
+        """
+        return copy.deepcopy(self.runs)
+
+    def chrome_trace(self, path=None):
+        """
+        Runs, iterations, phases and native calls as complete events
+        of the Chrome trace event format, viewable in chrome://tracing
+        or Perfetto.
+        :param path: file to write the trace to, if given
+        :return: trace as dict
+        """
+        t0 = min((e[2] for e in self.events), default=0.)
+        pid, tid = os.getpid(), self._tid
+
+        events = []
+        for name, category, start, stop, args in sorted(self.events, key=lambda e: (e[2], e[2] - e[3])):
+            events.append({'name': name, 'cat': category, 'ph': 'X',
+                           'ts': 1e6 * (start - t0), 'dur': 1e6 * (stop - start),
+                           'pid': pid, 'tid': tid, 'args': args or {}})
+
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        if path is not None:
+            with open(path, 'w') as f:
+                json.dump(trace, f)
+        return trace
@@ -5,6 +5,11 @@ from scipy import optimize
 
 from copy import deepcopy
 
+from trajopt import trajectory
+from trajopt import profiling
+
+from trajopt.envs.vector import VectorEnv
+
 from trajopt.rgps.objects import Gaussian, QuadraticCost
 from trajopt.rgps.objects import AnalyticalQuadraticCost
 from trajopt.rgps.objects import QuadraticStateValue, QuadraticStateActionValue
@@ -13,15 +18,15 @@ from trajopt.rgps.objects import MatrixNormalParameters
 
 from trajopt.gps.objects import pass_alpha_as_vector
 
-from trajopt.rgps.core import policy_divergence
-from trajopt.rgps.core import gaussian_divergence
-from trajopt.rgps.core import gaussian_interp_w2
-from trajopt.rgps.core import gaussian_interp_kl
-from trajopt.rgps.core import quad_expectation
-from trajopt.rgps.core import policy_augment_cost, policy_backward_pass
-from trajopt.rgps.core import parameter_backward_pass
-from trajopt.rgps.core import parameter_augment_cost
-from trajopt.rgps.core import cubature_forward_pass
+from trajopt.native.core.rgps import policy_divergence
+from trajopt.native.core.rgps import gaussian_divergence
+from trajopt.native.core.rgps import gaussian_interp_kl
+from trajopt.native.core.rgps import gaussian_interp_w2
+from trajopt.native.core.rgps import quad_expectation
+from trajopt.native.core.rgps import policy_augment_cost, policy_backward_pass
+from trajopt.native.core.rgps import parameter_backward_pass
+from trajopt.native.core.rgps import parameter_augment_cost
+from trajopt.native.core.rgps import cubature_forward_pass
 
 import logging
 
@@ -35,7 +40,8 @@ class LRGPS:
                  init_state, init_action_sigma=1.,
                  policy_kl_bound=0.1, param_kl_bound=100,
                  kl_stepwise=False, activation=None,
-                 slew_rate=False, action_penalty=None):
+                 slew_rate=False, action_penalty=None,
+                 param_interp='kl'):
 
         # logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
 
@@ -71,6 +77,11 @@ class LRGPS:
         self.param_kl_bound = param_kl_bound
         self.beta = np.array([1e16])
 
+        # damping of the adversarial state distribution
+        if param_interp not in ('kl', 'w2'):
+            raise NotImplementedError
+        self.param_interp = param_interp
+
         # create state distribution and initialize first time step
         self.xdist = Gaussian(self.dm_state, self.nb_steps + 1)
         self.xdist.mu[..., 0], self.xdist.sigma[..., 0] = self.env_init
@@ -104,7 +115,7 @@ class LRGPS:
         self.param = MatrixNormalParameters(self.dm_state, self.dm_act, self.nb_steps)
 
         # We assume process noise over dynamics is known
-        self.noise = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.noise = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
         for t in range(self.nb_steps):
             self.noise[..., t] = self.env_noise
 
@@ -137,6 +148,11 @@ class LRGPS:
             env = env
             env_cost = env.unwrapped.cost
 
+        # step all episodes at once if the env is vectorized
+        if hasattr(env.unwrapped, 'dynamics_batch'):
+            venv = VectorEnv(env, nb_episodes)
+            return venv.rollout(self.ctl, self.nb_steps, self.weighting, stoch)
+
         data = {'x': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
                 'u': np.zeros((self.dm_act, self.nb_steps, nb_episodes)),
                 'xn': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
@@ -262,6 +278,8 @@ class LRGPS:
         return lgc, xvalue, xuvalue, diverge
 
     def policy_dual(self, alpha):
+        profiling.count('dual_evaluations')
+
         # augmented cost
         agcost = self.policy_augment_cost(alpha)
 
@@ -312,6 +330,7 @@ class LRGPS:
         return param, xvalue, diverge
 
     def parameter_dual(self, beta):
+        profiling.count('dual_evaluations')
 
         agcost = self.parameter_augment_cost(beta)
 
@@ -344,8 +363,8 @@ class LRGPS:
                                             self.dm_state, self.nb_steps + 1)
 
             # interpolate between distributions
-            q_xdist.mu, q_xdist.sigma = self.interp_gauss_kl(q_xdist.mu, q_xdist.sigma,
-                                                             p_xdist.mu, p_xdist.sigma, 1e-1)
+            q_xdist.mu, q_xdist.sigma = self.interp_gauss(q_xdist.mu, q_xdist.sigma,
+                                                          p_xdist.mu, p_xdist.sigma, 1e-1)
         # dual expectation
         dual = quad_expectation(q_xdist.mu[..., 0], q_xdist.sigma[..., 0],
                                 xvalue.V[..., 0], xvalue.v[..., 0],
@@ -376,6 +395,7 @@ class LRGPS:
                     LOGGER.debug("Param KL: %.2e, Grad: %f, Beta: %f" % (self.param_kl_bound, grad, beta))
                     return beta, dual, grad
                 else:
+                    profiling.count('dual_retries')
                     if grad > 0:  # beta too large
                         max_beta = beta
                         beta = np.sqrt(min_beta * max_beta)
@@ -388,6 +408,7 @@ class LRGPS:
                                      % (self.param_kl_bound, grad, beta, min_beta, max_beta))
 
             else:
+                profiling.count('dual_retries')
                 min_beta = beta
                 beta = np.sqrt(min_beta * max_beta)
                 LOGGER.debug("Param KL: %.1e, Grad: %2.3e, Backward pass diverged, New Beta: %2.3e, Min. Beta: %2.3e, Max. Beta: %2.3e"
@@ -418,22 +439,17 @@ class LRGPS:
 
     @staticmethod
     def interp_gauss_w2(mu_q, sigma_q, mu_p, sigma_p, a):
+        # the anchor q moves with every step of the fixed-point
+        # loop, so its square roots are computed in the same call
         dim, nb_steps = mu_q.shape
+        return gaussian_interp_w2(mu_q, sigma_q, mu_p, sigma_p,
+                                  a, dim, nb_steps)
 
-        # mu, sigma = gaussian_interp_w2(mu_q, sigma_q, mu_p, sigma_p,
-        #                                a, dim, nb_steps)
-
-        mu = np.zeros((dim, nb_steps))
-        sigma = np.zeros((dim, dim, nb_steps))
-
-        for t in range(nb_steps):
-            mu[:, t] = (1. - a) * mu_q[:, t] + a * mu_p[:, t]
-            sigma_0_chol = sc.linalg.sqrtm(sigma_q[..., t])
-            sigma_0_chol_inv = np.linalg.inv(sigma_0_chol)
-            _sigma = (1. - a) * sigma_q[..., t] + a * sc.linalg.sqrtm(sigma_0_chol @ sigma_p[..., t] @ sigma_0_chol)
-            sigma[..., t] = sigma_0_chol_inv @ _sigma @ _sigma @ sigma_0_chol_inv
-
-        return mu, sigma
+    def interp_gauss(self, mu_q, sigma_q, mu_p, sigma_p, a):
+        if self.param_interp == 'w2':
+            return self.interp_gauss_w2(mu_q, sigma_q, mu_p, sigma_p, a)
+        else:
+            return self.interp_gauss_kl(mu_q, sigma_q, mu_p, sigma_p, a)
 
     @staticmethod
     def gaussians_kldiv(mu_p, sigma_p, mu_q, sigma_q, dim, length):
@@ -586,14 +602,17 @@ class LRGPS:
 
         plt.show()
 
+    @profiling.profiled
     def run(self, nb_iter=10, verbose=False):
 
         _trace = []
 
         # current state distribution
+        profiling.phase('forward_pass')
         self.xdist, self.udist, self.xudist = self.cubature_forward_pass(self.ctl, self.nominal)
 
         # get quadratic cost around mean traj.
+        profiling.phase('taylor_expansion')
         self.cost.taylor_expansion(self.xdist.mu, self.udist.mu, self.weighting)
 
         # mean objective under current ctrl.
@@ -603,7 +622,10 @@ class LRGPS:
         _trace.append(self.last_return)
 
         for iter in range(nb_iter):
+            profiling.iteration(iter)
+
             # worst-case parameter optimization
+            profiling.phase('parameter_optimization')
             self.beta, _, _ = self.parameter_dual_optimization(self.beta, iters=50)
 
             agcost = self.parameter_augment_cost(self.beta)
@@ -633,8 +655,8 @@ class LRGPS:
                                                 self.dm_state, self.nb_steps + 1)
 
                 # interpolate between distributions
-                q_xdist.mu, q_xdist.sigma = self.interp_gauss_kl(q_xdist.mu, q_xdist.sigma,
-                                                                 p_xdist.mu, p_xdist.sigma, 1e-1)
+                q_xdist.mu, q_xdist.sigma = self.interp_gauss(q_xdist.mu, q_xdist.sigma,
+                                                              p_xdist.mu, p_xdist.sigma, 1e-1)
 
             param_kl = np.sum(self.parameter_kldiv(self.param))
 
@@ -646,6 +668,7 @@ class LRGPS:
                 alpha_bounds = ((1e-16, 1e16), ) * 1
 
             # policy optimization
+            profiling.phase('dual_optimization')
             res = sc.optimize.minimize(self.policy_dual, alpha_init,
                                        method='L-BFGS-B', jac=True,
                                        bounds=alpha_bounds,
@@ -654,8 +677,11 @@ class LRGPS:
             self.alpha = res.x
 
             # re-compute after opt.
+            profiling.phase('backward_pass')
             policy_agcost = self.policy_augment_cost(self.alpha)
             lgc, xvalue, xuvalue, diverge = self.policy_backward_pass(self.alpha, policy_agcost)
+
+            profiling.phase('forward_pass')
             worst_xdist, worst_udist, worst_xudist = self.cubature_forward_pass(lgc, self.param)
 
             # check kl constraint
@@ -678,6 +704,7 @@ class LRGPS:
                 _return = self.cost.evaluate(self.xdist, self.udist)
 
                 # get quadratic cost around mean traj.
+                profiling.phase('taylor_expansion')
                 self.cost.taylor_expansion(self.xdist.mu, self.udist.mu, self.weighting)
 
                 # mean objective under last dists.
@@ -694,6 +721,7 @@ class LRGPS:
                                                                 np.sum(self.policy_kl_bound), np.sum(policy_kl),
                                                                 _return))
             else:
+                profiling.count('dual_retries')
                 print("Something is wrong, KL not satisfied: ", "req", np.sum(self.policy_kl_bound),
                                                                 "act.", np.sum(policy_kl))
                 if self.kl_stepwise:
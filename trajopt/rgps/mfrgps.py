@@ -5,26 +5,32 @@ from scipy import optimize
 
 from copy import deepcopy
 
+from trajopt import trajectory
+from trajopt import profiling
+
+from trajopt.envs.vector import VectorEnv
+
 from trajopt.rgps.objects import Gaussian, QuadraticCost
 from trajopt.rgps.objects import AnalyticalQuadraticCost
 from trajopt.rgps.objects import QuadraticStateValue, QuadraticStateActionValue
 from trajopt.rgps.objects import LinearGaussianControl
 from trajopt.rgps.objects import LearnedProbabilisticLinearDynamicsWithKnownNoise
 from trajopt.rgps.objects import MatrixNormalParameters
+from trajopt.rgps.objects import PerturbedLinearSimulator
 
 from trajopt.gps.objects import pass_alpha_as_vector
 
-from trajopt.rgps.core import policy_divergence
-from trajopt.rgps.core import gaussian_divergence
-from trajopt.rgps.core import gaussian_interp_w2
-from trajopt.rgps.core import gaussian_interp_kl
-from trajopt.rgps.core import quad_expectation
-from trajopt.rgps.core import policy_augment_cost, policy_backward_pass
-from trajopt.rgps.core import parameter_augment_cost
-from trajopt.rgps.core import parameter_backward_pass
-from trajopt.rgps.core import parameter_dual_regularization
-from trajopt.rgps.core import regularized_parameter_backward_pass
-from trajopt.rgps.core import cubature_forward_pass
+from trajopt.native.core.rgps import policy_divergence
+from trajopt.native.core.rgps import gaussian_divergence
+from trajopt.native.core.rgps import gaussian_interp_kl
+from trajopt.native.core.rgps import gaussian_interp_w2
+from trajopt.native.core.rgps import quad_expectation
+from trajopt.native.core.rgps import policy_augment_cost, policy_backward_pass
+from trajopt.native.core.rgps import parameter_augment_cost
+from trajopt.native.core.rgps import parameter_backward_pass
+from trajopt.native.core.rgps import parameter_dual_regularization
+from trajopt.native.core.rgps import regularized_parameter_backward_pass
+from trajopt.native.core.rgps import cubature_forward_pass
 
 import logging
 
@@ -39,6 +45,7 @@ class MFRGPS:
                  policy_kl_bound=0.1, param_kl_bound=100,
                  kl_stepwise=False, activation=None,
                  slew_rate=False, action_penalty=None,
+                 param_interp='kl',
                  prior=None):
 
         # logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.DEBUG)
@@ -75,6 +82,11 @@ class MFRGPS:
         self.param_kl_bound = param_kl_bound
         self.beta = np.array([1e16])
 
+        # damping of the adversarial state distribution
+        if param_interp not in ('kl', 'w2'):
+            raise NotImplementedError
+        self.param_interp = param_interp
+
         # create state distribution and initialize first time step
         self.xdist = Gaussian(self.dm_state, self.nb_steps + 1)
         self.xdist.mu[..., 0], self.xdist.sigma[..., 0] = self.env_init
@@ -90,7 +102,7 @@ class MFRGPS:
         self.param = MatrixNormalParameters(self.dm_state, self.dm_act, self.nb_steps)
 
         # We assume process noise over dynamics is known
-        self.noise = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.noise = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
         for t in range(self.nb_steps):
             self.noise[..., t] = self.env_noise
 
@@ -124,6 +136,17 @@ class MFRGPS:
             env = env
             env_cost = env.unwrapped.cost
 
+        if linearize:
+            sim = PerturbedLinearSimulator(env, self.dm_state, self.dm_act, self.nb_steps)
+            return sim.rollout(self.ctl, nb_episodes, self.weighting,
+                               param=self.param if perturb else None,
+                               stoch=stoch)
+
+        # step all episodes at once if the env is vectorized
+        if hasattr(env.unwrapped, 'dynamics_batch'):
+            venv = VectorEnv(env, nb_episodes)
+            return venv.rollout(self.ctl, self.nb_steps, self.weighting, stoch)
+
         data = {'x': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
                 'u': np.zeros((self.dm_act, self.nb_steps, nb_episodes)),
                 'xn': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
@@ -141,15 +164,7 @@ class MFRGPS:
                 data['c'][t] = c
 
                 data['x'][..., t, n] = x
-                if linearize:
-                    if perturb:
-                        dist = {'mu': self.param.mu[..., t],
-                                'sigma': self.param.sigma[..., t]}
-                        x, _, _, _ = env.evolve(u, dist)
-                    else:
-                        x, _, _, _ = env.evolve(u, None)
-                else:
-                    x, _, _, _ = env.step(u)
+                x, _, _, _ = env.step(u)
                 data['xn'][..., t, n] = x
 
             c = env_cost(x, np.zeros((self.dm_act, )),  np.zeros((self.dm_act, )), self.weighting[-1])
@@ -257,6 +272,8 @@ class MFRGPS:
         return lgc, xvalue, xuvalue, diverge
 
     def policy_dual(self, alpha):
+        profiling.count('dual_evaluations')
+
         # augmented cost
         agcost = self.policy_augment_cost(alpha)
 
@@ -307,6 +324,7 @@ class MFRGPS:
         return param, xvalue, diverge
 
     def parameter_dual(self, beta):
+        profiling.count('dual_evaluations')
 
         agcost = self.parameter_augment_cost(beta)
 
@@ -339,8 +357,8 @@ class MFRGPS:
                                             self.dm_state, self.nb_steps + 1)
 
             # interpolate between distributions
-            q_xdist.mu, q_xdist.sigma = self.interp_gauss_kl(q_xdist.mu, q_xdist.sigma,
-                                                             p_xdist.mu, p_xdist.sigma, 1e-1)
+            q_xdist.mu, q_xdist.sigma = self.interp_gauss(q_xdist.mu, q_xdist.sigma,
+                                                          p_xdist.mu, p_xdist.sigma, 1e-1)
         # dual expectation
         dual = quad_expectation(q_xdist.mu[..., 0], q_xdist.sigma[..., 0],
                                 xvalue.V[..., 0], xvalue.v[..., 0],
@@ -377,6 +395,8 @@ class MFRGPS:
         return param, xvalue, diverge
 
     def regularized_parameter_dual(self, beta, kappa):
+        profiling.count('dual_evaluations')
+
         agcost = self.parameter_augment_cost(beta)
 
         q_xdist = deepcopy(self.xdist)
@@ -443,6 +463,7 @@ class MFRGPS:
                     LOGGER.debug("Param KL: %.2e, Grad: %f, Beta: %f" % (self.param_kl_bound, grad, beta))
                     return beta, dual, grad
                 else:
+                    profiling.count('dual_retries')
                     if grad > 0:  # beta too large
                         max_beta = beta
                         beta = np.sqrt(min_beta * max_beta)
@@ -455,6 +476,7 @@ class MFRGPS:
                                      % (self.param_kl_bound, grad, beta, min_beta, max_beta))
 
             else:
+                profiling.count('dual_retries')
                 min_beta = beta
                 beta = np.sqrt(min_beta * max_beta)
                 LOGGER.debug("Param KL: %.1e, Grad: %2.3e, Backward pass diverged, New Beta: %2.3e, Min. Beta: %2.3e, Max. Beta: %2.3e"
@@ -485,22 +507,17 @@ class MFRGPS:
 
     @staticmethod
     def interp_gauss_w2(mu_q, sigma_q, mu_p, sigma_p, a):
+        # the anchor q moves with every step of the fixed-point
+        # loop, so its square roots are computed in the same call
         dim, nb_steps = mu_q.shape
+        return gaussian_interp_w2(mu_q, sigma_q, mu_p, sigma_p,
+                                  a, dim, nb_steps)
 
-        # mu, sigma = gaussian_interp_w2(mu_q, sigma_q, mu_p, sigma_p,
-        #                                a, dim, nb_steps)
-
-        mu = np.zeros((dim, nb_steps))
-        sigma = np.zeros((dim, dim, nb_steps))
-
-        for t in range(nb_steps):
-            mu[:, t] = (1. - a) * mu_q[:, t] + a * mu_p[:, t]
-            sigma_0_chol = sc.linalg.sqrtm(sigma_q[..., t])
-            sigma_0_chol_inv = np.linalg.inv(sigma_0_chol)
-            _sigma = (1. - a) * sigma_q[..., t] + a * sc.linalg.sqrtm(sigma_0_chol @ sigma_p[..., t] @ sigma_0_chol)
-            sigma[..., t] = sigma_0_chol_inv @ _sigma @ _sigma @ sigma_0_chol_inv
-
-        return mu, sigma
+    def interp_gauss(self, mu_q, sigma_q, mu_p, sigma_p, a):
+        if self.param_interp == 'w2':
+            return self.interp_gauss_w2(mu_q, sigma_q, mu_p, sigma_p, a)
+        else:
+            return self.interp_gauss_kl(mu_q, sigma_q, mu_p, sigma_p, a)
 
     @staticmethod
     def gaussians_kldiv(mu_p, sigma_p, mu_q, sigma_q, dim, length):
@@ -549,23 +566,36 @@ class MFRGPS:
 
         plt.show()
 
+    @profiling.profiled
     def run(self, nb_learning_episodes,
             nb_evaluation_episodes, nb_iter=10,
-            verbose=False, debug_dual=False):
+            verbose=False, debug_dual=False,
+            data=None, evaluation=None, nominal=None):
 
         _trace = []
 
-        # run init controller
-        self.data = self.rollout(nb_learning_episodes, perturb=False)
-        eval = self.rollout(nb_evaluation_episodes, perturb=False)
+        # run init controller, unless rollouts are provided
+        profiling.phase('rollout')
+        if data is None:
+            self.data = self.rollout(nb_learning_episodes, perturb=False)
+            eval = self.rollout(nb_evaluation_episodes, perturb=False)
+        else:
+            self.data, eval = data, evaluation
 
-        # leanr posterior over dynamics
-        self.nominal.learn(self.data)
+        # leanr posterior over dynamics, unless already fitted
+        profiling.phase('dynamics_learning')
+        if nominal is None:
+            self.nominal.learn(self.data)
+        else:
+            self.nominal.mu = np.array(nominal[0])
+            self.nominal.sigma = np.array(nominal[1])
 
         # current state distribution
+        profiling.phase('forward_pass')
         self.xdist, self.udist, self.xudist = self.cubature_forward_pass(self.ctl, self.nominal)
 
         # get quadratic cost around mean traj.
+        profiling.phase('taylor_expansion')
         self.cost.taylor_expansion(self.xdist.mu, self.udist.mu, self.weighting)
 
         # mean objective under current ctrl.
@@ -573,7 +603,10 @@ class MFRGPS:
         _trace.append(self.last_return)
 
         for iter in range(nb_iter):
+            profiling.iteration(iter)
+
             # worst-case parameter optimization
+            profiling.phase('parameter_optimization')
             self.beta, _, _ = self.parameter_dual_optimization(self.beta, iters=50)
 
             agcost = self.parameter_augment_cost(self.beta)
@@ -604,8 +637,8 @@ class MFRGPS:
                                                 self.dm_state, self.nb_steps + 1)
 
                 # interpolate between distributions
-                q_xdist.mu, q_xdist.sigma = self.interp_gauss_kl(q_xdist.mu, q_xdist.sigma,
-                                                                 p_xdist.mu, p_xdist.sigma, 1e-1)
+                q_xdist.mu, q_xdist.sigma = self.interp_gauss(q_xdist.mu, q_xdist.sigma,
+                                                              p_xdist.mu, p_xdist.sigma, 1e-1)
 
             param_kl = np.sum(self.parameter_kldiv(self.param))
 
@@ -617,6 +650,7 @@ class MFRGPS:
                 alpha_bounds = ((1e-16, 1e16), ) * 1
 
             # policy optimization
+            profiling.phase('dual_optimization')
             res = sc.optimize.minimize(self.policy_dual, alpha_init,
                                        method='L-BFGS-B', jac=True,
                                        bounds=alpha_bounds,
@@ -631,10 +665,12 @@ class MFRGPS:
                     self.plot_dual(self.policy_dual, np.log10(0.5 * res.x), np.log10(2. * res.x))
 
             # re-compute after opt.
+            profiling.phase('backward_pass')
             policy_agcost = self.policy_augment_cost(self.alpha)
             lgc, xvalue, xuvalue, diverge = self.policy_backward_pass(self.alpha, policy_agcost)
 
             # get expected improvment:
+            profiling.phase('forward_pass')
             worst_xdist, worst_udist, worst_xudist = self.cubature_forward_pass(lgc, self.param)
             nominal_xdist, nominal_udist, nominal_xudist = self.cubature_forward_pass(lgc, self.nominal)
 
@@ -655,6 +691,7 @@ class MFRGPS:
                 self.vfunc, self.qfunc = xvalue, xuvalue
 
                 # run current controller
+                profiling.phase('rollout')
                 self.data = self.rollout(nb_learning_episodes, perturb=False)
                 eval = self.rollout(nb_evaluation_episodes, perturb=False)
 
@@ -666,12 +703,15 @@ class MFRGPS:
                 _actual_imp = self.last_return - _actual_return
 
                 # leanr posterior over dynamics
+                profiling.phase('dynamics_learning')
                 self.nominal.learn(self.data)
 
                 # current state distribution
+                profiling.phase('forward_pass')
                 self.xdist, self.udist, self.xudist = self.cubature_forward_pass(self.ctl, self.param)
 
                 # get quadratic cost around mean traj.
+                profiling.phase('taylor_expansion')
                 self.cost.taylor_expansion(self.xdist.mu, self.udist.mu, self.weighting)
 
                 # mean objective under last dists.
@@ -688,6 +728,7 @@ class MFRGPS:
                                                                   np.sum(self.policy_kl_bound), np.sum(policy_kl),
                                                                   _actual_return))
             else:
+                profiling.count('dual_retries')
                 print("Something is wrong, KL not satisfied: ", "req", np.sum(self.policy_kl_bound),
                                                                 "act.", np.sum(policy_kl))
                 if self.kl_stepwise:
@@ -8,14 +8,16 @@ from mimo.distributions import LinearGaussianWithKnownPrecision
 import scipy as sc
 from scipy import stats
 
+from trajopt import trajectory
+
 
 class Gaussian:
     def __init__(self, nb_dim, nb_steps):
         self.nb_dim = nb_dim
         self.nb_steps = nb_steps
 
-        self.mu = np.zeros((self.nb_dim, self.nb_steps))
-        self.sigma = np.zeros((self.nb_dim, self.nb_dim, self.nb_steps))
+        self.mu = trajectory.zeros((self.nb_dim, self.nb_steps))
+        self.sigma = trajectory.zeros((self.nb_dim, self.nb_dim, self.nb_steps))
         for t in range(self.nb_steps):
             self.sigma[..., t] = np.eye(self.nb_dim)
 
@@ -39,14 +41,20 @@ class MatrixNormalParameters:
 
         self.dm_param = self.dm_state * (self.dm_state + self.dm_act + 1)
 
-        self.mu = np.zeros((self.dm_param, self.nb_steps))
-        self.sigma = np.zeros((self.dm_param, self.dm_param, self.nb_steps))
+        self.mu = trajectory.zeros((self.dm_param, self.nb_steps))
+        self.sigma = trajectory.zeros((self.dm_param, self.dm_param, self.nb_steps))
         for t in range(self.nb_steps):
             self.sigma[..., t] = 1e0 * np.eye(self.dm_param)
 
     def sample(self, t):
         return np.random.multivariate_normal(self.mu[:, t], self.sigma[:, :, t])
 
+    def samples(self, nb_samples):
+        # draws for all time steps at once, (dm_param, nb_steps, nb_samples)
+        L = np.linalg.cholesky(trajectory.steps(self.sigma))
+        eps = np.random.randn(self.nb_steps, self.dm_param, nb_samples)
+        return np.transpose(self.mu.T[..., None] + L @ eps, (1, 0, 2))
+
     def matrices(self, t):
         A = np.reshape(self.mu[:self.dm_state * self.dm_state, t], (self.dm_state, self.dm_state), order='F')
         B = np.reshape(self.mu[self.dm_state * self.dm_state: self.dm_state * self.dm_state
@@ -77,8 +85,8 @@ class QuadraticStateValue:
         self.dm_state = dm_state
         self.nb_steps = nb_steps
 
-        self.V = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.v = np.zeros((self.dm_state, self.nb_steps, ))
+        self.V = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.v = trajectory.zeros((self.dm_state, self.nb_steps, ))
         self.v0 = np.zeros((self.nb_steps, ))
 
 
@@ -88,12 +96,12 @@ class QuadraticStateActionValue:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.Qxx = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.Quu = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
-        self.Qux = np.zeros((self.dm_act, self.dm_state, self.nb_steps))
+        self.Qxx = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.Quu = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.Qux = trajectory.zeros((self.dm_act, self.dm_state, self.nb_steps))
 
-        self.qx = np.zeros((self.dm_state, self.nb_steps, ))
-        self.qu = np.zeros((self.dm_act, self.nb_steps, ))
+        self.qx = trajectory.zeros((self.dm_state, self.nb_steps, ))
+        self.qu = trajectory.zeros((self.dm_act, self.nb_steps, ))
 
         self.q0 = np.zeros((self.nb_steps, ))
 
@@ -105,13 +113,13 @@ class QuadraticCost:
 
         self.nb_steps = nb_steps
 
-        self.Cxx = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.cx = np.zeros((self.dm_state, self.nb_steps))
+        self.Cxx = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.cx = trajectory.zeros((self.dm_state, self.nb_steps))
 
-        self.Cuu = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
-        self.cu = np.zeros((self.dm_act, self.nb_steps))
+        self.Cuu = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.cu = trajectory.zeros((self.dm_act, self.nb_steps))
 
-        self.Cxu = np.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.Cxu = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
         self.c0 = np.zeros((self.nb_steps, ))
 
     @property
@@ -200,16 +208,127 @@ class LearnedProbabilisticLinearDynamicsWithKnownNoise(MatrixNormalParameters):
             self.sigma[..., t] = model.posterior.sigma
 
 
+class PerturbedLinearSimulator:
+    # batched rollouts on the continuous-time linearization of an env
+    # around the mean trajectory, perturbed by sampled model parameters
+    def __init__(self, env, dm_state, dm_act, nb_steps):
+        self.env = env.unwrapped
+
+        self.dm_state = dm_state
+        self.dm_act = dm_act
+        self.nb_steps = nb_steps
+
+        self.dt = self.env.dt
+        self.xlim = self.env.xlim
+        self.ulim = self.env.ulim
+
+        self.A = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.B = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.c = trajectory.zeros((self.dm_state, self.nb_steps))
+
+    def linearize(self, ctl):
+        # one linearization per time step along the mean trajectory
+        x, _ = self.env.init()
+        for t in range(self.nb_steps):
+            u = ctl.mean(x, t)
+            self.A[..., t], self.B[..., t], self.c[..., t] = self.env.linearization(x, u)
+            x = self.env.dynamics(x, u)
+
+    def perturbations(self, nb_episodes, param=None):
+        size = (self.nb_steps, nb_episodes)
+        if param is None:
+            return self.env.linearization_perturbation(size)
+        else:
+            ABc = param.samples(nb_episodes)
+
+            dm_A = self.dm_state * self.dm_state
+            dm_B = self.dm_state * self.dm_act
+
+            dA = np.reshape(ABc[:dm_A], (self.dm_state, self.dm_state) + size, order='F')
+            dB = np.reshape(ABc[dm_A:dm_A + dm_B], (self.dm_state, self.dm_act) + size, order='F')
+            dc = ABc[- self.dm_state:]
+            return dA, dB, dc
+
+    def rollout(self, ctl, nb_episodes, weighting,
+                param=None, stoch=True):
+        self.linearize(ctl)
+        dA, dB, dc = self.perturbations(nb_episodes, param)
+
+        data = {'x': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
+                'u': np.zeros((self.dm_act, self.nb_steps, nb_episodes)),
+                'xn': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
+                'c': np.zeros((self.nb_steps + 1, nb_episodes))}
+
+        # pre-draw all noise
+        rng = self.env.np_random
+        x0, sigma0 = self.env.init()
+        x = x0[:, None] + np.linalg.cholesky(sigma0) @ rng.standard_normal((self.dm_state, nb_episodes))
+
+        L_env = np.linalg.cholesky(self.env.sigma)
+        eps_env = L_env @ rng.standard_normal((self.nb_steps, self.dm_state, nb_episodes))
+
+        if stoch:
+            L_ctl = np.linalg.cholesky(trajectory.steps(ctl.sigma))
+            eps_ctl = L_ctl @ np.random.randn(self.nb_steps, self.dm_act, nb_episodes)
+        else:
+            eps_ctl = np.zeros((self.nb_steps, self.dm_act, nb_episodes))
+
+        for t in range(self.nb_steps):
+            u = np.einsum('kh,hn->kn', ctl.K[..., t], x) + ctl.kff[..., t][:, None] + eps_ctl[t]
+            data['u'][..., t, :] = u
+            data['x'][..., t, :] = x
+
+            _u = np.clip(u, -self.ulim[:, None], self.ulim[:, None])
+
+            At = self.A[..., t][..., None] + dA[..., t, :]
+            Bt = self.B[..., t][..., None] + dB[..., t, :]
+            ct = self.c[..., t][:, None] + dc[..., t, :]
+
+            def linf(x):
+                return np.einsum('ijn,jn->in', At, x) + np.einsum('ijn,jn->in', Bt, _u) + ct
+
+            k1 = linf(x)
+            k2 = linf(x + 0.5 * self.dt * k1)
+            k3 = linf(x + 0.5 * self.dt * k2)
+            k4 = linf(x + self.dt * k3)
+
+            x = x + self.dt / 6. * (k1 + 2. * k2 + 2. * k3 + k4)
+            x = np.clip(x, -self.xlim[:, None], self.xlim[:, None])
+            x = x + eps_env[t]
+
+            data['xn'][..., t, :] = x
+
+        # expose true reward function
+        _u_last = np.concatenate((np.zeros((self.dm_act, 1, nb_episodes)), data['u'][:, :-1, :]), axis=1)
+        if hasattr(self.env, 'cost_batch'):
+            for t in range(self.nb_steps):
+                data['c'][t] = self.env.cost_batch(data['x'][..., t, :], data['u'][..., t, :],
+                                                   _u_last[..., t, :], weighting[t])
+
+            data['c'][-1] = self.env.cost_batch(x, np.zeros((self.dm_act, nb_episodes)),
+                                                np.zeros((self.dm_act, nb_episodes)), weighting[-1])
+        else:
+            for n in range(nb_episodes):
+                for t in range(self.nb_steps):
+                    data['c'][t, n] = self.env.cost(data['x'][..., t, n], data['u'][..., t, n],
+                                                    _u_last[..., t, n], weighting[t])
+
+                data['c'][-1, n] = self.env.cost(x[:, n], np.zeros((self.dm_act, )),
+                                                 np.zeros((self.dm_act, )), weighting[-1])
+
+        return data
+
+
 class LinearGaussianControl:
     def __init__(self, dm_state, dm_act, nb_steps, init_ctl_sigma=1.):
         self.dm_state = dm_state
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.K = np.zeros((self.dm_act, self.dm_state, self.nb_steps))
-        self.kff = np.zeros((self.dm_act, self.nb_steps))
+        self.K = trajectory.zeros((self.dm_act, self.dm_state, self.nb_steps))
+        self.kff = trajectory.zeros((self.dm_act, self.nb_steps))
 
-        self.sigma = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.sigma = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
         for t in range(self.nb_steps):
             self.sigma[..., t] = init_ctl_sigma * np.eye(self.dm_act)
 
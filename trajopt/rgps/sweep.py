@@ -0,0 +1,194 @@
+import os
+import json
+import pickle
+import hashlib
+import inspect
+
+import numpy as np
+
+from multiprocessing import shared_memory
+
+from joblib import Parallel, delayed
+
+from trajopt.rgps.mfrgps import MFRGPS
+
+
+# settings that shape the initial rollouts and the nominal model,
+# these are shared by all configurations of a sweep
+SHARED_KEYS = ('nb_steps', 'init_state', 'init_action_sigma',
+               'activation', 'slew_rate', 'action_penalty', 'prior')
+
+
+def settings_hash(settings):
+    def _default(obj):
+        if hasattr(obj, 'tolist'):
+            return obj.tolist()
+        if callable(obj):
+            try:
+                return inspect.getsource(obj)
+            except (OSError, TypeError):
+                return obj.__module__ + '.' + obj.__qualname__
+        return repr(obj)
+
+    _dump = json.dumps(settings, sort_keys=True, default=_default)
+    return hashlib.sha1(_dump.encode()).hexdigest()
+
+
+class SharedArrays:
+    # read-only numpy arrays in shared memory, attached by name in workers
+    def __init__(self, arrays):
+        self.blocks = []
+        self.specs = {}
+
+        for key, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, arr.dtype, buffer=block.buf)[...] = arr
+
+            self.blocks.append(block)
+            self.specs[key] = (block.name, arr.shape, arr.dtype.str)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    @staticmethod
+    def attach(specs):
+        blocks, arrays = [], {}
+        for key, (name, shape, dtype) in specs.items():
+            block = shared_memory.SharedMemory(name=name)
+
+            arr = np.ndarray(shape, dtype, buffer=block.buf)
+            arr.flags.writeable = False
+
+            blocks.append(block)
+            arrays[key] = arr
+
+        return arrays, blocks
+
+
+def _solver(make_env, solver_kwargs, seed):
+    np.random.seed(seed)
+
+    env = make_env()
+    env.seed(seed)
+
+    kwargs = dict(solver_kwargs)
+    if 'init_state' not in kwargs:
+        kwargs['init_state'] = env.init()
+
+    return MFRGPS(env, **kwargs)
+
+
+def _run_config(make_env, solver_kwargs, run_kwargs,
+                nb_learning_episodes, nb_evaluation_episodes,
+                config, specs, seed, path):
+    import warnings
+    warnings.filterwarnings("ignore")
+
+    arrays, blocks = SharedArrays.attach(specs)
+
+    data = {k: arrays['data_' + k] for k in ('x', 'u', 'xn', 'c')}
+    evaluation = {k: arrays['eval_' + k] for k in ('x', 'u', 'xn', 'c')}
+    nominal = arrays['nominal_mu'], arrays['nominal_sigma']
+
+    alg = _solver(make_env, dict(solver_kwargs, **config), seed)
+    # the episode counts are also used to re-collect data after each update
+    trace = alg.run(nb_learning_episodes, nb_evaluation_episodes,
+                    data=data, evaluation=evaluation, nominal=nominal, **run_kwargs)
+
+    del data, evaluation, nominal, arrays
+    for block in blocks:
+        block.close()
+
+    if path is not None:
+        with open(path, 'wb') as f:
+            pickle.dump(trace, f)
+
+    return trace
+
+
+class RobustSweep:
+    # sweep MFRGPS settings on shared initial data,
+    # the initial rollouts and nominal model are computed once,
+    # finished configurations are cached on disk by their settings
+    def __init__(self, make_env, solver_kwargs,
+                 nb_learning_episodes, nb_evaluation_episodes,
+                 run_kwargs=None, seed=1337, cache_dir=None):
+
+        self.make_env = make_env
+        self.solver_kwargs = solver_kwargs
+        self.run_kwargs = {} if run_kwargs is None else run_kwargs
+
+        self.nb_learning_episodes = nb_learning_episodes
+        self.nb_evaluation_episodes = nb_evaluation_episodes
+
+        self.seed = seed
+        self.cache_dir = cache_dir
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def settings(self, config):
+        return {'make_env': self.make_env,
+                'solver': dict(self.solver_kwargs, **config),
+                'run': self.run_kwargs, 'seed': self.seed,
+                'nb_learning_episodes': self.nb_learning_episodes,
+                'nb_evaluation_episodes': self.nb_evaluation_episodes}
+
+    def cache_path(self, config):
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, settings_hash(self.settings(config)) + '.pkl')
+
+    def initialize(self):
+        import warnings
+        warnings.filterwarnings("ignore")
+
+        alg = _solver(self.make_env, self.solver_kwargs, self.seed)
+
+        data = alg.rollout(self.nb_learning_episodes, perturb=False)
+        evaluation = alg.rollout(self.nb_evaluation_episodes, perturb=False)
+        alg.nominal.learn(data)
+
+        arrays = {'nominal_mu': alg.nominal.mu,
+                  'nominal_sigma': alg.nominal.sigma}
+        for k in ('x', 'u', 'xn', 'c'):
+            arrays['data_' + k] = data[k]
+            arrays['eval_' + k] = evaluation[k]
+
+        return arrays
+
+    def run(self, configs, n_jobs=-1, verbose=0):
+        for config in configs:
+            shared = [key for key in config if key in SHARED_KEYS]
+            if shared:
+                raise ValueError("Cannot sweep over shared settings: %s" % ", ".join(shared))
+
+        traces = [None] * len(configs)
+
+        jobs = []
+        for i, config in enumerate(configs):
+            path = self.cache_path(config)
+            if path is not None and os.path.exists(path):
+                with open(path, 'rb') as f:
+                    traces[i] = pickle.load(f)
+            else:
+                jobs.append((i, config, path))
+
+        if jobs:
+            shared = SharedArrays(self.initialize())
+            try:
+                _traces = Parallel(n_jobs=n_jobs, verbose=verbose, backend='loky')\
+                    (delayed(_run_config)(self.make_env, self.solver_kwargs, self.run_kwargs,
+                                          self.nb_learning_episodes, self.nb_evaluation_episodes,
+                                          config, shared.specs, self.seed, path)
+                     for _, config, path in jobs)
+            finally:
+                shared.close()
+
+            for (i, _, _), trace in zip(jobs, _traces):
+                traces[i] = trace
+
+        return traces
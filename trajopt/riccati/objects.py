@@ -1,14 +1,47 @@
 import autograd.numpy as np
 from autograd import jacobian, hessian
 
+from scipy import linalg
+
+from trajopt import trajectory
+
+
+# stationary solutions keyed by the raw problem data, the
+# oldest ones are dropped once the cache is full
+_dare_cache = {}
+_dare_cache_size = 8
+
+
+def solve_dare(A, B, Q, R, N):
+    # discrete algebraic riccati equation of the cost
+    # x' Q x + u' R u + 2 x' N u, returns value and gain
+    _in = [np.ascontiguousarray(_M, dtype=np.float64) for _M in (A, B, Q, R, N)]
+    key = tuple((_M.shape, _M.tobytes()) for _M in _in)
+
+    if key not in _dare_cache:
+        _A, _B, _Q, _R, _N = _in
+        _V = linalg.solve_discrete_are(_A, _B, _Q, _R, s=_N)
+        _V = 0.5 * (_V + _V.T)
+
+        _Quu = _R + _B.T @ _V @ _B
+        _Qux = _N.T + _B.T @ _V @ _A
+        _K = - linalg.solve(_Quu, _Qux, assume_a='pos')
+
+        if len(_dare_cache) >= _dare_cache_size:
+            _dare_cache.pop(next(iter(_dare_cache)))
+        _dare_cache[key] = (_V, _K)
+
+    _V, _K = _dare_cache[key]
+    return np.copy(_V), np.copy(_K)
+
 
 class QuadraticStateValue:
     def __init__(self, dm_state, nb_steps):
         self.dm_state = dm_state
         self.nb_steps = nb_steps
 
-        self.V = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.v = np.zeros((self.dm_state, self.nb_steps, ))
+        self.V = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.v = trajectory.zeros((self.dm_state, self.nb_steps, ))
 
 
 class QuadraticCost:
@@ -18,13 +51,13 @@ class QuadraticCost:
 
         self.nb_steps = nb_steps
 
-        self.Cxx = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.cx = np.zeros((self.dm_state, self.nb_steps))
+        self.Cxx = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.cx = trajectory.zeros((self.dm_state, self.nb_steps))
 
-        self.Cuu = np.zeros((self.dm_act, self.dm_act, self.nb_steps))
-        self.cu = np.zeros((self.dm_act, self.nb_steps))
+        self.Cuu = trajectory.zeros((self.dm_act, self.dm_act, self.nb_steps))
+        self.cu = trajectory.zeros((self.dm_act, self.nb_steps))
 
-        self.Cxu = np.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.Cxu = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
 
     @property
     def params(self):
@@ -71,9 +104,9 @@ class LinearDynamics:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.A = np.zeros((self.dm_state, self.dm_state, self.nb_steps))
-        self.B = np.zeros((self.dm_state, self.dm_act, self.nb_steps))
-        self.c = np.zeros((self.dm_state, self.nb_steps))
+        self.A = trajectory.zeros((self.dm_state, self.dm_state, self.nb_steps))
+        self.B = trajectory.zeros((self.dm_state, self.dm_act, self.nb_steps))
+        self.c = trajectory.zeros((self.dm_state, self.nb_steps))
 
     @property
     def params(self):
@@ -88,7 +121,7 @@ class LinearDynamics:
 
 
 class AnalyticalLinearDynamics(LinearDynamics):
-    def __init__(self, f_dyn, dm_state, dm_act, nb_steps):
+    def __init__(self, f_dyn, dm_state, dm_act, nb_steps, f_jac=None):
         super(AnalyticalLinearDynamics, self).__init__(dm_state, dm_act, nb_steps)
 
         self.f = f_dyn
@@ -96,10 +129,21 @@ class AnalyticalLinearDynamics(LinearDynamics):
         self.dfdx = jacobian(self.f, 0)
         self.dfdu = jacobian(self.f, 1)
 
+        # code-generated jacobians over all time steps
+        self.f_jac = f_jac
+
     def evalf(self, x, u):
         return self.f(x, u)
 
     def taylor_expansion(self, x, u):
+        if self.f_jac is not None:
+            _x, _u = x[..., :self.nb_steps], u[..., :self.nb_steps]
+            _xn, self.A, self.B = self.f_jac(_x, _u)
+            # residual of taylor expansion
+            self.c = _xn - np.einsum('kht,ht->kt', self.A, _x)\
+                     - np.einsum('kht,ht->kt', self.B, _u)
+            return
+
         for t in range(self.nb_steps):
             self.A[..., t] = self.dfdx(x[..., t], u[..., t])
             self.B[..., t] = self.dfdu(x[..., t], u[..., t])
@@ -114,8 +158,8 @@ class LinearControl:
         self.dm_act = dm_act
         self.nb_steps = nb_steps
 
-        self.K = np.zeros((self.dm_act, self.dm_state, self.nb_steps))
-        self.kff = np.zeros((self.dm_act, self.nb_steps))
+        self.K = trajectory.zeros((self.dm_act, self.dm_state, self.nb_steps))
+        self.kff = trajectory.zeros((self.dm_act, self.nb_steps))
 
     @property
     def params(self):
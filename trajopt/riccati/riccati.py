@@ -1,19 +1,28 @@
 import autograd.numpy as np
 
+from trajopt import trajectory
+
+from trajopt.envs.vector import VectorEnv
+
 from trajopt.riccati.objects import AnalyticalLinearDynamics, AnalyticalQuadraticCost
 from trajopt.riccati.objects import QuadraticStateValue
 from trajopt.riccati.objects import LinearControl
+from trajopt.riccati.objects import solve_dare
+
+from trajopt.native.core.riccati import backward_pass
 
 
 class Riccati:
 
     def __init__(self, env, nb_steps,
-                 init_state, activation=None):
+                 init_state, activation=None,
+                 stationary=False, tol=1e-10):
 
         self.env = env
 
         # expose necessary functions
         self.env_dyn = self.env.unwrapped.dynamics
+        self.env_dyn_jac = getattr(self.env.unwrapped, 'dynamics_and_jacobians', None)
         self.env_noise = self.env.unwrapped.sigma
         self.env_cost = self.env.unwrapped.cost
         self.env_init = init_state
@@ -25,13 +34,14 @@ class Riccati:
         self.nb_steps = nb_steps
 
         # reference trajectory
-        self.xref = np.zeros((self.dm_state, self.nb_steps + 1))
+        self.xref = trajectory.zeros((self.dm_state, self.nb_steps + 1))
         self.xref[..., 0] = self.env_init[0]
 
-        self.uref = np.zeros((self.dm_act, self.nb_steps))
+        self.uref = trajectory.zeros((self.dm_act, self.nb_steps))
 
         self.vfunc = QuadraticStateValue(self.dm_state, self.nb_steps + 1)
-        self.dyn = AnalyticalLinearDynamics(self.env_dyn, self.dm_state, self.dm_act, self.nb_steps)
+        self.dyn = AnalyticalLinearDynamics(self.env_dyn, self.dm_state, self.dm_act, self.nb_steps,
+                                            f_jac=self.env_dyn_jac)
         self.ctl = LinearControl(self.dm_state, self.dm_act, self.nb_steps)
 
         # activation of cost function in shape of sigmoid
@@ -49,6 +59,12 @@ class Riccati:
 
         self.cost = AnalyticalQuadraticCost(self.env_cost, self.dm_state, self.dm_act, self.nb_steps + 1)
 
+        # infinite-horizon gains for time-invariant problems
+        self.stationary = stationary
+
+        # tolerance for time-invariance and value convergence
+        self.tol = tol
+
     def rollout(self, nb_episodes, env=None):
         if env is None:
             env = self.env
@@ -57,6 +73,11 @@ class Riccati:
             env = env
             env_cost = env.unwrapped.cost
 
+        # step all episodes at once if the env is vectorized
+        if hasattr(env.unwrapped, 'dynamics_batch'):
+            venv = VectorEnv(env, nb_episodes)
+            return venv.rollout(self.ctl, self.nb_steps, self.weighting, False)
+
         data = {'x': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
                 'u': np.zeros((self.dm_act, self.nb_steps, nb_episodes)),
                 'xn': np.zeros((self.dm_state, self.nb_steps, nb_episodes)),
@@ -83,8 +104,8 @@ class Riccati:
         return data
 
     def forward_pass(self, ctl):
-        state = np.zeros((self.dm_state, self.nb_steps + 1))
-        action = np.zeros((self.dm_act, self.nb_steps))
+        state = trajectory.zeros((self.dm_state, self.nb_steps + 1))
+        action = trajectory.zeros((self.dm_act, self.nb_steps))
         cost = np.zeros((self.nb_steps + 1, ))
 
         state[..., 0] = self.env.reset()
@@ -97,32 +118,64 @@ class Riccati:
                                       np.zeros((self.dm_act, )), self.weighting[-1])
         return state, action, cost
 
-    def backward_pass(self):
+    def time_invariant(self):
+        _params = [self.dyn.A, self.dyn.B, self.dyn.c,
+                   self.cost.Cxx[..., :-1], self.cost.cx[..., :-1],
+                   self.cost.Cuu[..., :-1], self.cost.cu[..., :-1],
+                   self.cost.Cxu[..., :-1]]
+
+        return all([np.allclose(_p, _p[..., :1], rtol=self.tol, atol=self.tol)
+                    for _p in _params])
+
+    def stationary_backward_pass(self):
+        # the gains of the first step only hold for all of them
+        # if dynamics and costs are the same at every step
+        if not self.time_invariant():
+            raise ValueError('stationary gains need a time-invariant problem, '
+                             'dynamics or costs vary over the horizon')
+
         lc = LinearControl(self.dm_state, self.dm_act, self.nb_steps)
         xvalue = QuadraticStateValue(self.dm_state, self.nb_steps + 1)
 
-        xvalue.V[..., -1] = self.cost.Cxx[..., -1]
-        xvalue.v[..., -1] = self.cost.cx[..., -1]
+        # time-invariant problem taken from the first step
+        A, B, c = self.dyn.A[..., 0], self.dyn.B[..., 0], self.dyn.c[..., 0]
+        Cxx, Cuu, Cxu = self.cost.Cxx[..., 0], self.cost.Cuu[..., 0], self.cost.Cxu[..., 0]
+        cx, cu = self.cost.cx[..., 0], self.cost.cu[..., 0]
+
+        V, K = solve_dare(A, B, Cxx, Cuu, Cxu)
+
+        # linear value term as fixed point of the closed loop
+        Acl = A + B @ K
+        v = np.linalg.solve(np.eye(self.dm_state) - Acl.T,
+                            cx + K.T @ cu + 2. * Acl.T @ V @ c)
+
+        Quu = Cuu + B.T @ V @ B
+        qu = cu + 2.0 * B.T @ V @ c + B.T @ v
+        kff = - 0.5 * np.linalg.solve(Quu, qu)
 
-        for t in range(self.nb_steps - 1, -1, -1):
-            Qxx = self.cost.Cxx[..., t] + self.dyn.A[..., t].T @ xvalue.V[..., t + 1] @ self.dyn.A[..., t]
-            Quu = self.cost.Cuu[..., t] + self.dyn.B[..., t].T @ xvalue.V[..., t + 1] @ self.dyn.B[..., t]
-            Qux = self.cost.Cxu[..., t].T + self.dyn.B[..., t].T @ xvalue.V[..., t + 1] @ self.dyn.A[..., t]
+        lc.K[...] = K[..., None]
+        lc.kff[...] = kff[..., None]
 
-            qx = self.cost.cx[..., t] + 2.0 * self.dyn.A[..., t].T @ xvalue.V[..., t + 1] @ self.dyn.c[..., t] +\
-                  self.dyn.A[..., t].T @ xvalue.v[..., t + 1]
+        xvalue.V[...] = V[..., None]
+        xvalue.v[...] = v[..., None]
 
-            qu = self.cost.cu[..., t] + 2.0 * self.dyn.B[..., t].T @ xvalue.V[..., t + 1] @ self.dyn.c[..., t] +\
-                  self.dyn.B[..., t].T @ xvalue.v[..., t + 1]
+        return lc, xvalue
 
-            Quu_inv = np.linalg.inv(Quu)
+    def backward_pass(self):
+        if self.stationary:
+            return self.stationary_backward_pass()
 
-            lc.K[..., t] = - Quu_inv @ Qux
-            lc.kff[..., t] = - 0.5 * Quu_inv @ qu
+        lc = LinearControl(self.dm_state, self.dm_act, self.nb_steps)
+        xvalue = QuadraticStateValue(self.dm_state, self.nb_steps + 1)
 
-            xvalue.V[..., t] = Qxx + Qux.T * lc.K[..., t]
-            xvalue.v[..., t] = qx + 2. * lc.kff[..., t].T @ Qux
+        # a converged time-invariant recursion is at its fixed point
+        _invariant = self.time_invariant()
 
+        lc.K, lc.kff, xvalue.V, xvalue.v = backward_pass(self.cost.Cxx, self.cost.cx, self.cost.Cuu,
+                                                         self.cost.cu, self.cost.Cxu,
+                                                         self.dyn.A, self.dyn.B, self.dyn.c,
+                                                         _invariant, self.tol,
+                                                         self.dm_state, self.dm_act, self.nb_steps)
         return lc, xvalue
 
     def plot(self, xref=None, uref=None):
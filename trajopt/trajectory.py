@@ -0,0 +1,23 @@
+import numpy as np
+
+
+# per-step vectors and matrices of a trajectory are indexed time-last,
+# x[..., t], but stored time-major: in fortran order every step is one
+# contiguous block, the memory of a (T, d, d) c-array. python loops
+# then read and write whole blocks, and the native kernels view the
+# same memory without a conversion
+
+
+def zeros(shape):
+    return np.zeros(shape, order='F')
+
+
+def asarray(a):
+    # time-major copy, none if a already is
+    return np.asfortranarray(a)
+
+
+def steps(a):
+    # (T, d, d) view of a (d, d, T) trajectory,
+    # e.g. for iterating over its steps
+    return np.moveaxis(a, -1, 0)